@@ -0,0 +1,67 @@
+"""
+Helpers for queries over long id lists.
+
+PostgREST puts ``in_()`` filters in the URL, so a filter with thousands
+of ids can exceed the server's URL limit and return an unbounded number
+of rows. ``select_in`` and ``delete_in`` split the ids into fixed size
+chunks and run one query per chunk.
+"""
+
+from typing import Any, Callable, Iterable, Iterator, List
+
+# Ids per in_() filter: ~36 byte uuids keep each URL well under 8 KB
+IN_CHUNK_SIZE = 150
+
+
+def chunked(values: Iterable[Any], size: int = IN_CHUNK_SIZE) -> Iterator[List[Any]]:
+    """Yield lists of at most ``size`` values, dropping duplicates."""
+    chunk: List[Any] = []
+    for value in dict.fromkeys(values):
+        chunk.append(value)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def select_in(
+    query: Callable[[], Any],
+    column: str,
+    values: Iterable[Any],
+    size: int = IN_CHUNK_SIZE,
+) -> List[dict]:
+    """
+    Run ``query().in_(column, chunk)`` for every chunk of values and
+    concatenate the rows. ``query`` builds a fresh filtered select, e.g.
+    ``lambda: supabase.table("users").select("id, name")``.
+    """
+    rows: List[dict] = []
+    for chunk in chunked(values, size):
+        resp = query().in_(column, chunk).execute()
+        err = getattr(resp, "error", None)
+        if err:
+            raise RuntimeError(err)
+        rows.extend(resp.data or [])
+    return rows
+
+
+def delete_in(
+    query: Callable[[], Any],
+    column: str,
+    values: Iterable[Any],
+    size: int = IN_CHUNK_SIZE,
+) -> int:
+    """
+    Run ``query().in_(column, chunk)`` for every chunk of values, where
+    ``query`` builds a delete, e.g. ``lambda: supabase.table("x").delete()``.
+    Returns the number of rows deleted.
+    """
+    deleted = 0
+    for chunk in chunked(values, size):
+        resp = query().in_(column, chunk).execute()
+        err = getattr(resp, "error", None)
+        if err:
+            raise RuntimeError(err)
+        deleted += len(resp.data or [])
+    return deleted
@@ -0,0 +1,175 @@
+"""
+Small in-process caches shared by the routers.
+
+- LRUCache: bounded, thread safe key -> value map.
+- SnapshotCache: per-key snapshots (for example one dashboard payload per
+  user) with explicit invalidation and an optional stale-while-revalidate
+  mode, where readers get the last snapshot while a rebuild runs.
+
+Both caches live in the current process only; each worker keeps its own.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+
+class LRUCache:
+    """Thread safe, size bounded least-recently-used cache."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Return the cached subset of keys (misses are simply absent)."""
+        found: Dict[Hashable, Any] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    found[key] = self._data[key]
+        return found
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def set_many(self, items: Dict[Hashable, Any]) -> None:
+        for key, value in items.items():
+            self.set(key, value)
+
+    def delete(self, *keys: Hashable) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+@dataclass
+class _Snapshot:
+    value: Any
+    built_at: float
+    stale: bool = False
+
+
+class SnapshotCache:
+    """
+    Per-key snapshot cache with event driven invalidation.
+
+    Writers call ``invalidate(key)`` when something that feeds a snapshot
+    changes. Readers call ``lookup(key)`` and get back the value plus one of
+    "fresh", "stale" or "miss". With ``stale_while_revalidate`` on, an
+    invalidated or expired snapshot is served as "stale" until a rebuild
+    replaces it; with it off, invalidation drops the snapshot outright.
+
+    Rebuilds call ``begin_build`` first and pass the returned token to
+    ``store``. If the key was invalidated while the build was running, the
+    result is kept as stale rather than fresh so the newer write is not lost.
+    """
+
+    FRESH = "fresh"
+    STALE = "stale"
+    MISS = "miss"
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 60.0,
+        stale_while_revalidate: bool = False,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.stale_while_revalidate = stale_while_revalidate
+        self.max_entries = max_entries
+        self._entries = LRUCache(max_entries)
+        # Invalidation sequence numbers, most recent last. Bounded like the
+        # entries; a key that falls off counts as invalidated at the newest
+        # evicted number, which only ever errs towards "stale".
+        self._seq = 0
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._evicted_upto = 0
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+
+    def lookup(self, key: Hashable) -> Tuple[Optional[Any], str]:
+        snap: Optional[_Snapshot] = self._entries.get(key)
+        if snap is None:
+            return None, self.MISS
+
+        expired = time.monotonic() - snap.built_at >= self.ttl_seconds
+        if not snap.stale and not expired:
+            return snap.value, self.FRESH
+        if self.stale_while_revalidate:
+            return snap.value, self.STALE
+        return None, self.MISS
+
+    def begin_build(self, key: Hashable) -> int:
+        with self._lock:
+            return self._seq
+
+    def store(self, key: Hashable, value: Any, token: int) -> None:
+        with self._lock:
+            last = self._invalidated.get(key, self._evicted_upto)
+            self._refreshing.discard(key)
+        self._entries.set(
+            key, _Snapshot(value=value, built_at=time.monotonic(), stale=last > token)
+        )
+
+    def claim_refresh(self, key: Hashable) -> bool:
+        """Return True if the caller should start a background rebuild."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def release_refresh(self, key: Hashable) -> None:
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def invalidate(self, *keys: Hashable) -> None:
+        with self._lock:
+            for key in keys:
+                if key is None:
+                    continue
+                self._seq += 1
+                self._invalidated[key] = self._seq
+                self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.max_entries:
+                _, seq = self._invalidated.popitem(last=False)
+                self._evicted_upto = max(self._evicted_upto, seq)
+        for key in keys:
+            if key is None:
+                continue
+            if self.stale_while_revalidate:
+                snap: Optional[_Snapshot] = self._entries.get(key)
+                if snap is not None:
+                    snap.stale = True
+            else:
+                self._entries.delete(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._invalidated.clear()
+            self._evicted_upto = self._seq
+            self._refreshing.clear()
+        self._entries.clear()
@@ -0,0 +1,46 @@
+"""
+Helpers for running blocking Supabase calls from async routes.
+
+The supabase client is synchronous, so calling it inline inside an
+``async def`` route blocks the event loop. ``run_db`` pushes a call onto
+a worker thread through a process wide capacity limiter, and
+``gather_db`` runs several independent calls concurrently.
+"""
+
+import asyncio
+import functools
+import os
+import weakref
+from typing import Any, Awaitable, Callable
+
+import anyio
+from anyio import to_thread
+
+# Maximum number of Supabase calls in flight per event loop
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", "16"))
+
+# anyio limiters are bound to an event loop, so keep one per loop
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, anyio.CapacityLimiter]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_limiter() -> anyio.CapacityLimiter:
+    """Return the capacity limiter for the running event loop."""
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = anyio.CapacityLimiter(DB_MAX_CONCURRENCY)
+        _limiters[loop] = limiter
+    return limiter
+
+
+async def run_db(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking call on the bounded worker pool and await its result."""
+    call = functools.partial(func, *args, **kwargs)
+    return await to_thread.run_sync(call, limiter=_get_limiter())
+
+
+async def gather_db(*calls: Awaitable[Any]) -> list:
+    """Await several ``run_db`` calls concurrently, preserving order."""
+    return list(await asyncio.gather(*calls))
@@ -13,6 +13,42 @@ class Settings(BaseSettings):
     SUPABASE_SERVICE_ROLE_KEY: str | None = None
     OPENAI_API_KEY: str | None = None
 
+    # Per-user /api/dashboard snapshot cache
+    DASHBOARD_CACHE_ENABLED: bool = True
+    DASHBOARD_CACHE_TTL_SECONDS: float = 60.0
+    DASHBOARD_CACHE_MAX_USERS: int = 5000
+    # Serve the last snapshot while a rebuild runs after invalidation.
+    # Off by default: a user's next read after their own write, and the
+    # refetch behind a pushed "balance" event, must see the new data.
+    DASHBOARD_CACHE_STALE_WHILE_REVALIDATE: bool = False
+
+    # Process wide expense id -> description cache used by payments lists
+    EXPENSE_NAME_CACHE_MAX_ENTRIES: int = 20000
+
+    # Net each payer/participant pair in the background after create_expense
+    PAYMENT_AUTO_NETTING: bool = True
+
+    # In-process username index behind /api/users/search
+    USERNAME_INDEX_MAX_ENTRIES: int = 500_000
+    USERNAME_INDEX_REFRESH_SECONDS: float = 300.0
+
+    # In-process friend / group graph behind /api/friends/suggestions
+    SOCIAL_GRAPH_REFRESH_SECONDS: float = 300.0
+    # Groups bigger than this do not count towards suggestions
+    SUGGESTION_MAX_GROUP_SIZE: int = 200
+
+    # Server-Sent Events push channel (/inbox/stream)
+    EVENT_STREAM_QUEUE_SIZE: int = 100
+    EVENT_STREAM_MAX_PER_USER: int = 10
+    EVENT_STREAM_KEEPALIVE_SECONDS: float = 20.0
+
+    # Background, batched notification writes
+    NOTIFICATION_QUEUE_MAX_EVENTS: int = 10000
+    NOTIFICATION_BATCH_SIZE: int = 200
+    NOTIFICATION_FLUSH_INTERVAL_SECONDS: float = 0.5
+    NOTIFICATION_ENQUEUE_TIMEOUT_SECONDS: float = 0.05
+    NOTIFICATION_DRAIN_TIMEOUT_SECONDS: float = 10.0
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
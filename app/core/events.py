@@ -0,0 +1,139 @@
+"""
+In-process pub/sub for pushing events to connected browsers.
+
+EventHub keeps, per user id, the set of open subscriptions (one per
+Server-Sent Events connection). ``publish`` may be called from any thread
+(sync routes run on the worker pool): delivery is handed to each
+subscription's event loop with ``call_soon_threadsafe``, so publishers
+never block on slow clients. Each subscription has a small bounded queue;
+when a client falls behind, the oldest events are dropped and the client
+is told to resync.
+
+An idle connection costs one suspended coroutine and an empty queue.
+Like the caches in cache.py the hub lives in the current process only,
+so events reach the connections held by the worker that published them.
+
+Event types:
+  notification   a new inbox notification (the formatted row)
+  balance        something changed the user's balances; refetch
+  resync         events were dropped; refetch everything
+"""
+
+import asyncio
+import itertools
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+from .config import settings
+
+
+@dataclass
+class Event:
+    id: int
+    type: str
+    data: Any
+
+
+class TooManySubscriptions(Exception):
+    """The user already holds the maximum number of open streams."""
+
+
+class Subscription:
+    """One connection's view of the hub: a bounded queue on its own loop."""
+
+    def __init__(self, hub: "EventHub", user_id: str, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.hub = hub
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def _deliver(self, event: Event) -> None:
+        # Runs on self.loop; drop the oldest event rather than block
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def next(self, timeout: float) -> Optional[Event]:
+        """The next event, or None if nothing arrived within timeout."""
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if self.dropped:
+            self.dropped = 0
+            return Event(id=event.id, type="resync", data={})
+        return event
+
+    def close(self) -> None:
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """Fans published events out to every subscription of a user."""
+
+    def __init__(self, queue_size: int = 100, max_per_user: int = 10):
+        self.queue_size = queue_size
+        self.max_per_user = max_per_user
+        self._subs: Dict[str, Set[Subscription]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: str) -> Subscription:
+        """Open a subscription on the running event loop."""
+        sub = Subscription(self, str(user_id), asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            subs = self._subs.setdefault(sub.user_id, set())
+            if len(subs) >= self.max_per_user:
+                raise TooManySubscriptions(sub.user_id)
+            subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subs.get(sub.user_id)
+            if subs is None:
+                return
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.user_id]
+
+    def connection_count(self, user_id: Optional[str] = None) -> int:
+        with self._lock:
+            if user_id is not None:
+                return len(self._subs.get(str(user_id), ()))
+            return sum(len(subs) for subs in self._subs.values())
+
+    def publish(self, user_id: Any, event_type: str, data: Any = None) -> int:
+        """Send an event to every open stream of user_id; returns how many."""
+        if not user_id:
+            return 0
+        with self._lock:
+            subs: List[Subscription] = list(self._subs.get(str(user_id), ()))
+            event = Event(id=next(self._ids), type=event_type, data=data if data is not None else {})
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._deliver, event)
+            except RuntimeError:
+                # The connection's loop has shut down
+                self.unsubscribe(sub)
+        return len(subs)
+
+
+event_hub = EventHub(
+    queue_size=settings.EVENT_STREAM_QUEUE_SIZE,
+    max_per_user=settings.EVENT_STREAM_MAX_PER_USER,
+)
+
+
+def publish_balance_change(*user_ids: Any) -> None:
+    """Tell each user's open pages that their balances changed."""
+    for user_id in {str(uid) for uid in user_ids if uid}:
+        event_hub.publish(user_id, "balance")
+
+
+def publish_notification(user_id: Any, notification: dict) -> None:
+    """Push one formatted inbox notification to its recipient."""
+    event_hub.publish(user_id, "notification", notification)
@@ -0,0 +1,291 @@
+"""
+Background, batched writes to the notifications table.
+
+Routes call ``notify(...)`` with the notifications a write produced and
+return straight away; a single worker thread collects queued rows and
+inserts them in batches of up to NOTIFICATION_BATCH_SIZE, waiting at most
+NOTIFICATION_FLUSH_INTERVAL_SECONDS for a batch to fill. After each insert
+the registered listeners (the inbox push channel) get the written rows.
+A failed batch insert is retried a few times with backoff and then
+written row by row, so one bad row costs only itself.
+
+Rows carry the sender's username and the group's name as they were when
+the notification was written, so the inbox never has to look them up on
+read. The writer fills in any names the producer did not pass with one
+users and one groups query per batch; ``refresh_sender_name`` and
+``refresh_group_name`` rewrite them when someone renames.
+
+The queue is bounded (NOTIFICATION_QUEUE_MAX_EVENTS). When it is full a
+producer waits up to NOTIFICATION_ENQUEUE_TIMEOUT_SECONDS for room, which
+slows a burst down to the writer's pace, and past that the notification is
+dropped and counted rather than holding the request. ``stop()`` drains
+what is left on shutdown.
+"""
+
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import settings
+from .supabase_client import supabase
+
+
+class NotificationQueue:
+    """Bounded queue of notification rows with a batching writer thread."""
+
+    def __init__(
+        self,
+        max_events: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        enqueue_timeout: float = 0.05,
+        drain_timeout: float = 10.0,
+        write_attempts: int = 3,
+        retry_delay: float = 0.1,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.drain_timeout = drain_timeout
+        self.write_attempts = write_attempts
+        self.retry_delay = retry_delay
+        self.dropped = 0
+        self.failed = 0
+        self.written = 0
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(max_events)
+        self._listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._worker: Optional[threading.Thread] = None
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def add_listener(self, listener: Callable[[List[Dict[str, Any]]], None]) -> None:
+        """Call listener(rows) after every successful batch insert."""
+        self._listeners.append(listener)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopping.clear()
+            self._worker = threading.Thread(target=self._run, name="notification-writer", daemon=True)
+            self._worker.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the worker (waiting up to timeout, default drain_timeout, for
+        its current batch), then write everything still queued.
+        """
+        with self._start_lock:
+            worker, self._worker = self._worker, None
+            self._stopping.set()
+        if worker is not None:
+            worker.join(self.drain_timeout if timeout is None else timeout)
+        self.flush()
+
+    def enqueue(self, rows: List[Dict[str, Any]]) -> int:
+        """Queue rows for writing; returns how many were accepted."""
+        self.start()
+        accepted = 0
+        for row in rows:
+            try:
+                self._queue.put(row, timeout=self.enqueue_timeout)
+                accepted += 1
+            except queue.Full:
+                self.dropped += 1
+        if accepted < len(rows):
+            print(f"Notification queue full, dropped {len(rows) - accepted} notifications")
+        return accepted
+
+    def flush(self) -> None:
+        """Write everything queued right now on the calling thread."""
+        while True:
+            batch = self._take(wait=0)
+            if not batch:
+                return
+            self._write(batch)
+
+    def _take(self, wait: float) -> List[Dict[str, Any]]:
+        # Up to batch_size rows. With wait > 0, wait that long for the
+        # first row and then up to flush_interval for the batch to fill.
+        batch: List[Dict[str, Any]] = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            try:
+                if wait <= 0:
+                    item = self._queue.get_nowait()
+                elif deadline is None:
+                    item = self._queue.get(timeout=wait)
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _insert(self, rows: List[Dict[str, Any]], attempts: int) -> List[Dict[str, Any]]:
+        # Insert with up to attempts tries, backing off between them
+        for attempt in range(attempts):
+            try:
+                res = supabase.table("notifications").insert(rows).execute()
+                return res.data or []
+            except Exception:
+                if attempt + 1 == attempts:
+                    raise
+                time.sleep(self.retry_delay * 2 ** attempt)
+        return []
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        with self._write_lock:
+            _attach_names(batch)
+            try:
+                rows = self._insert(batch, self.write_attempts)
+            except Exception as e:
+                if len(batch) == 1:
+                    rows = []
+                    self.failed += 1
+                    print(f"Error writing notification: {e}")
+                else:
+                    # One bad row (say, a group deleted meanwhile) fails the
+                    # whole statement; write the rest one by one
+                    print(f"Error writing {len(batch)} notifications, retrying one by one: {e}")
+                    rows = []
+                    for row in batch:
+                        try:
+                            rows.extend(self._insert([row], 1))
+                        except Exception as row_error:
+                            self.failed += 1
+                            print(f"Dropped notification for {row.get('to_user')}: {row_error}")
+            self.written += len(rows)
+        for listener in self._listeners:
+            try:
+                listener(rows)
+            except Exception as e:
+                print(f"Notification listener failed: {e}")
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            batch = self._take(wait=self.flush_interval)
+            if batch:
+                self._write(batch)
+
+
+def _quote(value: Any) -> str:
+    """Quote a value for a PostgREST logic tree (or=/and=)."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _differs(column: str, value: Optional[str]) -> str:
+    """Logic tree matching rows whose stored copy is not ``value`` (NULL safe)."""
+    if value is None:
+        return f"{column}.not.is.null"
+    return f"{column}.is.null,{column}.neq.{_quote(value)}"
+
+
+def _lookup(table: str, column: str, ids: set) -> Dict[str, Optional[str]]:
+    if not ids:
+        return {}
+    try:
+        res = supabase.table(table).select(f"id, {column}").in_("id", list(ids)).execute()
+    except Exception as e:
+        print(f"Error fetching notification {table}: {e}")
+        return {}
+    return {str(r["id"]): r.get(column) for r in res.data or []}
+
+
+def _attach_names(batch: List[Dict[str, Any]]) -> None:
+    """Fill in from_username and group_name where the producer left them out."""
+    user_ids = {str(r["from_user"]) for r in batch if r.get("from_user") and not r.get("from_username")}
+    group_ids = {str(r["group_id"]) for r in batch if r.get("group_id") and not r.get("group_name")}
+    usernames = _lookup("users", "username", user_ids)
+    group_names = _lookup("groups", "name", group_ids)
+    for row in batch:
+        if row.get("from_user") and not row.get("from_username"):
+            row["from_username"] = usernames.get(str(row["from_user"]))
+        if row.get("group_id") and not row.get("group_name"):
+            row["group_name"] = group_names.get(str(row["group_id"]))
+
+
+notification_queue = NotificationQueue(
+    max_events=settings.NOTIFICATION_QUEUE_MAX_EVENTS,
+    batch_size=settings.NOTIFICATION_BATCH_SIZE,
+    flush_interval=settings.NOTIFICATION_FLUSH_INTERVAL_SECONDS,
+    enqueue_timeout=settings.NOTIFICATION_ENQUEUE_TIMEOUT_SECONDS,
+    drain_timeout=settings.NOTIFICATION_DRAIN_TIMEOUT_SECONDS,
+)
+
+
+def notify(
+    notification_type: str,
+    from_user: Any,
+    to_users: Any,
+    group_id: Any = None,
+    from_username: Optional[str] = None,
+    group_name: Optional[str] = None,
+) -> int:
+    """
+    Queue one notification per recipient (the sender is skipped).
+    Names the caller already has can be passed to save the writer a
+    lookup. Returns how many were accepted by the queue.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    rows = [
+        {
+            "type": notification_type,
+            "from_user": str(from_user) if from_user else None,
+            "to_user": str(to_user),
+            "group_id": group_id,
+            "from_username": from_username,
+            "group_name": group_name,
+            "status": "unread",
+            "created_at": now,
+        }
+        for to_user in dict.fromkeys(str(u) for u in to_users if u)
+        if to_user != str(from_user)
+    ]
+    if not rows:
+        return 0
+    return notification_queue.enqueue(rows)
+
+
+def refresh_sender_name(user_id: Any, username: Optional[str]) -> None:
+    """
+    Rewrite the stored sender name after a user changes their username.
+    Rows that already carry the name are left alone, so saving an account
+    without renaming writes nothing; rows written without a name (the
+    lookup failed) are repaired too.
+    """
+    try:
+        (
+            supabase.table("notifications")
+            .update({"from_username": username})
+            .eq("from_user", str(user_id))
+            .or_(_differs("from_username", username))
+            .execute()
+        )
+    except Exception as e:
+        print(f"Error refreshing notification sender names: {e}")
+
+
+def refresh_group_name(group_id: Any, name: Optional[str]) -> None:
+    """Rewrite the stored group name after a group is renamed."""
+    try:
+        (
+            supabase.table("notifications")
+            .update({"group_name": name})
+            .eq("group_id", str(group_id))
+            .or_(_differs("group_name", name))
+            .execute()
+        )
+    except Exception as e:
+        print(f"Error refreshing notification group names: {e}")
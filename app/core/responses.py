@@ -0,0 +1,37 @@
+"""
+Fast JSON responses for large list endpoints.
+
+FastAPI's default path validates the return value against
+``response_model`` and runs it through ``jsonable_encoder`` before
+``json.dumps``. For big lists built from trusted database rows that costs
+more than the query. Routes opt in by returning ``FastJSONResponse``
+with plain dicts/lists: FastAPI then skips validation and encoding,
+and the body is rendered with orjson (pinned in requirements.txt).
+"""
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # e.g. a bare checkout without requirements installed
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (or compact stdlib json)."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+            default=str,
+        ).encode("utf-8")
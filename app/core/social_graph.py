@@ -0,0 +1,288 @@
+"""
+In-process social graph for "people you may know" suggestions.
+
+Users and groups are interned to small integer ids, and each relation is
+an Adjacency: CSR arrays (offsets + targets) built in one pass, plus a
+per-node overlay of edges added or removed since the last build. Reads
+walk the compact arrays directly unless a node has pending changes;
+once the overlay grows past a fraction of the graph it is folded back
+into fresh arrays.
+
+Three relations are kept:
+  friends   owner -> friend, from friend_links
+  groups    user  -> group,  from group_members
+  members   group -> user,   from group_members
+
+The graph is loaded on first use, updated in place by the friends and
+groups routers, and reloaded in the background once it is older than
+SOCIAL_GRAPH_REFRESH_SECONDS. Like the caches in cache.py it lives in
+the current process only.
+"""
+
+import heapq
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import settings
+from .supabase_client import supabase
+
+LOAD_PAGE_SIZE = 1000
+
+# Ranking weights: a mutual friend counts for more than a shared group
+MUTUAL_FRIEND_WEIGHT = 2
+SHARED_GROUP_WEIGHT = 1
+
+
+class Interner:
+    """Maps string ids to dense ints and back."""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._keys: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def intern(self, key: str) -> int:
+        idx = self._ids.get(key)
+        if idx is None:
+            idx = len(self._keys)
+            self._ids[key] = idx
+            self._keys.append(key)
+        return idx
+
+    def get(self, key: str) -> Optional[int]:
+        return self._ids.get(key)
+
+    def key(self, idx: int) -> str:
+        return self._keys[idx]
+
+
+class Adjacency:
+    """Directed int graph: CSR arrays plus an add/remove overlay."""
+
+    def __init__(self, edges: Iterable[Tuple[int, int]] = ()):
+        self._build(set(edges))
+
+    def _build(self, edges: Set[Tuple[int, int]]) -> None:
+        size = max((src for src, _ in edges), default=-1) + 1
+        counts = [0] * (size + 1)
+        for src, _ in edges:
+            counts[src + 1] += 1
+        for i in range(size):
+            counts[i + 1] += counts[i]
+        targets = array("l", [0]) * len(edges)
+        fill = counts[:-1]
+        for src, dst in sorted(edges):
+            targets[fill[src]] = dst
+            fill[src] += 1
+        self._offsets = array("l", counts)
+        self._targets = targets
+        self._added: Dict[int, Set[int]] = {}
+        self._removed: Dict[int, Set[int]] = {}
+        self._pending = 0
+
+    def _base(self, src: int):
+        if src + 1 >= len(self._offsets):
+            return ()
+        return self._targets[self._offsets[src]:self._offsets[src + 1]]
+
+    def neighbors(self, src: int) -> Iterable[int]:
+        added = self._added.get(src)
+        removed = self._removed.get(src)
+        if added is None and removed is None:
+            return self._base(src)
+        result = set(self._base(src))
+        if removed:
+            result -= removed
+        if added:
+            result |= added
+        return result
+
+    def degree(self, src: int) -> int:
+        if src in self._added or src in self._removed:
+            return len(self.neighbors(src))
+        if src + 1 >= len(self._offsets):
+            return 0
+        return self._offsets[src + 1] - self._offsets[src]
+
+    def add(self, src: int, dst: int) -> None:
+        removed = self._removed.get(src)
+        if removed and dst in removed:
+            removed.discard(dst)
+        elif dst not in self._base(src):
+            self._added.setdefault(src, set()).add(dst)
+        self._pending += 1
+        self._maybe_compact()
+
+    def remove(self, src: int, dst: int) -> None:
+        added = self._added.get(src)
+        if added and dst in added:
+            added.discard(dst)
+        elif dst in self._base(src):
+            self._removed.setdefault(src, set()).add(dst)
+        self._pending += 1
+        self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        if self._pending < max(1024, len(self._targets) // 20):
+            return
+        size = max(len(self._offsets) - 1, max(self._added, default=-1) + 1)
+        self._build({(src, dst) for src in range(size) for dst in self.neighbors(src)})
+
+
+class SocialGraph:
+    """Friend links and group memberships for suggestion ranking."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.replace([], [])
+        self.loaded_at: Optional[float] = None
+
+    def replace(self, links: List[Tuple[str, str]], memberships: List[Tuple[str, str]]) -> None:
+        """Swap in full (owner, friend) and (group, user) edge lists."""
+        users, groups = Interner(), Interner()
+        friend_edges = [(users.intern(a), users.intern(b)) for a, b in links if a != b]
+        member_edges = [(groups.intern(g), users.intern(u)) for g, u in memberships]
+        friends = Adjacency(friend_edges)
+        user_groups = Adjacency((u, g) for g, u in member_edges)
+        group_members = Adjacency(member_edges)
+        with self._lock:
+            self._users, self._groups = users, groups
+            self._friends = friends
+            self._user_groups = user_groups
+            self._group_members = group_members
+            self.loaded_at = time.monotonic()
+
+    def clear(self) -> None:
+        self.replace([], [])
+        self.loaded_at = None
+
+    def add_friend_link(self, owner_id: str, friend_id: str) -> None:
+        if not owner_id or not friend_id or owner_id == friend_id:
+            return
+        with self._lock:
+            self._friends.add(self._users.intern(owner_id), self._users.intern(friend_id))
+
+    def remove_friend_link(self, owner_id: str, friend_id: str) -> None:
+        with self._lock:
+            a, b = self._users.get(owner_id), self._users.get(friend_id)
+            if a is not None and b is not None:
+                self._friends.remove(a, b)
+
+    def add_group_member(self, group_id: str, user_id: str) -> None:
+        if not group_id or not user_id:
+            return
+        with self._lock:
+            g, u = self._groups.intern(group_id), self._users.intern(user_id)
+            self._user_groups.add(u, g)
+            self._group_members.add(g, u)
+
+    def remove_group_member(self, group_id: str, user_id: str) -> None:
+        with self._lock:
+            g, u = self._groups.get(group_id), self._users.get(user_id)
+            if g is not None and u is not None:
+                self._user_groups.remove(u, g)
+                self._group_members.remove(g, u)
+
+    def suggest(self, user_id: str, limit: int = 10) -> List[dict]:
+        """
+        Top candidates for user_id, ranked by weighted mutual friends plus
+        shared groups. Existing friends and the user are excluded; groups
+        larger than SUGGESTION_MAX_GROUP_SIZE are skipped as too weak a
+        signal to be worth walking.
+        """
+        with self._lock:
+            me = self._users.get(user_id)
+            if me is None:
+                return []
+            friends = self._friends
+            mine = set(friends.neighbors(me))
+
+            mutual: Dict[int, int] = {}
+            for friend in mine:
+                for candidate in friends.neighbors(friend):
+                    mutual[candidate] = mutual.get(candidate, 0) + 1
+
+            shared: Dict[int, int] = {}
+            max_size = settings.SUGGESTION_MAX_GROUP_SIZE
+            for group in self._user_groups.neighbors(me):
+                if self._group_members.degree(group) > max_size:
+                    continue
+                for candidate in self._group_members.neighbors(group):
+                    shared[candidate] = shared.get(candidate, 0) + 1
+
+            scored = (
+                (
+                    MUTUAL_FRIEND_WEIGHT * mutual.get(c, 0) + SHARED_GROUP_WEIGHT * shared.get(c, 0),
+                    mutual.get(c, 0),
+                    c,
+                )
+                for c in mutual.keys() | shared.keys()
+                if c != me and c not in mine
+            )
+            top = heapq.nsmallest(limit, scored, key=lambda s: (-s[0], -s[1], s[2]))
+            return [
+                {
+                    "user_id": self._users.key(c),
+                    "score": score,
+                    "mutual_friends": m,
+                    "shared_groups": shared.get(c, 0),
+                }
+                for score, m, c in top
+            ]
+
+
+social_graph = SocialGraph()
+
+_reload_lock = threading.Lock()
+
+
+def _read_pairs(table: str, first: str, second: str) -> List[Tuple[str, str]]:
+    """Every (first, second) row of table, in keyset pages."""
+    pairs: List[Tuple[str, str]] = []
+    last = None
+    while True:
+        query = supabase.table(table).select(f"{first}, {second}")
+        if last is not None:
+            query = query.or_(
+                f'{first}.gt."{last[0]}",and({first}.eq."{last[0]}",{second}.gt."{last[1]}")'
+            )
+        res = query.order(first).order(second).limit(LOAD_PAGE_SIZE).execute()
+        page = res.data or []
+        pairs.extend((str(r[first]), str(r[second])) for r in page)
+        if len(page) < LOAD_PAGE_SIZE:
+            return pairs
+        last = (page[-1][first], page[-1][second])
+
+
+def load_social_graph() -> None:
+    """Rebuild the graph from friend_links and group_members."""
+    links = _read_pairs("friend_links", "owner_id", "friend_id")
+    memberships = _read_pairs("group_members", "group_id", "user_id")
+    social_graph.replace(links, memberships)
+
+
+def ensure_social_graph() -> None:
+    """Load on first use; reload in the background once the graph is old."""
+    if social_graph.loaded_at is None:
+        with _reload_lock:
+            if social_graph.loaded_at is None:
+                load_social_graph()
+        return
+
+    age = time.monotonic() - social_graph.loaded_at
+    if age < settings.SOCIAL_GRAPH_REFRESH_SECONDS or not _reload_lock.acquire(blocking=False):
+        return
+
+    def reload() -> None:
+        try:
+            load_social_graph()
+        except Exception as e:
+            print(f"Social graph reload failed: {e}")
+        finally:
+            _reload_lock.release()
+
+    threading.Thread(target=reload, daemon=True).start()
@@ -3,7 +3,9 @@ import logging
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from typing import Optional, Any, Dict, List
+import threading
 import uuid
+from datetime import datetime, timezone
 
 # Load .env from the project root
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "../../.env"))
@@ -27,11 +29,101 @@ else:
         "using in memory fake supabase client."
     )
 
+    # Serialises statements against the shared in memory store
+    _DB_LOCK = threading.RLock()
+
     class ExecResult:
         def __init__(self, data: Any):
             # Store returned data from fake query
             self.data = data
 
+    def _split_top_level(text: str) -> List[str]:
+        # Split on commas that are not inside parentheses or quotes
+        parts, depth, quoted, current = [], 0, False, ""
+        for ch in text:
+            if ch == '"':
+                quoted = not quoted
+            elif not quoted and ch == "(":
+                depth += 1
+            elif not quoted and ch == ")":
+                depth -= 1
+            if ch == "," and depth == 0 and not quoted:
+                parts.append(current)
+                current = ""
+            else:
+                current += ch
+        if current:
+            parts.append(current)
+        return parts
+
+    def _parse_logic(op: str, body: str) -> Any:
+        # Returns ("and"|"or"|"not", [children]) or ("cond", column, operator, value)
+        body = body.strip()
+        if body.startswith("(") and body.endswith(")"):
+            body = body[1:-1]
+        children = []
+        for part in _split_top_level(body):
+            part = part.strip()
+            if part.startswith("and(") or part.startswith("or("):
+                name, _, rest = part.partition("(")
+                children.append(_parse_logic(name, "(" + rest))
+            else:
+                column, operator, value = part.split(".", 2)
+                if operator == "not":
+                    # e.g. "name.not.is.null"
+                    operator, value = value.split(".", 1)
+                    children.append(("not", [("cond", column, operator, value.strip('"'))]))
+                    continue
+                children.append(("cond", column, operator, value.strip('"')))
+        return (op, children)
+
+    def _compare(left: Any, op: str, right: Any) -> bool:
+        # Compare a row value with a filter value, coercing numbers
+        if left is None:
+            return op == "is" and str(right) == "null"
+        if isinstance(left, (int, float)) and not isinstance(right, (int, float)):
+            try:
+                right = float(right)
+            except ValueError:
+                left = str(left)
+        elif isinstance(right, (int, float)) and not isinstance(left, (int, float)):
+            right = str(right)
+        if op == "is":
+            return False  # only "is.null" is supported, and left is not null
+        if op == "eq":
+            return left == right
+        if op == "neq":
+            return left != right
+        if op == "gt":
+            return left > right
+        if op == "gte":
+            return left >= right
+        if op == "lt":
+            return left < right
+        if op == "lte":
+            return left <= right
+        if op == "ilike":
+            pattern = str(right).lower().replace("*", "%")
+            text = str(left).lower()
+            if pattern.startswith("%") and pattern.endswith("%"):
+                return pattern.strip("%") in text
+            if pattern.endswith("%"):
+                return text.startswith(pattern.rstrip("%"))
+            if pattern.startswith("%"):
+                return text.endswith(pattern.lstrip("%"))
+            return text == pattern
+        raise ValueError(f"Unsupported operator in fake client: {op}")
+
+    def _eval_logic(tree: Any, row: Dict[str, Any]) -> bool:
+        if tree[0] == "cond":
+            _, column, operator, value = tree
+            return _compare(row.get(column), operator, value)
+        op, children = tree
+        results = (_eval_logic(child, row) for child in children)
+        if op == "not":
+            return not all(results)
+        return any(results) if op == "or" else all(results)
+
     class TableMock:
         def __init__(self, db: Dict[str, List[Dict[str, Any]]], name: str):
             # Keep reference to global in memory store and table name
@@ -42,6 +134,14 @@ else:
             self._filters = []
             self._limit = None
             self._select_cols = None
+            self._in_filters = []
+            self._neq_filters = []
+            self._contains_filters = []
+            self._cmp_filters = []
+            self._is_filters = []
+            self._logic_filters = []
+            self._order = []
+            self._single = False
 
         def select(self, cols: str = "*"):
             # Mark this operation as a select with optional column list
@@ -54,12 +154,77 @@ else:
             self._filters.append((column, value))
             return self
 
-        def insert(self, payload: Dict[str, Any]):
+        def neq(self, column: str, value: Any):
+            # Add an inequality filter for later execution
+            self._neq_filters.append((column, value))
+            return self
+
+        def gt(self, column: str, value: Any):
+            self._cmp_filters.append((column, "gt", value))
+            return self
+
+        def gte(self, column: str, value: Any):
+            self._cmp_filters.append((column, "gte", value))
+            return self
+
+        def lt(self, column: str, value: Any):
+            self._cmp_filters.append((column, "lt", value))
+            return self
+
+        def lte(self, column: str, value: Any):
+            self._cmp_filters.append((column, "lte", value))
+            return self
+
+        def ilike(self, column: str, pattern: str):
+            # Case insensitive LIKE ('abc%', '%abc%', ...)
+            self._cmp_filters.append((column, "ilike", pattern))
+            return self
+
+        def is_(self, column: str, value: Any):
+            # IS NULL / IS TRUE / IS FALSE filter
+            expected = {"null": None, "true": True, "false": False}.get(str(value).lower(), value)
+            self._is_filters.append((column, expected))
+            return self
+
+        def or_(self, filters: str):
+            # PostgREST logic tree, e.g. "a.eq.1,and(b.lt.2,c.gte.3)"
+            self._logic_filters.append(_parse_logic("or", filters))
+            return self
+
+        def in_(self, column: str, values: List[Any]):
+            # Add a membership filter for later execution
+            self._in_filters.append((column, list(values)))
+            return self
+
+        def contains(self, column: str, values: List[Any]):
+            # Keep rows whose list column holds every given value
+            self._contains_filters.append((column, list(values)))
+            return self
+
+        def single(self):
+            # Return one row (or None) instead of a list
+            self._single = True
+            return self
+
+        def order(self, column: str, desc: bool = False, nullsfirst: Optional[bool] = None):
+            # Record an ordering applied to select results
+            self._order.append((column, desc))
+            return self
+
+        def insert(self, payload: Any):
             # Mark this operation as an insert and store payload
             self._action = "insert"
             self._payload = payload
             return self
 
+        def upsert(self, payload: Any, on_conflict: str = "id", ignore_duplicates: bool = False):
+            # Insert, or update/skip rows that collide on the conflict columns
+            self._action = "upsert"
+            self._payload = payload
+            self._conflict_cols = [c.strip() for c in on_conflict.split(",") if c.strip()]
+            self._ignore_duplicates = ignore_duplicates
+            return self
+
         def update(self, payload: Dict[str, Any]):
             # Mark this operation as an update and store payload
             self._action = "update"
@@ -76,51 +241,104 @@ else:
             self._limit = n
             return self
 
+        def _matches(self, row: Dict[str, Any]) -> bool:
+            # True if the row passes every queued filter
+            for col, val in self._filters:
+                if row.get(col) != val:
+                    return False
+            for col, vals in self._in_filters:
+                if row.get(col) not in vals:
+                    return False
+            for col, val in self._neq_filters:
+                # SQL semantics: NULL <> x is not true
+                if row.get(col) is None or row.get(col) == val:
+                    return False
+            for col, vals in self._contains_filters:
+                if not set(vals) <= set(row.get(col) or []):
+                    return False
+            for col, op, val in self._cmp_filters:
+                if not _compare(row.get(col), op, val):
+                    return False
+            for col, val in self._is_filters:
+                if row.get(col) is not val:
+                    return False
+            for tree in self._logic_filters:
+                if not _eval_logic(tree, row):
+                    return False
+            return True
+
         def execute(self):
+            # One statement at a time keeps the shared in memory store
+            # consistent for background threads; it models no locking
+            with _DB_LOCK:
+                return self._run()
+
+        def _run(self):
             # Perform the queued action against the in memory table
             table = self._db.setdefault(self._name, [])
 
             if self._action == "select":
-                rows = list(table)
-                for col, val in self._filters:
-                    rows = [r for r in rows if r.get(col) == val]
+                view = FAKE_VIEWS.get(self._name)
+                rows = view(self._db) if view else list(table)
+                rows = [dict(r) for r in rows if self._matches(r)]
+                # Apply orderings last-to-first so the first one wins
+                for col, desc in reversed(self._order):
+                    rows.sort(key=lambda r: (r.get(col) is not None, r.get(col)), reverse=desc)
                 if self._select_cols and self._select_cols != "*":
                     cols = [c.strip() for c in self._select_cols.split(",")]
                     rows = [{c: r.get(c) for c in cols if c in r} for r in rows]
                 if self._limit is not None:
                     rows = rows[: self._limit]
+                if self._single:
+                    return ExecResult(rows[0] if rows else None)
                 return ExecResult(rows)
 
+            writer = FAKE_VIEW_WRITES.get(self._name)
+            if writer is not None and self._action in ("insert", "update", "delete"):
+                return ExecResult(writer(self._db, self._action, self._payload, self._matches))
+
             if self._action == "insert":
-                row = dict(self._payload)
-                if "id" not in row:
-                    row["id"] = str(uuid.uuid4())
-                table.append(row)
-                return ExecResult([row])
+                payloads = self._payload if isinstance(self._payload, list) else [self._payload]
+                inserted = []
+                for payload in payloads:
+                    row = {**_column_defaults(self._name), **payload}
+                    if "id" not in row:
+                        row["id"] = str(uuid.uuid4())
+                    table.append(row)
+                    inserted.append(row)
+                return ExecResult(inserted)
+
+            if self._action == "upsert":
+                payloads = self._payload if isinstance(self._payload, list) else [self._payload]
+                written = []
+                for payload in payloads:
+                    key = tuple(payload.get(c) for c in self._conflict_cols)
+                    existing = next(
+                        (r for r in table if tuple(r.get(c) for c in self._conflict_cols) == key),
+                        None,
+                    )
+                    if existing is None:
+                        row = {**_column_defaults(self._name), **payload}
+                        table.append(row)
+                        written.append(dict(row))
+                    elif not self._ignore_duplicates:
+                        existing.update(payload)
+                        written.append(dict(existing))
+                return ExecResult(written)
 
             if self._action == "update":
                 updated = []
                 for r in table:
-                    match = True
-                    for col, val in self._filters:
-                        if r.get(col) != val:
-                            match = False
-                            break
-                    if match:
+                    if self._matches(r):
                         r.update(self._payload)
-                        updated.append(r)
+                        updated.append(dict(r))
                 return ExecResult(updated)
 
             if self._action == "delete":
                 remaining = []
                 deleted = []
                 for r in table:
-                    match = True
-                    for col, val in self._filters:
-                        if r.get(col) != val:
-                            match = False
-                            break
-                    if match:
+                    if self._matches(r):
                         deleted.append(r)
                     else:
                         remaining.append(r)
@@ -130,6 +348,290 @@ else:
             # Default case returns empty result
             return ExecResult([])
 
+    def _expense_history_view(db: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # Mirror of the expense_history view from supabase/migrations
+        expenses = db.get("expenses", [])
+        participants = db.get("expense_participants", [])
+        group_names = {g.get("id"): g.get("name") for g in db.get("groups", [])}
+        user_names = {u.get("id"): u.get("name") for u in db.get("users", [])}
+
+        total_by_expense: Dict[Any, float] = {}
+        mine: Dict[Any, Dict[Any, float]] = {}
+        for p in participants:
+            eid = p.get("expense_id")
+            share = float(p.get("share") or 0)
+            total_by_expense[eid] = total_by_expense.get(eid, 0.0) + share
+            by_member = mine.setdefault(eid, {})
+            by_member[p.get("member_id")] = by_member.get(p.get("member_id"), 0.0) + share
+
+        rows = []
+        for e in expenses:
+            eid = e.get("id")
+            base = {
+                "expense_id": eid,
+                "creator_id": e.get("user_id"),
+                "group_id": e.get("group_id"),
+                "description": e.get("description"),
+                "expense_date": e.get("expense_date"),
+                "created_at": e.get("created_at"),
+                "group_name": group_names.get(e.get("group_id")),
+                "creator_name": user_names.get(e.get("user_id")),
+            }
+            rows.append(
+                {**base, "viewer_id": e.get("user_id"), "kind": "paid",
+                 "amount": total_by_expense.get(eid, 0.0)}
+            )
+            for member_id, share in mine.get(eid, {}).items():
+                if member_id == e.get("user_id"):
+                    continue
+                rows.append(
+                    {**base, "viewer_id": member_id, "kind": "received",
+                     "amount": -share}
+                )
+        return rows
+
+    def _participant_obligations(db: Dict[str, List[Dict[str, Any]]]):
+        # (payments view row, backing expense_participants row) pairs
+        expenses = {e.get("id"): e for e in db.get("expenses", [])}
+        for p in db.get("expense_participants", []):
+            e = expenses.get(p.get("expense_id"))
+            if e is None or p.get("member_id") == e.get("user_id"):
+                continue
+            if float(p.get("share") or 0) <= 0:
+                continue
+            yield {
+                "id": p.get("payment_id"),
+                "group_id": e.get("group_id"),
+                "expense_id": e.get("id"),
+                "from_user_id": e.get("user_id"),
+                "to_user_id": p.get("member_id"),
+                "amount": p.get("share"),
+                "status": p.get("status") or "requested",
+                "created_at": e.get("created_at"),
+                "paid_at": p.get("paid_at"),
+                "paid_via": p.get("paid_via"),
+            }, p
+
+    def _payments_view(db: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # Mirror of the payments view: standalone records + participant shares
+        rows = list(db.get("payment_records", []))
+        rows.extend(row for row, _ in _participant_obligations(db))
+        return rows
+
+    def _payments_view_write(db, action, payload, matches) -> List[Dict[str, Any]]:
+        # Mirror of the payments_view_write INSTEAD OF trigger
+        records = db.setdefault("payment_records", [])
+        if action == "insert":
+            payloads = payload if isinstance(payload, list) else [payload]
+            inserted = [{**_column_defaults("payment_records"), **p} for p in payloads]
+            records.extend(inserted)
+            return [dict(r) for r in inserted]
+
+        if action == "delete":
+            db["payment_records"] = [r for r in records if not matches(r)]
+            return [dict(r) for r in records if matches(r)]
+
+        updated = []
+        for r in records:
+            if matches(r):
+                r.update(payload)
+                updated.append(dict(r))
+        settlement = {k: v for k, v in payload.items() if k in ("status", "paid_at", "paid_via")}
+        for row, participant in list(_participant_obligations(db)):
+            if matches(row):
+                participant.update(settlement)
+                updated.append({**row, **settlement})
+        return updated
+
+    def _column_defaults(name: str) -> Dict[str, Any]:
+        # Server side column defaults the app relies on
+        if name == "expense_participants":
+            return {"payment_id": str(uuid.uuid4()), "status": "requested",
+                    "paid_at": None, "paid_via": None}
+        if name == "payment_records":
+            return {"id": str(uuid.uuid4()), "status": "requested"}
+        if name == "group_members":
+            return {"role": "member", "joined_at": datetime.now(timezone.utc).isoformat()}
+        if name == "groups":
+            return {"version": 0, "created_at": datetime.now(timezone.utc).isoformat()}
+        if name == "group_deletion_jobs":
+            return {"deleted_expenses": 0, "deleted_participants": 0, "deleted_payments": 0,
+                    "deleted_notifications": 0, "member_ids": [], "error": None, "finished_at": None,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "updated_at": datetime.now(timezone.utc).isoformat()}
+        return {}
+
+    def _user_groups_view(db: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # Mirror of the user_groups view: one row per (member, group)
+        groups = {g.get("id"): g for g in db.get("groups", [])}
+        memberships = db.get("group_members", [])
+        counts: Dict[Any, int] = {}
+        for m in memberships:
+            counts[m.get("group_id")] = counts.get(m.get("group_id"), 0) + 1
+
+        rows = []
+        for m in memberships:
+            g = groups.get(m.get("group_id"))
+            if g is None:
+                continue
+            rows.append({
+                "member_id": m.get("user_id"),
+                "role": m.get("role"),
+                "joined_at": m.get("joined_at"),
+                **{k: g.get(k) for k in ("id", "name", "description", "owner_id", "created_at")},
+                "member_count": counts[g.get("id")],
+                "version": g.get("version"),
+            })
+        return rows
+
+    def _group_member_profiles_view(db: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # Mirror of the group_member_profiles view
+        users = {u.get("id"): u for u in db.get("users", [])}
+        rows = []
+        for m in db.get("group_members", []):
+            u = users.get(m.get("user_id"))
+            if u is None:
+                continue
+            rows.append({
+                "group_id": m.get("group_id"),
+                "user_id": m.get("user_id"),
+                "role": m.get("role"),
+                "joined_at": m.get("joined_at"),
+                "name": u.get("name"),
+                "username": u.get("username"),
+                "email": u.get("email"),
+                "sort_name": (u.get("name") or u.get("username") or "").lower(),
+            })
+        return rows
+
+    def _friend_profiles_view(db: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # Mirror of the friend_profiles view
+        users = {u.get("id"): u for u in db.get("users", [])}
+        rows = []
+        for link in db.get("friend_links", []):
+            u = users.get(link.get("friend_id"))
+            if u is None:
+                continue
+            rows.append({
+                **{k: link.get(k) for k in ("id", "owner_id", "friend_id", "note", "created_at")},
+                "name": u.get("name"),
+                "username": u.get("username"),
+                "email": u.get("email"),
+                "sort_name": (u.get("name") or u.get("username") or "").lower(),
+            })
+        return rows
+
+    def _users_view(db: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # users with its generated username_key column (lower(username))
+        return [
+            {**u, "username_key": u["username"].lower() if u.get("username") else None}
+            for u in db.get("users", [])
+        ]
+
+    def _notification_counters_view(db: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # Mirror of the trigger maintained notification_counters table
+        counts: Dict[Any, int] = {}
+        for n in db.get("notifications", []):
+            if n.get("to_user") is not None and n.get("status") != "read":
+                counts[n["to_user"]] = counts.get(n["to_user"], 0) + 1
+        return [{"user_id": user_id, "unread": unread} for user_id, unread in counts.items()]
+
+    # Views are computed from the in memory tables on every select
+    FAKE_VIEWS = {
+        "expense_history": _expense_history_view,
+        "payments": _payments_view,
+        "user_groups": _user_groups_view,
+        "group_member_profiles": _group_member_profiles_view,
+        "friend_profiles": _friend_profiles_view,
+        "users": _users_view,
+        "notification_counters": _notification_counters_view,
+    }
+
+    # Writable views: insert/update/delete are routed like their triggers
+    FAKE_VIEW_WRITES = {
+        "payments": _payments_view_write,
+    }
+
+    def _relation_rows(db: Dict[str, List[Dict[str, Any]]], name: str) -> List[Dict[str, Any]]:
+        # Rows of a table or fake view, as RPCs would read them
+        view = FAKE_VIEWS.get(name)
+        return view(db) if view else list(db.get(name, []))
+
+    def _payment_balance_summary(
+        db: Dict[str, List[Dict[str, Any]]], p_user_id: str, p_breakdown: bool = False
+    ) -> Dict[str, Any]:
+        # Mirror of the payment_balance_summary SQL function
+        owed_by = owed_to = 0.0
+        by_counterparty: Dict[Any, Dict[str, Any]] = {}
+        by_group: Dict[Any, Dict[str, Any]] = {}
+
+        for p in _relation_rows(db, "payments"):
+            if p.get("status") != "requested":
+                continue
+            if p.get("to_user_id") == p_user_id:
+                key, counterparty = "owed_by_user", p.get("from_user_id")
+            elif p.get("from_user_id") == p_user_id:
+                key, counterparty = "owed_to_user", p.get("to_user_id")
+            else:
+                continue
+
+            amount = float(p.get("amount") or 0)
+            if key == "owed_by_user":
+                owed_by += amount
+            else:
+                owed_to += amount
+
+            c = by_counterparty.setdefault(
+                counterparty,
+                {"counterparty_id": counterparty, "owed_by_user": 0.0, "owed_to_user": 0.0},
+            )
+            c[key] += amount
+            g = by_group.setdefault(
+                p.get("group_id"),
+                {"group_id": p.get("group_id"), "owed_by_user": 0.0, "owed_to_user": 0.0},
+            )
+            g[key] += amount
+
+        return {
+            "amount_owed_by_user": owed_by,
+            "amount_owed_to_user": owed_to,
+            "by_counterparty": list(by_counterparty.values()) if p_breakdown else None,
+            "by_group": list(by_group.values()) if p_breakdown else None,
+        }
+
+    def _group_member_balances(db: Dict[str, List[Dict[str, Any]]], p_group_id: str) -> List[Dict[str, Any]]:
+        # Mirror of the group_member_balances SQL function
+        balances: Dict[Any, Dict[str, Any]] = {}
+        for p in _relation_rows(db, "payments"):
+            if p.get("group_id") != p_group_id or p.get("status") != "requested":
+                continue
+            amount = float(p.get("amount") or 0)
+            for user_id, key in ((p.get("to_user_id"), "owed_by_user"), (p.get("from_user_id"), "owed_to_user")):
+                b = balances.setdefault(
+                    user_id, {"user_id": user_id, "owed_by_user": 0.0, "owed_to_user": 0.0}
+                )
+                b[key] += amount
+        return list(balances.values())
+
+    # Postgres functions callable through supabase.rpc(name, params)
+    FAKE_RPCS = {
+        "payment_balance_summary": _payment_balance_summary,
+        "group_member_balances": _group_member_balances,
+    }
+
+    class RpcMock:
+        def __init__(self, db: Dict[str, List[Dict[str, Any]]], name: str, params: Dict[str, Any]):
+            self._db = db
+            self._name = name
+            self._params = params or {}
+
+        def execute(self):
+            func = FAKE_RPCS.get(self._name)
+            if func is None:
+                raise ValueError(f"Unknown RPC in fake client: {self._name}")
+            with _DB_LOCK:
+                return ExecResult(func(self._db, **self._params))
+
     class FakeSupabase:
         def __init__(self):
             # Global in memory store keyed by table name
@@ -139,6 +641,10 @@ else:
             # Create a TableMock bound to the given table name
             return TableMock(self._db, name)
 
+        def rpc(self, name: str, params: Optional[Dict[str, Any]] = None) -> RpcMock:
+            # Call a fake Postgres function against the in memory store
+            return RpcMock(self._db, name, params or {})
+
     # Expose fake client as module level supabase object
     supabase = FakeSupabase()
 
@@ -0,0 +1,160 @@
+"""
+In-process username index for prefix autocomplete.
+
+UsernameIndex keeps every username case folded in one sorted list, so the
+matches for a prefix are a contiguous slice that starts at a single
+binary search. Memory is one short string and one tuple per user and is capped
+by USERNAME_INDEX_MAX_ENTRIES; past the cap the index reports itself as
+incomplete and callers fall back to the database.
+
+The index is loaded at startup (and lazily on first use), updated in place
+on signup and account rename, and reloaded in the background once it is
+older than USERNAME_INDEX_REFRESH_SECONDS so changes made by other workers
+show up. Like the caches in cache.py it lives in the current process only.
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .config import settings
+from .supabase_client import supabase
+
+LOAD_PAGE_SIZE = 1000
+
+
+def _fold(username: str) -> str:
+    return username.strip().casefold()
+
+
+class UsernameIndex:
+    """Thread safe sorted array of (folded username, user id) pairs."""
+
+    def __init__(self, max_entries: int = 500_000):
+        self.max_entries = max_entries
+        self.complete = False
+        self.loaded_at: Optional[float] = None
+        self._keys: List[str] = []
+        self._entries: List[Tuple[str, str]] = []  # (user_id, username)
+        self._by_user: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def replace(self, rows: List[Tuple[str, str]], complete: bool = True) -> None:
+        """Swap in a full set of (user_id, username) rows."""
+        pairs = sorted(
+            (_fold(username), user_id, username)
+            for user_id, username in rows
+            if username
+        )
+        complete = complete and len(pairs) <= self.max_entries
+        del pairs[self.max_entries:]
+        with self._lock:
+            self._keys = [key for key, _, _ in pairs]
+            self._entries = [(user_id, username) for _, user_id, username in pairs]
+            self._by_user = {user_id: key for key, user_id, _ in pairs}
+            self.complete = complete
+            self.loaded_at = time.monotonic()
+
+    def add(self, user_id: str, username: str) -> None:
+        """Insert a user, or move them if their username changed."""
+        if not user_id or not username:
+            return
+        key = _fold(username)
+        with self._lock:
+            # A rename frees its own slot; only a new user can hit the cap
+            if user_id not in self._by_user and len(self._keys) >= self.max_entries:
+                self.complete = False
+                return
+            self._remove_locked(user_id)
+            pos = bisect.bisect_left(self._keys, key)
+            self._keys.insert(pos, key)
+            self._entries.insert(pos, (user_id, username))
+            self._by_user[user_id] = key
+
+    def remove(self, user_id: str) -> None:
+        with self._lock:
+            self._remove_locked(user_id)
+
+    def _remove_locked(self, user_id: str) -> None:
+        key = self._by_user.pop(user_id, None)
+        if key is None:
+            return
+        pos = bisect.bisect_left(self._keys, key)
+        while pos < len(self._keys) and self._keys[pos] == key:
+            if self._entries[pos][0] == user_id:
+                del self._keys[pos]
+                del self._entries[pos]
+                return
+            pos += 1
+
+    def search(self, prefix: str, limit: int = 10) -> List[Dict[str, str]]:
+        """Up to limit users whose username starts with prefix, in order."""
+        key = _fold(prefix)
+        if not key:
+            return []
+        with self._lock:
+            start = bisect.bisect_left(self._keys, key)
+            end = min(start + limit, len(self._keys))
+            matches = []
+            for pos in range(start, end):
+                if not self._keys[pos].startswith(key):
+                    break
+                user_id, username = self._entries[pos]
+                matches.append({"id": user_id, "username": username})
+        return matches
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys, self._entries, self._by_user = [], [], {}
+            self.complete = False
+            self.loaded_at = None
+
+
+username_index = UsernameIndex(settings.USERNAME_INDEX_MAX_ENTRIES)
+
+_reload_lock = threading.Lock()
+
+
+def load_username_index() -> None:
+    """Read every (id, username) from public.users in keyset pages."""
+    rows: List[Tuple[str, str]] = []
+    last_id = None
+    # One page past the cap is enough to know the index is incomplete
+    while len(rows) <= username_index.max_entries:
+        query = supabase.table("users").select("id, username")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        res = query.order("id").limit(LOAD_PAGE_SIZE).execute()
+        page = res.data or []
+        rows.extend((str(r["id"]), r.get("username") or "") for r in page)
+        if len(page) < LOAD_PAGE_SIZE:
+            break
+        last_id = page[-1]["id"]
+    username_index.replace(rows)
+
+
+def ensure_username_index() -> None:
+    """Load on first use; reload in the background once the index is old."""
+    if username_index.loaded_at is None:
+        with _reload_lock:
+            if username_index.loaded_at is None:
+                load_username_index()
+        return
+
+    age = time.monotonic() - username_index.loaded_at
+    if age < settings.USERNAME_INDEX_REFRESH_SECONDS or not _reload_lock.acquire(blocking=False):
+        return
+
+    def reload() -> None:
+        try:
+            load_username_index()
+        except Exception as e:
+            print(f"Username index reload failed: {e}")
+        finally:
+            _reload_lock.release()
+
+    threading.Thread(target=reload, daemon=True).start()
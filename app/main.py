@@ -1,6 +1,7 @@
 # FILE: app/main.py
 # Main FastAPI entry point. Wires routes, templates, static, and health checks.
 
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, Request
@@ -11,11 +12,32 @@ import os
 
 from .core.supabase_client import supabase
 from .core.config import settings
+from .core.concurrency import run_db
+from .core.usernames import load_username_index
+from .core.notifications import notification_queue
+
+
+# ------------------------
+# STARTUP / SHUTDOWN
+# ------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the username autocomplete index; if this fails it loads on
+    # the first /api/users/search call instead.
+    try:
+        await run_db(load_username_index)
+    except Exception as e:
+        print(f"Username index load failed at startup: {e}")
+    notification_queue.start()
+    yield
+    # Write queued notifications before the process exits
+    await run_db(notification_queue.stop)
+
 
 # ------------------------
 # APP + PATHS
 # ------------------------
-app = FastAPI(title="Expense Splitter API")
+app = FastAPI(title="Expense Splitter API", lifespan=lifespan)
 
 BASE_DIR = Path(__file__).parent
 STATIC_DIR = BASE_DIR / "static"
@@ -1,11 +1,14 @@
 # app/routers/account.py
 
-from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, HTTPException
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
 
 from .auth import get_current_user
+from .dashboard import invalidate_dashboard
 from ..core.supabase_client import supabase
+from ..core.notifications import refresh_sender_name
+from ..core.usernames import username_index
 from ..main import templates
 
 router = APIRouter(tags=["account"])
@@ -75,6 +78,7 @@ async def get_account(current_user=Depends(get_current_user)):
 @router.put("/api/account")
 async def update_account(
     payload: AccountUpdate,
+    background_tasks: BackgroundTasks,
     current_user=Depends(get_current_user),
 ):
     """
@@ -106,5 +110,13 @@ async def update_account(
         print(f"Error updating account: {e}")
         raise HTTPException(status_code=400, detail=f"Update failed: {str(e)}")
 
+    # Dashboard greeting uses the profile name
+    invalidate_dashboard(user_id)
+    # Keep username autocomplete in step with the rename
+    username_index.add(user_id, payload.username)
+    # Notifications carry a copy of the sender's username; the bulk rewrite
+    # runs after the response, in the threadpool rather than on the loop
+    background_tasks.add_task(refresh_sender_name, user_id, payload.username)
+
     user = _load_user_row(user_id)
     return {"user": user}
@@ -111,6 +111,7 @@ if TEST_MODE:
 # =========================================================
 else:
     from app.core.supabase_client import SUPABASE_URL, SUPABASE_KEY, supabase
+    from app.core.usernames import username_index
 
     AUTH_URL = f"{SUPABASE_URL}/auth/v1"
 
@@ -173,6 +174,7 @@ else:
                 "username": username,
             }
         ).execute()
+        username_index.add(user_id, username)
 
     def decode_jwt_no_verify(token: str) -> dict:
         """
@@ -242,6 +244,7 @@ else:
                     "username": username,
                 }
             ).execute()
+            username_index.add(auth_user_id, username)
         except Exception as e:
             raise HTTPException(
                 status_code=500,
@@ -374,14 +377,16 @@ else:
         if not rows:
             # If somehow missing, create a basic profile on the fly.
             if email_val:
+                username = generate_username_from_email(email_val)
                 supabase.table("users").insert(
                     {
                         "id": user_id,
                         "email": email_val,
                         "name": email_val.split("@")[0],
-                        "username": generate_username_from_email(email_val),
+                        "username": username,
                     }
                 ).execute()
+                username_index.add(user_id, username)
                 return {"id": user_id, "email": email_val}
 
             raise HTTPException(401, "Not authenticated")
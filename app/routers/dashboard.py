@@ -1,13 +1,32 @@
 # FILE: app/routers/dashboard.py
 
+import heapq
+import logging
+from itertools import islice
 from typing import Any, Dict, List, Tuple
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends
 from .auth import get_current_user
+from .history import HISTORY_VIEW, HISTORY_COLUMNS
 from ..core.supabase_client import supabase
+from ..core.concurrency import gather_db, run_db
+from ..core.cache import SnapshotCache
+from ..core.config import settings
 
 router = APIRouter(prefix="/api", tags=["dashboard"])
 
+logger = logging.getLogger(__name__)
+
+# Number of recent transactions shown on the dashboard
+RECENT_LIMIT = 5
+
+# One assembled /api/dashboard payload per user id
+dashboard_cache = SnapshotCache(
+    max_entries=settings.DASHBOARD_CACHE_MAX_USERS,
+    ttl_seconds=settings.DASHBOARD_CACHE_TTL_SECONDS,
+    stale_while_revalidate=settings.DASHBOARD_CACHE_STALE_WHILE_REVALIDATE,
+)
+
 
 def _extract_user_info(current_user: Any) -> Tuple[str, Dict[str, Any], str]:
     """
@@ -70,200 +89,94 @@ def _resolve_first_name(user_id: str, user_meta: Dict[str, Any], email: str) ->
     return local_part.capitalize() if local_part else "Friend"
 
 
-def _build_wallet_and_recent(user_id: str) -> Dict[str, Any]:
-    """
-    Build wallet totals and recent transactions for the dashboard using
-    the payments table for accurate owed/owing amounts.
-
-    Wallet calculation:
-      - owed (people owe you): sum of requested payments where from_user_id = you
-      - owing (you owe people): sum of requested payments where to_user_id = you
-    """
-    
-    # Get payments where others owe you (you are from_user_id, status = requested)
-    owed_resp = (
-        supabase.table("payments")
-        .select("amount, expense_id, created_at")
-        .eq("from_user_id", user_id)
-        .eq("status", "requested")
-        .execute()
-    )
-    owed_payments = owed_resp.data or []
-    
-    # Get payments where you owe others (you are to_user_id, status = requested)
-    owing_resp = (
-        supabase.table("payments")
-        .select("amount, expense_id, created_at")
-        .eq("to_user_id", user_id)
-        .eq("status", "requested")
+def _fetch_balance_totals(user_id: str) -> Dict[str, Any]:
+    """Outstanding owed/owing totals from the payment_balance_summary RPC."""
+    resp = (
+        supabase.rpc(
+            "payment_balance_summary",
+            {"p_user_id": user_id, "p_breakdown": False},
+        )
         .execute()
     )
-    owing_payments = owing_resp.data or []
-    
-    # Calculate totals
-    total_owed = sum(float(p.get("amount", 0)) for p in owed_payments)
-    total_owing = sum(float(p.get("amount", 0)) for p in owing_payments)
-    
-    net_balance = total_owed - total_owing
-    if net_balance > 0:
-        balance_class = "positive"
-    elif net_balance < 0:
-        balance_class = "negative"
-    else:
-        balance_class = "zero"
-    
-    # Get recent expenses for transaction history (from expenses table)
-    creator_resp = (
-        supabase.table("expenses")
-        .select(
-            "id, user_id, group_id, amount, description, "
-            "expense_date, created_at"
-        )
-        .eq("user_id", user_id)
+    return resp.data or {}
+
+
+def _fetch_recent_history(user_id: str, kind: str, limit: int) -> List[Dict[str, Any]]:
+    """
+    Newest non-zero history rows of one kind ("paid" or "received").
+    The database does the ordering and limit, so this returns at most
+    `limit` rows however long the user's history is.
+    """
+    resp = (
+        supabase.table(HISTORY_VIEW)
+        .select(HISTORY_COLUMNS)
+        .eq("viewer_id", user_id)
+        .eq("kind", kind)
+        .neq("amount", 0)
+        .order("expense_date", desc=True, nullsfirst=False)
+        .order("created_at", desc=True, nullsfirst=False)
+        .limit(limit)
         .execute()
     )
-    creator_expenses = creator_resp.data or []
-
-    creator_expense_ids: List[str] = []
-    group_ids = set()
-
-    for e in creator_expenses:
-        eid = e.get("id")
-        if not eid:
-            continue
-            continue
-        creator_expense_ids.append(eid)
-        group_id = e.get("group_id")
-        if group_id:
-            group_ids.add(group_id)
-
-    # 2. Expenses where this user is a participant
-    parts_resp = (
-        supabase.table("expense_participants")
-        .select("expense_id, share")
+    return resp.data or []
+
+
+def _fetch_groups(user_id: str) -> List[Dict[str, Any]]:
+    """Groups this user belongs to, via the group_members index."""
+    resp = (
+        supabase.table("user_groups")
+        .select("id,name")
         .eq("member_id", user_id)
         .execute()
     )
-    participant_rows = parts_resp.data or []
-
-    share_by_expense_for_me: Dict[str, float] = {}
-    participant_expense_ids: List[str] = []
-
-    for row in participant_rows:
-        eid = row.get("expense_id")
-        if not eid:
-            continue
-        share = float(row.get("share") or 0)
-        share_by_expense_for_me[eid] = share_by_expense_for_me.get(eid, 0.0) + share
-        participant_expense_ids.append(eid)
-
-    participant_expenses: List[Dict[str, Any]] = []
-    if participant_expense_ids:
-        part_exp_resp = (
-            supabase.table("expenses")
-            .select(
-                "id, user_id, group_id, amount, description, "
-                "expense_date, created_at"
-            )
-            .in_("id", participant_expense_ids)
-            .execute()
-        )
-        participant_expenses = part_exp_resp.data or []
-        for e in participant_expenses:
-            group_id = e.get("group_id")
-            if group_id:
-                group_ids.add(group_id)
-
-    # 3. Group names
-    group_name_by_id: Dict[str, str] = {}
-    if group_ids:
-        group_resp = (
-            supabase.table("groups")
-            .select("id, name")
-            .in_("id", list(group_ids))
-            .execute()
-        )
-        for g in group_resp.data or []:
-            gid = g.get("id")
-            if gid:
-                group_name_by_id[gid] = g.get("name") or ""
-
-    # 4. For creator expenses, compute how much others owe me
-    net_owed_to_me_by_expense: Dict[str, float] = {}
-    if creator_expense_ids:
-        shares_resp = (
-            supabase.table("expense_participants")
-            .select("expense_id, share")
-            .in_("expense_id", creator_expense_ids)
-            .execute()
-        )
-        for row in shares_resp.data or []:
-            eid = row.get("expense_id")
-            if not eid:
-                continue
-            share = float(row.get("share") or 0)
-            net_owed_to_me_by_expense[eid] = (
-                net_owed_to_me_by_expense.get(eid, 0.0) + share
-            )
-
-    # 5. Build creator entries (green on history)
-    entries: List[Dict[str, Any]] = []
-
-    for e in creator_expenses:
-        eid = e.get("id")
-        if not eid:
-            continue
-
-        amount_val = net_owed_to_me_by_expense.get(eid, 0.0)
-        if amount_val == 0:
-            continue
-
-        group_name = group_name_by_id.get(e.get("group_id"), "")
-        date_val = e.get("expense_date") or e.get("created_at") or ""
-
-        entries.append(
-            {
-                "kind": "paid",  # you created it, others owe you
-                "amount": float(amount_val),
-                "date": date_val,
-                "group_name": group_name,
-                "description": e.get("description") or "",
-            }
-        )
+    return resp.data or []
 
-    # 6. Build participant entries (red on history)
-    creator_expense_ids_set = {e.get("id") for e in creator_expenses if e.get("id")}
 
-    for e in participant_expenses:
-        eid = e.get("id")
-        if not eid:
-            continue
+def _entry_date(row: Dict[str, Any]) -> str:
+    """Expense date, falling back to created_at (ISO strings sort correctly)."""
+    return row.get("expense_date") or row.get("created_at") or ""
 
-        if eid in creator_expense_ids_set:
-            continue
 
-        date_val = e.get("expense_date") or e.get("created_at") or ""
-        group_name = group_name_by_id.get(e.get("group_id"), "")
+def _recent_order(row: Dict[str, Any]) -> tuple:
+    """
+    Sort key matching _fetch_recent_history's ORDER BY (expense_date desc
+    nulls last, created_at desc nulls last) when used with reverse=True.
+    """
+    expense_date, created_at = row.get("expense_date"), row.get("created_at")
+    return (expense_date is not None, expense_date or "", created_at is not None, created_at or "")
 
-        my_share = share_by_expense_for_me.get(eid, 0.0)
-        amount_val = -float(my_share)  # negative means you owe
 
-        if amount_val == 0:
-            continue
+def _merge_recent(
+    paid_rows: List[Dict[str, Any]],
+    received_rows: List[Dict[str, Any]],
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """
+    Merge two newest-first candidate lists into the overall newest `limit`
+    rows. Both inputs are already sorted by the database, and the merge
+    uses the same key, so a heap merge touches at most `limit` rows.
+    """
+    merged = heapq.merge(paid_rows, received_rows, key=_recent_order, reverse=True)
+    return list(islice(merged, limit))
 
-        entries.append(
-            {
-                "kind": "received",  # from history view, you are participant
-                "amount": float(amount_val),
-                "date": date_val,
-                "group_name": group_name,
-                "description": e.get("description") or "",
-            }
-        )
 
-    # 7. Wallet totals
-    total_owed = sum(e["amount"] for e in entries if e["amount"] > 0)
-    total_owing = sum(-e["amount"] for e in entries if e["amount"] < 0)
+def _build_wallet_and_recent(
+    balance_totals: Dict[str, Any],
+    recent_rows: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Build wallet totals and recent transactions for the dashboard from
+    rows that were already fetched concurrently by get_dashboard.
+
+    Wallet calculation:
+      - owed (people owe you): sum of requested payments where from_user_id = you
+      - owing (you owe people): sum of requested payments where to_user_id = you
+
+    Recent transactions are the newest history rows, already limited
+    and merged by _merge_recent.
+    """
+    total_owed = float(balance_totals.get("amount_owed_to_user") or 0)
+    total_owing = float(balance_totals.get("amount_owed_by_user") or 0)
 
     net_balance = total_owed - total_owing
     if net_balance > 0:
@@ -273,25 +186,16 @@ def _build_wallet_and_recent(user_id: str) -> Dict[str, Any]:
     else:
         balance_class = "zero"
 
-    # 8. Recent transactions, top 5 by date (same rows as history)
-    # Sort by date descending. Expense dates are ISO strings, so string sort works.
-    entries_sorted = sorted(
-        entries,
-        key=lambda r: r.get("date") or "",
-        reverse=True,
-    )
-    top5 = entries_sorted[:5]
-
     recent_transactions: List[Dict[str, Any]] = []
-    for row in top5:
-        amt = float(row["amount"])
+    for row in recent_rows:
+        amt = float(row.get("amount") or 0)
         sign = "+" if amt > 0 else "-"
         recent_transactions.append(
             {
-                "name": row["description"] or "Expense",
+                "name": row.get("description") or "Expense",
                 "amount": abs(amt),
                 "sign": sign,
-                "date": (row.get("date") or "")[:10],
+                "date": _entry_date(row)[:10],
                 "group_name": row.get("group_name") or "",
             }
         )
@@ -305,24 +209,36 @@ def _build_wallet_and_recent(user_id: str) -> Dict[str, Any]:
     }
 
 
-@router.get("/dashboard")
-async def get_dashboard(current_user=Depends(get_current_user)):
-    user_id, user_meta, email = _extract_user_info(current_user)
-    first_name = _resolve_first_name(user_id, user_meta, email)
-
-    # Groups where this user is in the members array
-    groups_resp = (
-        supabase.table("groups")
-        .select("id,name")
-        .contains("members", [user_id])
-        .execute()
+def invalidate_dashboard(*user_ids: Any) -> None:
+    """
+    Drop or mark stale the cached dashboard for each user id.
+    Call this after any write that changes a user's wallet, recent
+    transactions, groups, or display name.
+    """
+    dashboard_cache.invalidate(*(str(uid) for uid in user_ids if uid))
+
+
+async def _assemble_dashboard(
+    user_id: str, user_meta: Dict[str, Any], email: str
+) -> Dict[str, Any]:
+    """Run the dashboard queries and store the payload in the cache."""
+    token = dashboard_cache.begin_build(user_id)
+
+    # Every query below is independent, so run them side by side on the
+    # bounded worker pool instead of one after another on the event loop.
+    first_name, groups, balance_totals, recent_paid, recent_received = await gather_db(
+        run_db(_resolve_first_name, user_id, user_meta, email),
+        run_db(_fetch_groups, user_id),
+        run_db(_fetch_balance_totals, user_id),
+        run_db(_fetch_recent_history, user_id, "paid", RECENT_LIMIT),
+        run_db(_fetch_recent_history, user_id, "received", RECENT_LIMIT),
     )
-    groups = groups_resp.data or []
 
-    # Wallet and recent transactions based on history style logic
-    wallet_info = _build_wallet_and_recent(user_id)
+    # Wallet from outstanding payments, recent from the newest history rows
+    recent_rows = _merge_recent(recent_paid, recent_received, RECENT_LIMIT)
+    wallet_info = _build_wallet_and_recent(balance_totals, recent_rows)
 
-    return {
+    payload = {
         "user_name": first_name,
         "wallet": {
             "owed": wallet_info["total_owed"],
@@ -333,3 +249,39 @@ async def get_dashboard(current_user=Depends(get_current_user)):
         "groups": groups,
         "recent_transactions": wallet_info["recent_transactions"],
     }
+
+    if settings.DASHBOARD_CACHE_ENABLED:
+        dashboard_cache.store(user_id, payload, token)
+    return payload
+
+
+async def _refresh_dashboard(
+    user_id: str, user_meta: Dict[str, Any], email: str
+) -> None:
+    """Background rebuild for stale-while-revalidate reads."""
+    try:
+        await _assemble_dashboard(user_id, user_meta, email)
+    except Exception:
+        logger.exception("Dashboard refresh failed for %s", user_id)
+    finally:
+        dashboard_cache.release_refresh(user_id)
+
+
+@router.get("/dashboard")
+async def get_dashboard(
+    background_tasks: BackgroundTasks,
+    current_user=Depends(get_current_user),
+):
+    user_id, user_meta, email = _extract_user_info(current_user)
+
+    if settings.DASHBOARD_CACHE_ENABLED:
+        cached, state = dashboard_cache.lookup(user_id)
+        if state == SnapshotCache.FRESH:
+            return cached
+        if state == SnapshotCache.STALE:
+            # Serve the last snapshot now and rebuild after the response
+            if dashboard_cache.claim_refresh(user_id):
+                background_tasks.add_task(_refresh_dashboard, user_id, user_meta, email)
+            return cached
+
+    return await _assemble_dashboard(user_id, user_meta, email)
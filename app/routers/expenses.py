@@ -1,9 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends
 from pydantic import BaseModel, Field
 from datetime import date
 from typing import List, Optional, Literal
 from ..core.supabase_client import supabase
 from .auth import get_current_user
+from .dashboard import invalidate_dashboard
+from ..core.events import publish_balance_change
+from ..core.notifications import notify
+from .payments import net_new_obligations
+from ..core.config import settings
 import os
 
 router = APIRouter(prefix="/expenses", tags=["expenses"])
@@ -81,15 +86,24 @@ def _db_insert_participants(rows: List[dict]) -> List[dict]:
     return res.data or rows
 
 
-def _db_insert_payments(payment_rows: List[dict]) -> List[dict]:
-    """Insert payment request rows into the payments table."""
-    if not payment_rows:
-        return []
-    res = supabase.table("payments").insert(payment_rows).execute()
-    err = getattr(res, "error", None)
-    if err:
-        raise HTTPException(status_code=500, detail=str(err))
-    return res.data or payment_rows
+def _obligations_for(expense: dict, participants: List[dict]) -> List[dict]:
+    """
+    Payment rows the payments view exposes for a new expense: one per
+    participant other than the payer with a positive share.
+    """
+    return [
+        {
+            "id": p.get("payment_id"),
+            "group_id": expense.get("group_id"),
+            "expense_id": expense["id"],
+            "from_user_id": expense["user_id"],  # Who paid and is owed
+            "to_user_id": p["member_id"],         # Who owes the money
+            "amount": p["share"],
+            "status": p.get("status") or "requested",
+        }
+        for p in participants
+        if p["member_id"] != expense["user_id"] and p["share"] > 0
+    ]
 
 
 # -----------------------------
@@ -168,6 +182,7 @@ def get_expense(expense_id: str):
 @router.post("/", status_code=201)
 def create_expense(
     payload: ExpenseCreate,
+    background_tasks: BackgroundTasks,
     user=Depends(get_current_user),
 ):
     """Create a new expense and its participant shares."""
@@ -285,29 +300,25 @@ def create_expense(
     participants = _db_insert_participants(participant_rows)
 
     # -----------------------------
-    # Create payment requests
+    # Payment requests
     # -----------------------------
-    # For each participant (except the payer), create a payment request
-    # from that participant to the payer for their share
-    payment_rows = []
+    # Each non-payer share is already an outstanding obligation: the
+    # payments view derives it from expense_participants, so nothing else
+    # is written here. Echo the derived rows back for the caller.
     payer_id = user["id"]
-    
-    for s in splits:
-        member_id = s["member_id"]
-        share = s["share"]
-        
-        # Don't create a payment request for the payer themselves
-        if member_id != payer_id and share > 0:
-            payment_rows.append({
-                "group_id": payload.group_id,
-                "expense_id": expense_id,
-                "from_user_id": payer_id,  # Who paid and is owed
-                "to_user_id": member_id,    # Who owes the money
-                "amount": share,
-                "status": "requested",
-            })
-    
-    payments = _db_insert_payments(payment_rows)
+    payments = _obligations_for(inserted, participants)
+
+    # Payer and every participant now have a new wallet entry
+    invalidate_dashboard(payer_id, *payload.member_ids)
+    publish_balance_change(payer_id, *payload.member_ids)
+    # Queued; written in a batch after the response
+    notify("Expense", payer_id, payload.member_ids, payload.group_id)
+
+    # Collapse the new shares into each pair's open balance after responding
+    if settings.PAYMENT_AUTO_NETTING and payments:
+        background_tasks.add_task(
+            net_new_obligations, payer_id, payload.member_ids, payload.group_id
+        )
 
     return {
         "ok": True,
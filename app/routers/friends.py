@@ -1,17 +1,29 @@
 # FILE: app/routers/friends.py
 # Friends API endpoints backing the Friends pages.
-# Uses Supabase and the friend_links table.
+# Uses Supabase, the friend_links table and the friend_profiles view.
 
+import base64
+import json
 from typing import Optional, List
 
 from fastapi import APIRouter, HTTPException, Query, Request, Depends
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.routers.auth import get_current_user
 from ..core.supabase_client import supabase
+from ..core.responses import FastJSONResponse
+from ..core.batching import IN_CHUNK_SIZE, select_in
+from ..core.social_graph import ensure_social_graph, social_graph
 
 router = APIRouter(prefix="/api/friends", tags=["Friends"])
 
+DEFAULT_FRIEND_PAGE = 50
+MAX_FRIEND_PAGE = 500
+FRIEND_COLUMNS = "id, friend_id, note, name, username, email, sort_name"
+MAX_SUGGESTIONS = 50
+# One in_() chunk per stage, so a full request is still three round trips
+MAX_BULK_FRIENDS = IN_CHUNK_SIZE
+
 
 class FriendCreate(BaseModel):
   """Input model for creating a friend link."""
@@ -19,6 +31,11 @@ class FriendCreate(BaseModel):
   note: Optional[str] = None
 
 
+class BulkFriendCreate(BaseModel):
+  """Input model for adding many friends at once (contact import)."""
+  friends: List[FriendCreate] = Field(..., min_length=1, max_length=MAX_BULK_FRIENDS)
+
+
 class FriendRecord(BaseModel):
   """Output model for a single friend on the Friends page."""
   id: int                          # friend_links.id (internal link id)
@@ -30,115 +47,130 @@ class FriendRecord(BaseModel):
   group: str = ""  # Kept for frontend compatibility
 
 
-def _get_friend_profiles(friend_ids: List[str]):
+def _quote(value: str) -> str:
+  """Quote a value for a PostgREST logic tree (or=/and=)."""
+  return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _like_pattern(text: str) -> str:
+  """Substring ilike pattern with LIKE wildcards in the input escaped."""
+  text = text.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+  return f"%{text}%"
+
+
+def _encode_friend_cursor(row: dict) -> str:
+  raw = json.dumps([row.get("sort_name"), row["id"]])
+  return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_friend_cursor(cursor: str) -> tuple:
+  try:
+    sort_name, link_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    # friend_links.id is an integer; anything else never reaches the filter
+    if isinstance(link_id, bool) or not isinstance(link_id, (int, str)):
+      raise ValueError(link_id)
+    link_id = int(link_id)
+  except Exception:
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+  return str(sort_name), link_id
+
+
+def _fetch_friend_page(
+  owner_id: str,
+  *,
+  limit: int = DEFAULT_FRIEND_PAGE,
+  cursor: Optional[str] = None,
+  q: Optional[str] = None,
+  group: Optional[str] = None,
+) -> tuple[List[dict], Optional[str]]:
   """
-  Fetch profile rows for the given list of user ids.
-  Returns a dict keyed by user id.
+  One page of friend_profiles ordered by (sort_name, id).
+  q matches name, username or email and group matches the note, both as
+  case insensitive substrings. Returns the rows and the cursor for the
+  next page (None on the last page).
   """
-  if not friend_ids:
-    return {}
-
-  resp = (
+  query = (
     supabase
-    .table("users")
-    .select("id, name, username, email")
-    .in_("id", friend_ids)
+    .table("friend_profiles")
+    .select(FRIEND_COLUMNS)
+    .eq("owner_id", owner_id)
+  )
+  if q and q.strip():
+    pattern = _quote(_like_pattern(q))
+    query = query.or_(
+      f"name.ilike.{pattern},username.ilike.{pattern},email.ilike.{pattern}"
+    )
+  if group and group.strip():
+    query = query.ilike("note", _like_pattern(group))
+  if cursor:
+    sort_name, after_id = _decode_friend_cursor(cursor)
+    query = query.or_(
+      f"sort_name.gt.{_quote(sort_name)},"
+      f"and(sort_name.eq.{_quote(sort_name)},id.gt.{after_id})"
+    )
+
+  res = (
+    query.order("sort_name")
+    .order("id")
+    .limit(limit + 1)
     .execute()
   )
-  rows = getattr(resp, "data", None) or []
-  return {row["id"]: row for row in rows}
+  rows = getattr(res, "data", None) or []
+  next_cursor = _encode_friend_cursor(rows[limit - 1]) if len(rows) > limit else None
+  return rows[:limit], next_cursor
+
+
+def _friend_dict(row: dict) -> dict:
+  """FriendRecord shaped dict for a friend_profiles row."""
+  return {
+    "id": row["id"],
+    "friend_user_id": str(row["friend_id"]),
+    "name": row.get("name") or "",
+    "username": row.get("username") or "",
+    "email": row.get("email") or "",
+    "note": row.get("note") or "",
+    "group": "",  # No group field in friend_links; kept for UI shape
+  }
 
 
-@router.get("/")
+@router.get("/", response_class=FastJSONResponse)
 def list_friends(
   current_user=Depends(get_current_user),
   q: Optional[str] = Query(None),
   group: Optional[str] = Query(None),
+  limit: Optional[int] = Query(None, ge=1, le=MAX_FRIEND_PAGE),
+  cursor: Optional[str] = Query(None),
 ):
   """
-  List current user's friends.
-  Uses friend_links as the source of truth and joins to public.users.
-  Optional filters:
+  List current user's friends, sorted by name.
+  Reads the friend_profiles view (friend_links joined to public.users).
+  Optional filters, applied by the database:
     - q matches name, username, or email
     - group matches note (acts as a simple tag filter)
+  With limit (and cursor) the list is returned one page at a time and
+  next_cursor points at the following page. Without limit every
+  matching friend is returned.
   """
   owner_id = current_user["id"]
 
-  # Load all friend links for this owner.
-  links_resp = (
-    supabase
-    .table("friend_links")
-    .select("id, friend_id, note, created_at")
-    .eq("owner_id", owner_id)
-    .execute()
+  if limit is None and cursor is None:
+    records: List[dict] = []
+    page_cursor = None
+    while True:
+      rows, page_cursor = _fetch_friend_page(
+        owner_id, limit=MAX_FRIEND_PAGE, cursor=page_cursor, q=q, group=group
+      )
+      records.extend(_friend_dict(row) for row in rows)
+      if not page_cursor:
+        return FastJSONResponse({"friends": records, "next_cursor": None})
+
+  rows, next_cursor = _fetch_friend_page(
+    owner_id, limit=limit or DEFAULT_FRIEND_PAGE, cursor=cursor, q=q, group=group
   )
-  links = getattr(links_resp, "data", None) or []
-
-  if not links:
-    return {"friends": []}
-
-  friend_ids = [link["friend_id"] for link in links]
-  profiles_by_id = _get_friend_profiles(friend_ids)
-
-  records: List[FriendRecord] = []
-
-  for link in links:
-    friend_id = link["friend_id"]
-    profile = profiles_by_id.get(friend_id)
-    if not profile:
-      # If profile is missing, skip this link.
-      continue
-
-    record = FriendRecord(
-      id=link["id"],
-      friend_user_id=str(friend_id),
-      name=profile.get("name") or "",
-      username=profile.get("username") or "",
-      email=profile.get("email") or "",
-      note=link.get("note"),
-      group="",  # No group field in friend_links; kept for UI shape
-    )
-    records.append(record)
-
-  # Apply search filter q on name, username, and email.
-  if q:
-    q_lower = q.lower()
-    filtered: List[FriendRecord] = []
-    for rec in records:
-      if (
-        q_lower in (rec.name or "").lower()
-        or q_lower in (rec.username or "").lower()
-        or q_lower in (rec.email or "").lower()
-      ):
-        filtered.append(rec)
-    records = filtered
-
-  # Apply group filter using the note as a simple tag field.
-  if group:
-    g_lower = group.lower()
-    filtered = []
-    for rec in records:
-      if g_lower in (rec.note or "").lower():
-        filtered.append(rec)
-    records = filtered
-
-  # Sort by name for stable display.
-  records.sort(key=lambda r: (r.name or "").lower())
-
-  return {
-    "friends": [
-      {
-        "id": r.id,
-        "friend_user_id": r.friend_user_id,
-        "name": r.name,
-        "username": r.username,
-        "email": r.email or "",
-        "note": r.note or "",
-        "group": r.group,  # still present for current frontend
-      }
-      for r in records
-    ]
-  }
+  return FastJSONResponse({
+    "friends": [_friend_dict(row) for row in rows],
+    "next_cursor": next_cursor,
+  })
 
 
 @router.post("/")
@@ -212,6 +244,7 @@ def add_friend(request: Request, payload: FriendCreate):
     raise HTTPException(status_code=500, detail="Insert failed")
 
   link_row = inserted[0]
+  social_graph.add_friend_link(owner_id, friend_id)
 
   # Build response in the same shape used by list_friends.
   friend_record = {
@@ -230,6 +263,139 @@ def add_friend(request: Request, payload: FriendCreate):
   }
 
 
+@router.post("/bulk", response_class=FastJSONResponse)
+def add_friends_bulk(request: Request, payload: BulkFriendCreate):
+  """
+  Add many friend links in one go (for example a contact import).
+  Works in three round trips for up to MAX_BULK_FRIENDS usernames (one
+  in_() chunk, IN_CHUNK_SIZE ids, per lookup):
+    1. Resolve every username with one username_key in (...) query.
+    2. Find the links the user already has with one friend_id in (...) query.
+    3. Insert all new links in one batch.
+  Returns one outcome per submitted username, in request order, with
+  status "added", "exists", "not_found", "self", "duplicate" (repeated in
+  the request) or "invalid" (blank).
+  """
+  user = get_current_user(request)
+  owner_id = user["id"]
+
+  results: List[dict] = []
+  wanted: dict = {}  # username_key -> (result, note)
+  for item in payload.friends:
+    username = (item.username or "").strip()
+    result = {"username": item.username}
+    results.append(result)
+    key = username.lower()
+    if not key:
+      result["status"] = "invalid"
+    elif key in wanted:
+      result["status"] = "duplicate"
+    else:
+      wanted[key] = (result, item.note or None)
+
+  if not wanted:
+    return FastJSONResponse({"added": 0, "results": results})
+
+  # 1. Profiles for every username (case insensitive via username_key)
+  profiles = select_in(
+    lambda: supabase.table("users").select("id, name, username, email, username_key"),
+    "username_key",
+    list(wanted),
+  )
+  by_key = {row["username_key"]: row for row in profiles}
+
+  candidates = {}  # friend_id -> (profile, result, note)
+  for key, (result, note) in wanted.items():
+    profile = by_key.get(key)
+    if not profile:
+      result["status"] = "not_found"
+    elif profile["id"] == owner_id:
+      result["status"] = "self"
+    else:
+      candidates[profile["id"]] = (profile, result, note)
+
+  # 2. Links that already exist
+  if candidates:
+    existing = select_in(
+      lambda: supabase.table("friend_links").select("friend_id").eq("owner_id", owner_id),
+      "friend_id",
+      list(candidates),
+    )
+    for row in existing:
+      _, result, _ = candidates.pop(row["friend_id"], (None, None, None))
+      if result is not None:
+        result["status"] = "exists"
+
+  # 3. One insert for everything new
+  inserted = []
+  if candidates:
+    insert_resp = (
+      supabase
+      .table("friend_links")
+      .insert([
+        {"owner_id": owner_id, "friend_id": friend_id, "note": note}
+        for friend_id, (_, _, note) in candidates.items()
+      ])
+      .execute()
+    )
+    inserted = getattr(insert_resp, "data", None) or []
+    if len(inserted) != len(candidates):
+      raise HTTPException(status_code=500, detail="Insert failed")
+
+  for link_row in inserted:
+    friend_id = link_row["friend_id"]
+    profile, result, note = candidates[friend_id]
+    result["status"] = "added"
+    result["friend"] = {
+      "id": link_row["id"],
+      "friend_user_id": str(friend_id),
+      "name": profile.get("name") or "",
+      "username": profile.get("username") or "",
+      "email": profile.get("email") or "",
+      "note": note or "",
+      "group": "",
+    }
+    social_graph.add_friend_link(owner_id, friend_id)
+
+  return FastJSONResponse({"added": len(inserted), "results": results})
+
+
+@router.get("/suggestions", response_class=FastJSONResponse)
+def suggest_friends(
+  current_user=Depends(get_current_user),
+  limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS),
+):
+  """
+  People you may know: users your friends have added and people you
+  share groups with, ranked by mutual friends first, then shared groups.
+  Ranking runs on the in-process social graph; only the profiles of the
+  returned users are read from the database.
+  """
+  ensure_social_graph()
+  ranked = social_graph.suggest(str(current_user["id"]), limit)
+  if not ranked:
+    return FastJSONResponse({"suggestions": []})
+
+  rows = select_in(
+    lambda: supabase.table("users").select("id, name, username"),
+    "id",
+    [s["user_id"] for s in ranked],
+  )
+  profiles = {str(row["id"]): row for row in rows}
+
+  suggestions = []
+  for item in ranked:
+    profile = profiles.get(item["user_id"])
+    if not profile:
+      continue
+    suggestions.append({
+      **item,
+      "name": profile.get("name") or "",
+      "username": profile.get("username") or "",
+    })
+  return FastJSONResponse({"suggestions": suggestions})
+
+
 @router.get("/groups")
 def list_groups(request: Request):
   """
@@ -264,4 +430,7 @@ def delete_friend(link_id: int, request: Request):
   if not deleted:
     raise HTTPException(status_code=404, detail="Friend link not found")
 
+  for row in deleted:
+    social_graph.remove_friend_link(owner_id, row.get("friend_id"))
+
   return {"ok": True}
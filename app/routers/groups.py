@@ -1,15 +1,50 @@
 # FILE: app/routers/groups.py
+import base64
+import json
+from datetime import datetime, timezone
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query
 from pydantic import BaseModel
 from postgrest.exceptions import APIError
 
 from ..core.supabase_client import supabase
+from ..core.concurrency import gather_db, run_db
+from ..core.batching import delete_in, select_in
+from ..core.social_graph import social_graph
+from ..core.notifications import notify, refresh_group_name
 from .auth import get_current_user
+from .dashboard import invalidate_dashboard
+from .payments import invalidate_expense_names
 
 router = APIRouter(prefix="/api/groups", tags=["groups"])
 
+# Group fields returned by the list endpoints (from the user_groups view)
+USER_GROUP_COLUMNS = "id, name, description, owner_id, created_at, role, member_count"
+
+# Latest expenses included in /overview by default, and the cap
+OVERVIEW_EXPENSES = 10
+MAX_OVERVIEW_EXPENSES = 50
+
+# Member listing: page sizes and sort keys (?sort= -> view column)
+DEFAULT_MEMBER_PAGE = 100
+MAX_MEMBER_PAGE = 500
+MEMBER_SORTS = {"name": "sort_name", "joined": "joined_at"}
+MEMBER_COLUMNS = "user_id, role, joined_at, name, username, email, sort_name"
+
+# Rows removed per batch by the group deletion cascade
+DELETE_BATCH_SIZE = 500
+# A running job that has not recorded progress for this long is presumed
+# dead (its process went away) and is picked up again by the next delete
+DELETION_JOB_STALE_SECONDS = 300
+DELETION_COUNT_KEYS = (
+    "deleted_expenses", "deleted_participants", "deleted_payments", "deleted_notifications",
+)
+DELETION_JOB_COLUMNS = (
+    "id, group_id, status, deleted_expenses, deleted_participants, "
+    "deleted_payments, deleted_notifications, error, created_at, updated_at, finished_at"
+)
+
 
 class CreateGroup(BaseModel):
     """Payload for creating a group from the add group form."""
@@ -23,6 +58,8 @@ class UpdateGroup(BaseModel):
     """Payload for updating group name and description."""
     name: Optional[str] = None
     description: Optional[str] = None
+    # groups.version the client last saw; a mismatch returns 409
+    version: Optional[int] = None
 
 
 class AddMemberPayload(BaseModel):
@@ -30,6 +67,37 @@ class AddMemberPayload(BaseModel):
     friend_link_id: int
 
 
+def _group_member_ids(group_id: str) -> List[str]:
+    """User ids of every member of a group, from group_members."""
+    res = (
+        supabase.table("group_members")
+        .select("user_id")
+        .eq("group_id", group_id)
+        .execute()
+    )
+    return [row["user_id"] for row in res.data or []]
+
+
+def _version_conflict() -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail="Group was changed by someone else. Reload and try again.",
+    )
+
+
+def _is_group_member(group_id: str, user_id: str) -> bool:
+    """Primary key lookup on group_members."""
+    res = (
+        supabase.table("group_members")
+        .select("user_id")
+        .eq("group_id", group_id)
+        .eq("user_id", user_id)
+        .limit(1)
+        .execute()
+    )
+    return bool(res.data)
+
+
 @router.post("/", summary="Create a new group")
 def create_group(payload: CreateGroup, user=Depends(get_current_user)):
     """Create a group and include the current user as a member and owner."""
@@ -49,7 +117,6 @@ def create_group(payload: CreateGroup, user=Depends(get_current_user)):
     insert_data = {
         "name": name,
         "description": payload.description,
-        "members": members_unique,
         "owner_id": uid,
     }
 
@@ -69,7 +136,26 @@ def create_group(payload: CreateGroup, user=Depends(get_current_user)):
     else:
         group_row = data
 
-    return {"ok": True, "group": group_row}
+    membership_rows = [
+        {
+            "group_id": group_row["id"],
+            "user_id": member_id,
+            "role": "owner" if member_id == uid else "member",
+        }
+        for member_id in members_unique
+    ]
+    try:
+        supabase.table("group_members").insert(membership_rows).execute()
+    except APIError as e:
+        # Do not leave a group nobody belongs to
+        supabase.table("groups").delete().eq("id", group_row["id"]).execute()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    invalidate_dashboard(*members_unique)
+    for member_id in members_unique:
+        social_graph.add_group_member(group_row["id"], member_id)
+
+    return {"ok": True, "group": {**group_row, "member_count": len(members_unique)}}
 
 @router.get("/", summary="List groups for current user")
 def get_groups_for_current_user(user=Depends(get_current_user)):
@@ -77,9 +163,9 @@ def get_groups_for_current_user(user=Depends(get_current_user)):
     uid = str(user["id"])
     try:
         res = (
-            supabase.table("groups")
-            .select("*")
-            .contains("members", [uid])
+            supabase.table("user_groups")
+            .select(USER_GROUP_COLUMNS)
+            .eq("member_id", uid)
             .order("created_at", desc=True)
             .execute()
         )
@@ -94,9 +180,9 @@ def get_user_groups(user_id: str):
     """Return all groups where the given user id is a member."""
     try:
         res = (
-            supabase.table("groups")
-            .select("*")
-            .contains("members", [str(user_id)])
+            supabase.table("user_groups")
+            .select(USER_GROUP_COLUMNS)
+            .eq("member_id", str(user_id))
             .order("created_at", desc=True)
             .execute()
         )
@@ -126,41 +212,284 @@ def get_group(group_id: str):
     return res.data
 
 
-@router.get("/{group_id}/members", summary="Get members of a group")
-def get_group_members(group_id: str):
-    """Return user records for all members in a group."""
+def _fetch_group_row(group_id: str) -> Optional[dict]:
+    """The groups row, or None if it does not exist."""
     try:
-        group_res = (
+        res = (
             supabase.table("groups")
-            .select("members")
+            .select("id, name, description, owner_id, created_at, version")
             .eq("id", group_id)
             .single()
             .execute()
         )
     except APIError:
-        raise HTTPException(status_code=404, detail="Group not found")
+        return None
+    return res.data or None
+
+
+def _fetch_membership(group_id: str, user_id: str) -> Optional[dict]:
+    """The user's user_groups row for this group (group fields + member_count)."""
+    res = (
+        supabase.table("user_groups")
+        .select(USER_GROUP_COLUMNS + ", version")
+        .eq("id", group_id)
+        .eq("member_id", user_id)
+        .limit(1)
+        .execute()
+    )
+    rows = res.data or []
+    return rows[0] if rows else None
+
+
+def _quote(value: str) -> str:
+    """Quote a value for a PostgREST logic tree (or=/and=)."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _encode_member_cursor(sort: str, row: dict) -> str:
+    raw = json.dumps([sort, row.get(MEMBER_SORTS[sort]), str(row["user_id"])])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_member_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        cursor_sort, key, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_sort != sort:
+        raise HTTPException(status_code=400, detail="Cursor belongs to a different sort")
+    return key, user_id
+
+
+def _fetch_member_page(
+    group_id: str,
+    *,
+    sort: str = "name",
+    limit: int = DEFAULT_MEMBER_PAGE,
+    cursor: Optional[str] = None,
+    q: Optional[str] = None,
+) -> tuple[List[dict], Optional[str]]:
+    """
+    One page of group_member_profiles ordered by (sort key, user_id).
+    q is a case insensitive prefix of the display name. Returns the rows
+    and the cursor for the next page (None on the last page).
+    """
+    column = MEMBER_SORTS[sort]
+    query = (
+        supabase.table("group_member_profiles")
+        .select(MEMBER_COLUMNS)
+        .eq("group_id", group_id)
+    )
+    if q:
+        prefix = q.strip().lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.ilike("sort_name", f"{prefix}%")
+    if cursor:
+        key, after_id = _decode_member_cursor(cursor, sort)
+        query = query.or_(
+            f"{column}.gt.{_quote(key)},"
+            f"and({column}.eq.{_quote(key)},user_id.gt.{_quote(after_id)})"
+        )
+
+    res = (
+        query.order(column)
+        .order("user_id")
+        .limit(limit + 1)
+        .execute()
+    )
+    rows = res.data or []
+    next_cursor = _encode_member_cursor(sort, rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def _fetch_all_members(group_id: str) -> List[dict]:
+    """Every member, read in MAX_MEMBER_PAGE sized keyset pages."""
+    members: List[dict] = []
+    cursor = None
+    while True:
+        rows, cursor = _fetch_member_page(group_id, limit=MAX_MEMBER_PAGE, cursor=cursor)
+        members.extend(rows)
+        if not cursor:
+            return members
+
+
+def _member_dict(row: dict) -> dict:
+    return {
+        "id": row["user_id"],
+        "name": row.get("name"),
+        "username": row.get("username"),
+        "email": row.get("email"),
+        "role": row.get("role"),
+    }
+
+
+def _fetch_member_balances(group_id: str) -> List[dict]:
+    """Outstanding totals per member, aggregated by the database."""
+    res = supabase.rpc("group_member_balances", {"p_group_id": group_id}).execute()
+    return res.data or []
+
+
+def _fetch_recent_expenses(group_id: str, limit: int) -> List[dict]:
+    res = (
+        supabase.table("expenses")
+        .select("id, user_id, description, amount, expense_date, created_at")
+        .eq("group_id", group_id)
+        .order("expense_date", desc=True)
+        .order("created_at", desc=True)
+        .limit(limit)
+        .execute()
+    )
+    return res.data or []
+
+
+@router.get("/{group_id}/overview", summary="Everything the group page shows")
+async def get_group_overview(
+    group_id: str,
+    expenses: int = Query(OVERVIEW_EXPENSES, ge=1, le=MAX_OVERVIEW_EXPENSES),
+    user=Depends(get_current_user),
+):
+    """
+    Group, the first page of members with their outstanding balances in
+    the group, and the latest expenses in one response. The four queries
+    are independent and run side by side on the DB worker pool; further
+    members come from /members?cursor=members_next_cursor.
+    """
+    uid = str(user["id"])
+
+    membership, (profiles, members_cursor), balances, recent = await gather_db(
+        run_db(_fetch_membership, group_id, uid),
+        run_db(_fetch_member_page, group_id, limit=DEFAULT_MEMBER_PAGE),
+        run_db(_fetch_member_balances, group_id),
+        run_db(_fetch_recent_expenses, group_id, expenses),
+    )
+
+    if not membership:
+        if not await run_db(_fetch_group_row, group_id):
+            raise HTTPException(status_code=404, detail="Group not found")
+        raise HTTPException(
+            status_code=403,
+            detail="You must be a member to view this group",
+        )
+
+    balance_by_user = {b["user_id"]: b for b in balances}
+
+    members = []
+    for p in profiles:
+        b = balance_by_user.get(p["user_id"], {})
+        owed_by = float(b.get("owed_by_user") or 0)
+        owed_to = float(b.get("owed_to_user") or 0)
+        members.append({
+            **_member_dict(p),
+            "owed_by_user": owed_by,
+            "owed_to_user": owed_to,
+            "net": round(owed_to - owed_by, 2),
+        })
+
+    # Payer names: from the member page, else one lookup for the rest
+    names = {p["user_id"]: p.get("name") or p.get("username") for p in profiles}
+    missing = {e.get("user_id") for e in recent} - names.keys() - {None}
+    if missing:
+        users = await run_db(
+            select_in,
+            lambda: supabase.table("users").select("id, name, username"),
+            "id",
+            missing,
+        )
+        names.update({u["id"]: u.get("name") or u.get("username") for u in users})
+
+    recent_expenses = [
+        {**e, "amount": float(e.get("amount") or 0), "payer_name": names.get(e.get("user_id"))}
+        for e in recent
+    ]
+
+    group = {
+        key: membership.get(key)
+        for key in ("id", "name", "description", "owner_id", "created_at", "version", "member_count")
+    }
+    return {
+        "ok": True,
+        "group": group,
+        "members": members,
+        "members_next_cursor": members_cursor,
+        "recent_expenses": recent_expenses,
+    }
+
+
+@router.get("/{group_id}/members", summary="Get members of a group")
+def get_group_members(
+    group_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_MEMBER_PAGE),
+    cursor: Optional[str] = Query(None),
+    sort: str = Query("name", pattern="^(name|joined)$"),
+    q: Optional[str] = Query(None, max_length=100),
+):
+    """
+    Return user records for the members of a group.
+
+    With ?limit= the result is one page sorted by name (or ?sort=joined),
+    optionally filtered by a name prefix ?q=; pass next_cursor back as
+    ?cursor= for the following page. Without limit every member is
+    returned, read internally in bounded pages.
+    """
+    try:
+        if limit is None and cursor is None and not q:
+            rows, next_cursor = _fetch_all_members(group_id), None
+        else:
+            rows, next_cursor = _fetch_member_page(
+                group_id,
+                sort=sort,
+                limit=limit or DEFAULT_MEMBER_PAGE,
+                cursor=cursor,
+                q=q,
+            )
+    except APIError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not rows and not cursor and not q:
+        # Tell an empty group apart from a missing one
+        get_group(group_id)
+
+    return {
+        "ok": True,
+        "members": [_member_dict(row) for row in rows],
+        "next_cursor": next_cursor,
+    }
 
-    group_data = group_res.data or {}
-    member_ids = group_data.get("members") or []
-    if not member_ids:
-        return {"ok": True, "members": []}
 
+@router.get("/deletions/{job_id}", summary="Progress of a group deletion")
+def get_group_deletion(job_id: str, user=Depends(get_current_user)):
+    """Return a group deletion job started by the current user."""
     try:
         res = (
-            supabase.table("users")
-            .select("id, name, username, email")  # full_name removed
-            .in_("id", member_ids)
+            supabase.table("group_deletion_jobs")
+            .select(DELETION_JOB_COLUMNS)
+            .eq("id", job_id)
+            .eq("requested_by", str(user["id"]))
+            .limit(1)
             .execute()
         )
     except APIError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    return {"ok": True, "members": res.data or []}
+    if not res.data:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return {"ok": True, "job": res.data[0]}
 
 
 @router.delete("/{group_id}", summary="Delete a group")
-def delete_group(group_id: str, user=Depends(get_current_user)):
-    """Delete a group if the current user is the owner."""
+def delete_group(
+    group_id: str,
+    background_tasks: BackgroundTasks,
+    user=Depends(get_current_user),
+):
+    """
+    Delete a group if the current user is the owner.
+
+    Memberships go immediately, so the group disappears for everyone.
+    Expenses, shares, payments and notifications are removed in batches
+    by a background job; poll /api/groups/deletions/{job.id} for progress.
+    Deleting again after a failed job, or one that stopped recording
+    progress, resumes where it stopped.
+    """
     uid = str(user["id"])
     try:
         res = (
@@ -183,22 +512,202 @@ def delete_group(group_id: str, user=Depends(get_current_user)):
             detail="Only the owner can delete this group",
         )
 
+    # A job already working on this group is reused, not duplicated;
+    # one that stopped making progress is resumed
+    active = (
+        supabase.table("group_deletion_jobs")
+        .select(DELETION_JOB_COLUMNS + ", member_ids")
+        .eq("group_id", group_id)
+        .in_("status", ["pending", "running"])
+        .limit(1)
+        .execute()
+    ).data
+    if active:
+        # Former members are only needed to invalidate their dashboards
+        job = {key: value for key, value in active[0].items() if key != "member_ids"}
+        member_ids = active[0].get("member_ids") or []
+        if _claim_stale_job(job):
+            counts = {key: job.get(key) or 0 for key in DELETION_COUNT_KEYS}
+            background_tasks.add_task(run_group_deletion, job["id"], group_id, member_ids, counts)
+        return {"ok": True, "job": job}
+
     try:
-        supabase.table("groups").delete().eq("id", group_id).execute()
+        # The job records who was a member, so a resumed cascade can still
+        # invalidate their dashboards once it finishes
+        member_ids = [
+            row["user_id"]
+            for row in (
+                supabase.table("group_members")
+                .select("user_id")
+                .eq("group_id", group_id)
+                .execute()
+            ).data or []
+        ]
+        inserted = (
+            supabase.table("group_deletion_jobs")
+            .insert({
+                "group_id": group_id,
+                "requested_by": uid,
+                "status": "pending",
+                "member_ids": member_ids,
+            })
+            .execute()
+        ).data[0]
+        job = {key: value for key, value in inserted.items() if key != "member_ids"}
+
+        # Members are gone right away; everything else follows in batches
+        removed = (
+            supabase.table("group_members")
+            .delete()
+            .eq("group_id", group_id)
+            .execute()
+        ).data or []
+
+        # Someone who joined between the read and the delete
+        late = [row["user_id"] for row in removed if row["user_id"] not in member_ids]
+        if late:
+            member_ids = member_ids + late
+            _update_job(job["id"], member_ids=member_ids)
     except APIError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    return {"ok": True}
+    invalidate_dashboard(*member_ids)
+    for member_id in member_ids:
+        social_graph.remove_group_member(group_id, member_id)
+
+    background_tasks.add_task(run_group_deletion, job["id"], group_id, member_ids)
+
+    return {"ok": True, "job": job}
+
+
+def _ids_batch(table: str, column: str, value: str) -> List[str]:
+    """Up to DELETE_BATCH_SIZE ids of rows in table where column = value."""
+    res = (
+        supabase.table(table)
+        .select("id")
+        .eq(column, value)
+        .limit(DELETE_BATCH_SIZE)
+        .execute()
+    )
+    return [row["id"] for row in res.data or []]
+
+
+def _claim_stale_job(job: dict) -> bool:
+    """
+    True if job has not recorded progress for DELETION_JOB_STALE_SECONDS
+    and this request won the conditional update that takes it over.
+    """
+    last_seen = job.get("updated_at") or job.get("created_at")
+    try:
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(str(last_seen))
+    except ValueError:
+        age = None
+    if age is not None and age.total_seconds() < DELETION_JOB_STALE_SECONDS:
+        return False
+
+    # Concurrent retries race on updated_at; only one reschedules the cascade
+    query = (
+        supabase.table("group_deletion_jobs")
+        .update({"updated_at": datetime.now(timezone.utc).isoformat()})
+        .eq("id", job["id"])
+    )
+    if job.get("updated_at") is None:
+        # "= null" never matches in SQL
+        query = query.is_("updated_at", "null")
+    else:
+        query = query.eq("updated_at", job["updated_at"])
+    return bool(query.execute().data)
+
+
+def _update_job(job_id: str, **fields) -> None:
+    fields["updated_at"] = datetime.now(timezone.utc).isoformat()
+    supabase.table("group_deletion_jobs").update(fields).eq("id", job_id).execute()
+
+
+def run_group_deletion(
+    job_id: str,
+    group_id: str,
+    member_ids: List[str],
+    counts: Optional[dict] = None,
+) -> None:
+    """
+    Background cascade for a deleted group. Each batch removes at most
+    DELETE_BATCH_SIZE expenses (with their shares and payment records),
+    payments or notifications and then records progress on the job row,
+    so a request never waits on it. Every step only deletes what is still
+    there, so a job resumed after a crash (with its counts so far) simply
+    carries on.
+    """
+    counts = {key: (counts or {}).get(key, 0) for key in DELETION_COUNT_KEYS}
+    _update_job(job_id, status="running")
+
+    try:
+        # Expenses first: their shares are the group's payment obligations
+        while True:
+            expense_ids = _ids_batch("expenses", "group_id", group_id)
+            if not expense_ids:
+                break
+            counts["deleted_participants"] += delete_in(
+                lambda: supabase.table("expense_participants").delete(), "expense_id", expense_ids
+            )
+            counts["deleted_payments"] += delete_in(
+                lambda: supabase.table("payment_records").delete(), "expense_id", expense_ids
+            )
+            counts["deleted_expenses"] += delete_in(
+                lambda: supabase.table("expenses").delete(), "id", expense_ids
+            )
+            invalidate_expense_names(*expense_ids)
+            _update_job(job_id, **counts)
+
+        # Standalone payments in the group (net settlements and the like)
+        while True:
+            payment_ids = _ids_batch("payment_records", "group_id", group_id)
+            if not payment_ids:
+                break
+            counts["deleted_payments"] += delete_in(
+                lambda: supabase.table("payment_records").delete(), "id", payment_ids
+            )
+            _update_job(job_id, **counts)
+
+        while True:
+            notification_ids = _ids_batch("notifications", "group_id", group_id)
+            if not notification_ids:
+                break
+            counts["deleted_notifications"] += delete_in(
+                lambda: supabase.table("notifications").delete(), "id", notification_ids
+            )
+            _update_job(job_id, **counts)
+
+        supabase.table("groups").delete().eq("id", group_id).execute()
+    except Exception as e:
+        print(f"Group deletion {job_id} failed: {e}")
+        _update_job(job_id, status="failed", error=str(e), **counts)
+        return
+
+    _update_job(
+        job_id,
+        status="done",
+        finished_at=datetime.now(timezone.utc).isoformat(),
+        **counts,
+    )
+    # Former members' history and balances no longer include the group
+    invalidate_dashboard(*member_ids)
 
 
 @router.patch("/{group_id}", summary="Update group name or description")
 def update_group(group_id: str, payload: UpdateGroup, user=Depends(get_current_user)):
-    """Update group name or description for groups owned by the current user."""
+    """
+    Update group name or description for groups owned by the current user.
+
+    The write is a compare-and-set on groups.version, so an edit based on
+    an outdated read (the client's version, or ours if it sent none)
+    fails with 409 instead of silently overwriting a newer change.
+    """
     uid = str(user["id"])
     try:
         res = (
             supabase.table("groups")
-            .select("id, owner_id, name, description")
+            .select("id, owner_id, name, description, created_at, version")
             .eq("id", group_id)
             .single()
             .execute()
@@ -230,11 +739,17 @@ def update_group(group_id: str, payload: UpdateGroup, user=Depends(get_current_u
     if not update_data:
         return {"ok": True, "group": group_row}
 
+    seen_version = group_row.get("version") or 0
+    if payload.version is not None and payload.version != seen_version:
+        raise _version_conflict()
+    update_data["version"] = seen_version + 1
+
     try:
         update_res = (
             supabase.table("groups")
             .update(update_data)
             .eq("id", group_id)
+            .eq("version", seen_version)
             .execute()
         )
     except APIError as e:
@@ -246,7 +761,13 @@ def update_group(group_id: str, payload: UpdateGroup, user=Depends(get_current_u
     elif isinstance(data, dict) and data:
         updated = data
     else:
-        updated = {**group_row, **update_data}
+        # Someone else changed the group between our read and write
+        raise _version_conflict()
+
+    # Group names show up in every member's dashboard
+    if "name" in update_data:
+        invalidate_dashboard(*_group_member_ids(group_id))
+        refresh_group_name(group_id, update_data["name"])
 
     return {"ok": True, "group": updated}
 
@@ -264,7 +785,7 @@ def add_group_member(
     try:
         group_res = (
             supabase.table("groups")
-            .select("id, members, owner_id")
+            .select("id, name, description, owner_id, created_at, version")
             .eq("id", group_id)
             .single()
             .execute()
@@ -276,8 +797,7 @@ def add_group_member(
     if not group_row:
         raise HTTPException(status_code=404, detail="Group not found")
 
-    members = group_row.get("members") or []
-    if uid not in members:
+    if not _is_group_member(group_id, uid):
         raise HTTPException(
             status_code=403,
             detail="You must be a member to modify this group",
@@ -301,42 +821,37 @@ def add_group_member(
     if not friend_id:
         raise HTTPException(status_code=404, detail="Friend link not found")
 
-    # Append friend id if not already present
-    if friend_id in members:
-        return {"ok": True, "group": group_row}
-
-    new_members = list({*members, friend_id})
-
+    # One row per (group, user); adding an existing member is a no-op
     try:
-        update_res = (
-            supabase.table("groups")
-            .update({"members": new_members})
-            .eq("id", group_id)
+        insert_res = (
+            supabase.table("group_members")
+            .upsert(
+                {"group_id": group_id, "user_id": friend_id, "role": "member"},
+                on_conflict="group_id,user_id",
+                ignore_duplicates=True,
+            )
             .execute()
         )
     except APIError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    data = update_res.data
-    if isinstance(data, list) and data:
-        updated = data[0]
-    elif isinstance(data, dict) and data:
-        updated = data
-    else:
-        updated = {**group_row, "members": new_members}
+    if insert_res.data:
+        invalidate_dashboard(friend_id)
+        social_graph.add_group_member(group_id, friend_id)
+        notify("Group Member Added", uid, [friend_id], group_id)
 
-    return {"ok": True, "group": updated}
+    return {"ok": True, "group": group_row}
 
 
 @router.post("/{group_id}/leave", summary="Leave the group")
 def leave_group(group_id: str, user=Depends(get_current_user)):
-    """Remove the current user from the group's members list."""
+    """Remove the current user from the group's members."""
     uid = str(user["id"])
 
     try:
         res = (
             supabase.table("groups")
-            .select("id, members, owner_id")
+            .select("id, owner_id")
             .eq("id", group_id)
             .single()
             .execute()
@@ -346,11 +861,6 @@ def leave_group(group_id: str, user=Depends(get_current_user)):
 
     group = res.data or {}
 
-    members = group.get("members") or []
-
-    if uid not in members:
-        return {"ok": True, "message": "Already not a member"}
-
     # Owners cannot leave their own group
     if group.get("owner_id") == uid:
         raise HTTPException(
@@ -358,11 +868,21 @@ def leave_group(group_id: str, user=Depends(get_current_user)):
             detail="Owner cannot leave their own group",
         )
 
-    new_members = [m for m in members if m != uid]
-
     try:
-        supabase.table("groups").update({"members": new_members}).eq("id", group_id).execute()
+        deleted = (
+            supabase.table("group_members")
+            .delete()
+            .eq("group_id", group_id)
+            .eq("user_id", uid)
+            .execute()
+        )
     except APIError:
         raise HTTPException(status_code=500, detail="Could not update group")
 
+    if not deleted.data:
+        return {"ok": True, "message": "Already not a member"}
+
+    invalidate_dashboard(uid)
+    social_graph.remove_group_member(group_id, uid)
+
     return {"ok": True}
@@ -1,17 +1,26 @@
 # FILE: app/routers/history.py
-# History API that builds per-user expense history using expenses
-# and expense_participants. Each row is a single user's view of an
+# History API that builds per-user expense history from the
+# expense_history view. Each row is a single user's view of an
 # expense with a signed amount.
 
-from typing import Optional, Dict, Any, List, Set
+from typing import Optional, Dict, Any, List
 
 from fastapi import APIRouter, Query, HTTPException, Depends
 
 from ..core.supabase_client import supabase
+from ..core.responses import FastJSONResponse
 from .auth import get_current_user
 
 router = APIRouter(prefix="/api/history", tags=["History"])
 
+# View defined in supabase/migrations that joins expenses, shares,
+# group names and creator names per viewer.
+HISTORY_VIEW = "expense_history"
+HISTORY_COLUMNS = (
+    "kind, expense_id, creator_id, group_id, amount, description, "
+    "expense_date, created_at, group_name, creator_name"
+)
+
 
 def _get_user_id(current_user: Any) -> str:
     """Return the authenticated user's id as a string."""
@@ -20,7 +29,20 @@ def _get_user_id(current_user: Any) -> str:
     return str(getattr(current_user, "id", ""))
 
 
-@router.get("/")
+def fetch_history_rows(user_id: str) -> List[Dict[str, Any]]:
+    """Return every expense_history row for this user in one round trip."""
+    resp = (
+        supabase.table(HISTORY_VIEW)
+        .select(HISTORY_COLUMNS)
+        .eq("viewer_id", user_id)
+        .execute()
+    )
+    if resp.data is None:
+        raise HTTPException(status_code=500, detail="Error fetching history")
+    return resp.data or []
+
+
+@router.get("/", response_class=FastJSONResponse)
 def get_history(
     group: Optional[str] = Query(None),
     person: Optional[str] = Query(None),
@@ -44,195 +66,35 @@ def get_history(
     if not user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    # ----- 1. Expenses created by this user -----
-    creator_resp = (
-        supabase.table("expenses")
-        .select(
-            "id, user_id, group_id, amount, description, "
-            "expense_date, created_at"
-        )
-        .eq("user_id", user_id)
-        .execute()
-    )
-    if creator_resp.data is None:
-        raise HTTPException(status_code=500, detail="Error fetching created expenses")
-    creator_expenses: List[Dict[str, Any]] = creator_resp.data or []
-
-    creator_expense_ids: List[str] = []
-    group_ids: Set[str] = set()
-    creator_ids: Set[str] = set()
-
-    for e in creator_expenses:
-        eid = e.get("id")
-        if not eid:
-            continue
-        creator_expense_ids.append(eid)
-        group_id = e.get("group_id")
-        if group_id:
-            group_ids.add(group_id)
-        creator_ids.add(e.get("user_id"))
-
-    # ----- 2. Expenses where this user is a participant -----
-    parts_resp = (
-        supabase.table("expense_participants")
-        .select("expense_id, share")
-        .eq("member_id", user_id)
-        .execute()
-    )
-    if parts_resp.data is None:
-        raise HTTPException(
-            status_code=500, detail="Error fetching participant rows"
-        )
-    participant_rows: List[Dict[str, Any]] = parts_resp.data or []
-
-    # Map expense_id -> total share for this user (in case of duplicates)
-    share_by_expense_for_me: Dict[str, float] = {}
-    participant_expense_ids: List[str] = []
-
-    for row in participant_rows:
-        eid = row.get("expense_id")
-        if not eid:
-            continue
-        share = float(row.get("share") or 0)
-        share_by_expense_for_me[eid] = share_by_expense_for_me.get(eid, 0.0) + share
-        participant_expense_ids.append(eid)
-
-    participant_expenses: List[Dict[str, Any]] = []
-    if participant_expense_ids:
-        part_exp_resp = (
-            supabase.table("expenses")
-            .select(
-                "id, user_id, group_id, amount, description, "
-                "expense_date, created_at"
-            )
-            .in_("id", participant_expense_ids)
-            .execute()
-        )
-        if part_exp_resp.data is None:
-            raise HTTPException(
-                status_code=500,
-                detail="Error fetching participant expenses",
-            )
-        participant_expenses = part_exp_resp.data or []
-        for e in participant_expenses:
-            group_id = e.get("group_id")
-            if group_id:
-                group_ids.add(group_id)
-            creator_ids.add(e.get("user_id"))
-
-    # ----- 3. Look up group names -----
-    group_name_by_id: Dict[str, str] = {}
-    if group_ids:
-        group_resp = (
-            supabase.table("groups")
-            .select("id, name")
-            .in_("id", list(group_ids))
-            .execute()
-        )
-        if group_resp.data is None:
-            raise HTTPException(status_code=500, detail="Error fetching groups")
-        for g in group_resp.data or []:
-            gid = g.get("id")
-            if gid:
-                group_name_by_id[gid] = g.get("name") or ""
-
-    # ----- 4. Look up creator names for participant entries -----
-    user_name_by_id: Dict[str, str] = {}
-    if creator_ids:
-        users_resp = (
-            supabase.table("users")
-            .select("id, name")
-            .in_("id", list(creator_ids))
-            .execute()
-        )
-        if users_resp.data is None:
-            raise HTTPException(status_code=500, detail="Error fetching users")
-        for u in users_resp.data or []:
-            uid = u.get("id")
-            if uid:
-                user_name_by_id[uid] = u.get("name") or ""
-
-    # ----- 5. For creator expenses, compute how much others owe me -----
-    net_owed_to_me_by_expense: Dict[str, float] = {}
-    if creator_expense_ids:
-        shares_resp = (
-            supabase.table("expense_participants")
-            .select("expense_id, share")
-            .in_("expense_id", creator_expense_ids)
-            .execute()
-        )
-        if shares_resp.data is None:
-            raise HTTPException(
-                status_code=500,
-                detail="Error fetching participant shares for created expenses",
-            )
-        for row in shares_resp.data or []:
-            eid = row.get("expense_id")
-            if not eid:
-                continue
-            share = float(row.get("share") or 0)
-            net_owed_to_me_by_expense[eid] = (
-                net_owed_to_me_by_expense.get(eid, 0.0) + share
-            )
+    # ----- 1. One query against the expense_history view -----
+    rows = fetch_history_rows(user_id)
 
-    # ----- 6. Build "paid" entries: expenses you created -----
+    # ----- 2. Build "paid" and "received" entries -----
     paid_entries: List[Dict[str, Any]] = []
-    for e in creator_expenses:
-        eid = e.get("id")
-        if not eid:
-            continue
-
-        # Positive amount: what others owe you on this expense
-        amount_val = net_owed_to_me_by_expense.get(eid, 0.0)
-
-        group_name = group_name_by_id.get(e.get("group_id"), "")
-        date_val = e.get("expense_date") or e.get("created_at") or ""
-
-        paid_entries.append(
-            {
-                "id": eid,
-                "date": date_val,
-                "amount": amount_val,
-                "group": group_name,
-                "description": e.get("description") or "",
-                "creator_name": user_name_by_id.get(user_id, ""),
-            }
-        )
-
-    # ----- 7. Build "received" entries: expenses you are in as participant -----
-    creator_expense_ids_set = {e.get("id") for e in creator_expenses if e.get("id")}
     received_entries: List[Dict[str, Any]] = []
 
-    for e in participant_expenses:
-        eid = e.get("id")
+    for row in rows:
+        eid = row.get("expense_id")
         if not eid:
             continue
 
-        # If you also created this expense, treat it as a creator row only
-        if eid in creator_expense_ids_set:
-            continue
-
-        group_name = group_name_by_id.get(e.get("group_id"), "")
-        date_val = e.get("expense_date") or e.get("created_at") or ""
+        date_val = row.get("expense_date") or row.get("created_at") or ""
+        entry = {
+            "id": eid,
+            "date": date_val,
+            # Positive for expenses you created, negative for your share of others
+            "amount": float(row.get("amount") or 0),
+            "group": row.get("group_name") or "",
+            "description": row.get("description") or "",
+            "creator_name": row.get("creator_name") or "",
+        }
 
-        # Negative amount: what you owe to the creator on this expense
-        my_share = share_by_expense_for_me.get(eid, 0.0)
-        amount_val = -float(my_share)
+        if row.get("kind") == "paid":
+            paid_entries.append(entry)
+        else:
+            received_entries.append(entry)
 
-        creator_name = user_name_by_id.get(e.get("user_id"), "")
-
-        received_entries.append(
-            {
-                "id": eid,
-                "date": date_val,
-                "amount": amount_val,
-                "group": group_name,
-                "description": e.get("description") or "",
-                "creator_name": creator_name,
-            }
-        )
-
-    # ----- 8. Optional filters -----
+    # ----- 3. Optional filters -----
 
     # Group filter
     if group:
@@ -259,10 +121,10 @@ def get_history(
     elif entry_type == "paid":
         received_entries = []
 
-    return {
+    return FastJSONResponse({
         "received": received_entries,
         "paid": paid_entries,
-    }
+    })
 
 
 @router.get("/groups")
@@ -272,63 +134,14 @@ def get_history_groups(current_user=Depends(get_current_user)):
     if not user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    # Reuse the logic above to find all relevant expenses
-    # 1) created by user
-    creator_resp = (
-        supabase.table("expenses")
-        .select("id, group_id")
-        .eq("user_id", user_id)
+    resp = (
+        supabase.table(HISTORY_VIEW)
+        .select("group_name")
+        .eq("viewer_id", user_id)
         .execute()
     )
-    if creator_resp.data is None:
-        raise HTTPException(status_code=500, detail="Error fetching created expenses")
-    creator_expenses = creator_resp.data or []
-    creator_expense_ids = [e.get("id") for e in creator_expenses if e.get("id")]
-
-    # 2) participant expenses
-    parts_resp = (
-        supabase.table("expense_participants")
-        .select("expense_id")
-        .eq("member_id", user_id)
-        .execute()
-    )
-    if parts_resp.data is None:
-        raise HTTPException(status_code=500, detail="Error fetching participant rows")
-    participant_ids = [
-        row.get("expense_id") for row in (parts_resp.data or []) if row.get("expense_id")
-    ]
-
-    all_ids = list({*(creator_expense_ids or []), *(participant_ids or [])})
-    if not all_ids:
-        return {"groups": []}
-
-    exp_resp = (
-        supabase.table("expenses")
-        .select("group_id")
-        .in_("id", all_ids)
-        .execute()
-    )
-    if exp_resp.data is None:
-        raise HTTPException(status_code=500, detail="Error fetching expenses")
-
-    group_ids = {
-        e.get("group_id") for e in (exp_resp.data or []) if e.get("group_id")
-    }
-    if not group_ids:
-        return {"groups": []}
-
-    group_resp = (
-        supabase.table("groups")
-        .select("id, name")
-        .in_("id", list(group_ids))
-        .execute()
-    )
-    if group_resp.data is None:
-        raise HTTPException(status_code=500, detail="Error fetching groups")
-
-    names = []
-    for g in group_resp.data or []:
-        if g.get("name"):
-            names.append(g.get("name"))
+    if resp.data is None:
+        raise HTTPException(status_code=500, detail="Error fetching history")
 
-    return {"groups": sorted(set(names))}
+    names = {row.get("group_name") for row in resp.data or [] if row.get("group_name")}
+    return {"groups": sorted(names)}
@@ -1,13 +1,28 @@
-from fastapi import APIRouter, Request, Depends
-from fastapi.responses import HTMLResponse
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, Depends
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
+from pydantic import BaseModel, Field
 
 from app.core.supabase_client import supabase
+from app.core.config import settings
+from app.core.events import TooManySubscriptions, event_hub, publish_notification
+from app.core.notifications import notification_queue
+from app.core.responses import FastJSONResponse
 from app.routers.auth import get_current_user
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NOTIFICATION_COLUMNS = "id, type, from_username, group_id, group_name, status, created_at"
+
 
 # Inbox page
 @router.get("/inbox", response_class=HTMLResponse)
@@ -21,84 +36,195 @@ async def inbox_page(request: Request):
 
 # Notifications helper
 def _build_notifications(rows):
-    """Attach usernames and group names to raw notification rows."""
-    if not rows:
-        return []
-
-    from_user_ids = set()
-    group_ids = set()
-
-    for n in rows:
-        fu = n.get("from_user")
-        if fu:
-            from_user_ids.add(fu)
-        gid = n.get("group_id")
-        if gid:
-            group_ids.add(gid)
-
-    user_map = {}
-    if from_user_ids:
-        try:
-            ures = (
-                supabase.table("users")
-                .select("id, username")
-                .in_("id", list(from_user_ids))
-                .execute()
-            )
-            for u in ures.data or []:
-                user_map[u["id"]] = u.get("username") or "Unknown"
-        except Exception as e:
-            print("Error fetching notification users:", e)
-
-    group_map = {}
-    if group_ids:
-        try:
-            gres = (
-                supabase.table("groups")
-                .select("id, name")
-                .in_("id", list(group_ids))
-                .execute()
-            )
-            for g in gres.data or []:
-                group_map[g["id"]] = g.get("name") or None
-        except Exception as e:
-            print("Error fetching notification groups:", e)
-
-    result = []
-    for n in rows:
-        result.append(
-            {
-                "id": n["id"],
-                "type": n.get("type"),
-                "from_user": user_map.get(n.get("from_user"), "Unknown"),
-                "group_id": n.get("group_id"),
-                "group_name": group_map.get(n.get("group_id")),
-                "status": n.get("status"),
-                "created_at": n.get("created_at"),
-            }
-        )
+    """Shape notification rows for the client from their stored names."""
+    return [
+        {
+            "id": n["id"],
+            "type": n.get("type"),
+            "from_user": n.get("from_username") or "Unknown",
+            "group_id": n.get("group_id"),
+            "group_name": n.get("group_name"),
+            "status": n.get("status"),
+            "created_at": n.get("created_at"),
+        }
+        for n in rows or []
+    ]
+
+
+def _push_new_notifications(rows):
+    """Send freshly written notification rows to their recipients' streams."""
+    for row, notification in zip(rows, _build_notifications(rows)):
+        publish_notification(row.get("to_user"), notification)
+
+
+# Every batch the notification writer inserts is pushed live
+notification_queue.add_listener(_push_new_notifications)
+
+
+# Notifications endpoints
+def _encode_cursor(row) -> str:
+    """Opaque keyset cursor for the (created_at, id) of the last row on a page."""
+    raw = json.dumps([row.get("created_at"), str(row["id"])])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _quote(value) -> str:
+    """Quote a value for a PostgREST logic tree (or=/and=)."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
 
-    return result
 
+def _notification_id(value) -> str:
+    """Canonical notification id (integer or uuid); ValueError otherwise."""
+    text = str(value).strip()
+    if text.isdigit():
+        return str(int(text))
+    return str(uuid.UUID(text))
 
-# Notifications endpoint
-@router.get("/inbox/notifications")
-async def inbox_notifications(current_user=Depends(get_current_user)):
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, nid = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        datetime.fromisoformat(str(created_at))
+        return str(created_at), _notification_id(nid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/inbox/notifications", response_class=FastJSONResponse)
+def inbox_notifications(
+    current_user=Depends(get_current_user),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+):
     """
-    Return all notifications for the logged in user (newest first).
-    No message threads, only info notifications.
+    Return the logged in user's notifications, newest first, one page at
+    a time. Pass the X-Next-Cursor header back as ?cursor= for the next
+    page. No message threads, only info notifications.
     """
+    query = (
+        supabase.table("notifications")
+        .select(NOTIFICATION_COLUMNS)
+        .eq("to_user", current_user["id"])
+    )
+    if cursor:
+        after_created, after_id = _decode_cursor(cursor)
+        query = query.or_(
+            f"created_at.lt.{_quote(after_created)},"
+            f"and(created_at.eq.{_quote(after_created)},id.lt.{_quote(after_id)})"
+        )
+
     try:
         res = (
-            supabase.table("notifications")
-            .select("*")
-            .eq("to_user", current_user["id"])
-            .order("created_at", desc=True)
+            query.order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit + 1)
             .execute()
         )
     except Exception as e:
         print("Error fetching notifications:", e)
-        return []
+        return FastJSONResponse([])
+
+    rows = res.data or []
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return FastJSONResponse(_build_notifications(rows[:limit]), headers=headers)
 
+
+@router.get("/inbox/unread-count")
+def inbox_unread_count(current_user=Depends(get_current_user)):
+    """Unread notifications for the nav badge, from the per-user counter."""
+    res = (
+        supabase.table("notification_counters")
+        .select("unread")
+        .eq("user_id", current_user["id"])
+        .limit(1)
+        .execute()
+    )
     rows = res.data or []
-    return _build_notifications(rows)
+    return {"unread": rows[0]["unread"] if rows else 0}
+
+
+class MarkReadRequest(BaseModel):
+    """Either a list of notification ids or all=true."""
+    ids: List[str] = Field(default_factory=list, max_length=MAX_PAGE_SIZE)
+    all: bool = False
+
+
+@router.post("/inbox/mark-read")
+def inbox_mark_read(payload: MarkReadRequest, current_user=Depends(get_current_user)):
+    """
+    Mark notifications as read with one update statement: the given ids,
+    or every unread notification when all is set. Ids that belong to
+    someone else or are already read are ignored.
+    """
+    if not payload.all and not payload.ids:
+        raise HTTPException(status_code=400, detail="Provide ids or all=true")
+
+    # Unread is "status is distinct from 'read'", matching the counter
+    # trigger; a bare neq would never match rows with a NULL status
+    query = (
+        supabase.table("notifications")
+        .update({"status": "read"})
+        .eq("to_user", current_user["id"])
+        .or_("status.is.null,status.neq.read")
+    )
+    if not payload.all:
+        try:
+            ids = [_notification_id(nid) for nid in payload.ids]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid notification id")
+        query = query.in_("id", ids)
+
+    res = query.execute()
+    return {"ok": True, "updated": len(res.data or [])}
+
+
+# Push channel
+def _format_sse(event) -> str:
+    """One Server-Sent Events frame."""
+    data = json.dumps(event.data, default=str, separators=(",", ":"))
+    return f"id: {event.id}\nevent: {event.type}\ndata: {data}\n\n"
+
+
+async def _event_stream(request: Request, user_id: str, keepalive: float):
+    """
+    Yield hub events for one connection until the client goes away.
+
+    The subscription is opened here rather than in the endpoint so that a
+    slot is only held while this generator runs; a response that is never
+    streamed never subscribes.
+    """
+    try:
+        subscription = event_hub.subscribe(user_id)
+    except TooManySubscriptions:
+        # Lost a race with another stream after the endpoint's check
+        return
+    try:
+        # Browsers reconnect after this many ms if the stream drops
+        yield "retry: 5000\n\n"
+        while True:
+            event = await subscription.next(keepalive)
+            if await request.is_disconnected():
+                break
+            # Comment lines keep proxies from closing idle streams
+            yield ": keepalive\n\n" if event is None else _format_sse(event)
+    finally:
+        subscription.close()
+
+
+@router.get("/inbox/stream")
+async def inbox_stream(request: Request, current_user=Depends(get_current_user)):
+    """
+    Server-Sent Events stream of the user's live events: new
+    notifications, balance changes, and resync hints. Replaces polling
+    /inbox/notifications; pages fetch once and then apply pushed events.
+    """
+    user_id = str(current_user["id"])
+    if event_hub.connection_count(user_id) >= event_hub.max_per_user:
+        raise HTTPException(status_code=429, detail="Too many open streams")
+
+    return StreamingResponse(
+        _event_stream(request, user_id, settings.EVENT_STREAM_KEEPALIVE_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,16 +1,42 @@
 # app/routers/payments.py
 
-from datetime import datetime, timezone
+import base64
+import json
+import threading
+import uuid
+from datetime import date, datetime, timedelta, timezone
 from typing import List, Optional, Dict, Any
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from pydantic import BaseModel
+from postgrest.exceptions import APIError
 
 from app.core.supabase_client import supabase
+from app.core.responses import FastJSONResponse
+from app.core.cache import LRUCache
+from app.core.batching import select_in
+from app.core.config import settings
 from .auth import get_current_user
+from .dashboard import invalidate_dashboard
+from ..core.events import publish_balance_change
+from ..core.notifications import notify
 
 router = APIRouter(prefix="/api/payments", tags=["payments"])
 
+# Page sizes for the payments list endpoints
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Netting runs for one pair are serialized within a process (striped so
+# the table stays fixed size); runs in other workers are caught by the
+# all-or-nothing claim in _net_scope, which retries this many times
+_NET_LOCKS = [threading.Lock() for _ in range(64)]
+NET_CLAIM_ATTEMPTS = 3
+
+# expense id -> description. Descriptions are effectively immutable after
+# creation, so entries only leave through invalidate_expense_names or LRU.
+expense_name_cache = LRUCache(settings.EXPENSE_NAME_CACHE_MAX_ENTRIES)
+
 
 # --------- helpers ---------
 
@@ -22,57 +48,54 @@ def get_current_user_id(current_user=Depends(get_current_user)) -> str:
     return str(current_user["id"])
 
 
+def invalidate_expense_names(*expense_ids: Any) -> None:
+    """Drop cached descriptions; call from any path that edits or deletes expenses."""
+    expense_name_cache.delete(*(str(eid) for eid in expense_ids if eid is not None))
+
+
+def _fetch_expense_names(expense_ids: list[str]) -> Dict[str, Optional[str]]:
+    """Look up descriptions for expense ids that are not cached yet."""
+    rows = select_in(
+        lambda: supabase.table("expenses").select("id, description"),
+        "id",
+        expense_ids,
+    )
+    return {str(row["id"]): row.get("description") for row in rows}
+
+
 def _attach_expense_names(payment_rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
     """
-    Given a list of raw payment rows (each may have expense_id),
-    fetch matching expenses and attach `expense_name` from expenses.description.
+    Given a list of raw payment rows (each may have expense_id), attach
+    `expense_name` from expenses.description.
+
+    Descriptions come from expense_name_cache; only ids missing from it
+    are fetched, in one query, and then cached.
     """
     if not payment_rows:
         return []
-    
+
     expense_ids = {
-        row["expense_id"]
+        str(row["expense_id"])
         for row in payment_rows
         if row.get("expense_id") is not None
     }
 
-    if not expense_ids:
-        # No expense IDs, just add None for expense_name
-        for row in payment_rows:
-            row["expense_name"] = None
-        return payment_rows
-
-    try:
-        exp_resp = (
-            supabase.table("expenses")
-            .select("id, description")
-            .in_("id", list(expense_ids))
-            .execute()
-        )
-
-        if hasattr(exp_resp, "error") and exp_resp.error:
-            print(f"Error fetching expense descriptions: {exp_resp.error}")
-            # Continue without expense names rather than failing
-            for row in payment_rows:
-                row["expense_name"] = None
-            return payment_rows
+    desc_by_id = expense_name_cache.get_many(expense_ids)
+    missing = [eid for eid in expense_ids if eid not in desc_by_id]
+    if missing:
+        try:
+            fetched = _fetch_expense_names(missing)
+            expense_name_cache.set_many(fetched)
+            desc_by_id.update(fetched)
+        except Exception as e:
+            # Continue without the missing names rather than failing
+            print(f"Error fetching expense descriptions: {e}")
 
-        exp_rows = exp_resp.data or []
-        desc_by_id: Dict[str, Optional[str]] = {
-            row["id"]: row.get("description") for row in exp_rows
-        }
+    for row in payment_rows:
+        eid = row.get("expense_id")
+        row["expense_name"] = desc_by_id.get(str(eid)) if eid is not None else None
 
-        for row in payment_rows:
-            eid = row.get("expense_id")
-            row["expense_name"] = desc_by_id.get(eid) if eid in desc_by_id else None
-
-        return payment_rows
-    except Exception as e:
-        print(f"Exception in _attach_expense_names: {e}")
-        # Continue without expense names rather than failing
-        for row in payment_rows:
-            row["expense_name"] = None
-        return payment_rows
+    return payment_rows
 
 
 # --------- Pydantic models (what we send back to JS) ---------
@@ -92,10 +115,25 @@ class Payment(BaseModel):
     expense_name: Optional[str] = None
 
 
+class CounterpartyBalance(BaseModel):
+    counterparty_id: str
+    owed_by_user: float
+    owed_to_user: float
+
+
+class GroupBalance(BaseModel):
+    group_id: Optional[str]           # None for friend-only payments
+    owed_by_user: float
+    owed_to_user: float
+
+
 class BalanceSummary(BaseModel):
     user_id: str
     amount_owed_by_user: float        # user still needs to pay (to_user_id = user, status='requested')
     amount_owed_to_user: float        # others still owe user (from_user_id = user, status='requested')
+    # Only filled when ?breakdown=true
+    by_counterparty: Optional[List[CounterpartyBalance]] = None
+    by_group: Optional[List[GroupBalance]] = None
 
 
 class MarkPaidRequest(BaseModel):
@@ -107,183 +145,224 @@ class MarkPaidResponse(BaseModel):
     payment: Optional[Payment] = None
 
 
+class BulkPayRequest(BaseModel):
+    """
+    Settle many payments at once. Either list payment_ids explicitly, or
+    select every outstanding payment to a counterparty and/or in a group.
+    """
+    payment_ids: Optional[List[str]] = None
+    counterparty_id: Optional[str] = None   # the from_user_id you owe
+    group_id: Optional[str] = None
+    paid_via: Optional[str] = None
+
+
+class BulkPayResult(BaseModel):
+    id: str
+    # paid | not_found | forbidden | not_payable | conflict
+    result: str
+    payment: Optional[Payment] = None
+
+
+class BulkPayResponse(BaseModel):
+    success: bool
+    paid_count: int
+    results: List[BulkPayResult]
+
+
+class NetRequest(BaseModel):
+    """
+    Collapse every outstanding payment between you and counterparty_id
+    into one. Scope: a single group (group_id), every group at once, each
+    into its own net payment (across_groups=true), or by default only
+    friend payments with no group.
+    """
+    counterparty_id: str
+    group_id: Optional[str] = None
+    across_groups: bool = False
+
+
+class NetResponse(BaseModel):
+    success: bool
+    netted_count: int
+    # None when the opposing amounts cancel out exactly, and for across_groups
+    net_payment: Optional[Payment] = None
+    # Every net payment written, one per scope that did not cancel out
+    net_payments: List[Payment] = []
+
+
+PAYMENT_COLUMNS = (
+    "id, group_id, expense_id, from_user_id, to_user_id, amount, "
+    "status, created_at, paid_at, paid_via"
+)
+
+
+def _payment_dict(row: dict[str, Any]) -> dict[str, Any]:
+    """
+    Shape a trusted payments row (with expense_name attached) exactly like
+    the Payment model, without building or validating a model instance.
+    """
+    return {
+        "id": str(row["id"]),
+        "group_id": str(row["group_id"]) if row.get("group_id") is not None else None,
+        "expense_id": str(row["expense_id"]) if row.get("expense_id") is not None else None,
+        "from_user_id": row["from_user_id"],
+        "to_user_id": row["to_user_id"],
+        "amount": float(row["amount"]),
+        "status": row["status"],
+        "created_at": row.get("created_at"),
+        "paid_at": row.get("paid_at"),
+        "paid_via": row.get("paid_via"),
+        "expense_name": row.get("expense_name"),
+    }
+
+
+def _to_payment(row: dict[str, Any]) -> Payment:
+    """Build the API model for a payment row (fields already normalised)."""
+    return Payment.model_construct(**_payment_dict(row))
+
+
 # --------- endpoints ---------
 
-@router.get("/summary", response_model=BalanceSummary)
-def get_balance_summary(user_id: str = Depends(get_current_user_id)):
+def fetch_balance_summary(user_id: str, breakdown: bool = False) -> dict[str, Any]:
     """
-    Compute outstanding balances for this user from the payments table.
+    Outstanding totals for a user from the payment_balance_summary RPC.
+    The database does the GROUP BY and returns a handful of numbers
+    instead of every requested payment row.
     """
-    owed_by_resp = (
-        supabase.table("payments")
-        .select("amount")
-        .eq("to_user_id", user_id)
-        .eq("status", "requested")
-        .execute()
-    )
-    if hasattr(owed_by_resp, "error") and owed_by_resp.error:
-        raise HTTPException(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            detail=f"Error fetching owed_by_user: {owed_by_resp.error.message}",
+    resp = (
+        supabase.rpc(
+            "payment_balance_summary",
+            {"p_user_id": user_id, "p_breakdown": breakdown},
         )
-
-    owed_to_resp = (
-        supabase.table("payments")
-        .select("amount")
-        .eq("from_user_id", user_id)
-        .eq("status", "requested")
         .execute()
     )
-    if hasattr(owed_to_resp, "error") and owed_to_resp.error:
+    if hasattr(resp, "error") and resp.error:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
-            detail=f"Error fetching owed_to_user: {owed_to_resp.error.message}",
+            detail=f"Error fetching balance summary: {resp.error.message}",
         )
+    return resp.data or {}
 
-    owed_by_list = owed_by_resp.data or []
-    owed_to_list = owed_to_resp.data or []
 
-    amount_owed_by_user = float(sum(row.get("amount", 0) for row in owed_by_list))
-    amount_owed_to_user = float(sum(row.get("amount", 0) for row in owed_to_list))
+@router.get("/summary", response_model=BalanceSummary)
+def get_balance_summary(
+    user_id: str = Depends(get_current_user_id),
+    breakdown: bool = Query(False),
+):
+    """
+    Compute outstanding balances for this user with one aggregate query.
+    With ?breakdown=true, also return per-counterparty and per-group totals.
+    """
+    data = fetch_balance_summary(user_id, breakdown)
 
     return BalanceSummary(
         user_id=user_id,
-        amount_owed_by_user=amount_owed_by_user,
-        amount_owed_to_user=amount_owed_to_user,
+        amount_owed_by_user=float(data.get("amount_owed_by_user") or 0),
+        amount_owed_to_user=float(data.get("amount_owed_to_user") or 0),
+        by_counterparty=data.get("by_counterparty") if breakdown else None,
+        by_group=data.get("by_group") if breakdown else None,
     )
 
 
-@router.get("/past", response_model=List[Payment])
-def get_past_payments(user_id: str = Depends(get_current_user_id)):
-    """
-    Fetch *paid* payments involving this user (either side of the transaction).
-    """
-    print(f"Fetching past payments for user_id: {user_id}")
-    
-    try:
-        resp = (
-            supabase.table("payments")
-            .select(
-                "id, group_id, expense_id, from_user_id, to_user_id, amount, "
-                "status, created_at, paid_at, paid_via"
-            )
-            .eq("status", "paid")
-            .or_(f"from_user_id.eq.{user_id},to_user_id.eq.{user_id}")
-            .order("created_at", desc=True)
-            .execute()
-        )
+def _quote(value: Any) -> str:
+    """Quote a value for a PostgREST logic tree (or=/and=)."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
 
-        if hasattr(resp, "error") and resp.error:
-            print(f"Supabase error: {resp.error}")
-            raise HTTPException(
-                status_code=status.HTTP_502_BAD_GATEWAY,
-                detail=f"Error fetching past payments: {resp.error.message}",
-            )
 
-        print(f"Found {len(resp.data or [])} past payments")
-        rows = _attach_expense_names(resp.data or [])
-
-        return [
-            Payment(
-                id=str(row["id"]),
-                group_id=str(row["group_id"]) if row.get("group_id") is not None else None,
-                expense_id=str(row["expense_id"]) if row.get("expense_id") is not None else None,
-                from_user_id=row["from_user_id"],
-                to_user_id=row["to_user_id"],
-                amount=float(row["amount"]),
-                status=row["status"],
-                created_at=row.get("created_at"),
-                paid_at=row.get("paid_at"),
-                paid_via=row.get("paid_via"),
-                expense_name=row.get("expense_name"),
-            )
-            for row in rows
-        ]
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Exception in get_past_payments: {e}")
-        import traceback
-        traceback.print_exc()
+def _parse_uuid(value: str, field: str) -> str:
+    """Canonical form of a client supplied uuid; 400 if it is not one."""
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error fetching past payments: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid {field}",
         )
 
 
-@router.get("/outstanding", response_model=List[Payment])
-def get_outstanding_payments(user_id: str = Depends(get_current_user_id)):
-    """
-    Fetch *requested* payments that this user still owes.
-    """
-    print(f"Fetching outstanding payments for user_id: {user_id}")
-    
-    try:
-        resp = (
-            supabase.table("payments")
-            .select(
-                "id, group_id, expense_id, from_user_id, to_user_id, amount, "
-                "status, created_at, paid_at, paid_via"
-            )
-            .eq("status", "requested")
-            .eq("to_user_id", user_id)
-            .order("created_at", desc=True)
-            .execute()
-        )
+def _encode_cursor(row: dict[str, Any]) -> str:
+    """Opaque keyset cursor for the (created_at, id) of the last row on a page."""
+    raw = json.dumps([row.get("created_at"), str(row["id"])])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
 
-        if hasattr(resp, "error") and resp.error:
-            print(f"Supabase error: {resp.error}")
-            raise HTTPException(
-                status_code=status.HTTP_502_BAD_GATEWAY,
-                detail=f"Error fetching outstanding payments: {resp.error.message}",
-            )
 
-        print(f"Found {len(resp.data or [])} outstanding payments")
-        
-        rows = _attach_expense_names(resp.data or [])
-
-        return [
-            Payment(
-                id=str(row["id"]),
-                group_id=str(row["group_id"]) if row.get("group_id") is not None else None,
-                expense_id=str(row["expense_id"]) if row.get("expense_id") is not None else None,
-                from_user_id=row["from_user_id"],
-                to_user_id=row["to_user_id"],
-                amount=float(row["amount"]),
-                status=row["status"],
-                created_at=row.get("created_at"),
-                paid_at=row.get("paid_at"),
-                paid_via=row.get("paid_via"),
-                expense_name=row.get("expense_name"),
-            )
-            for row in rows
-        ]
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Exception in get_outstanding_payments: {e}")
-        import traceback
-        traceback.print_exc()
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        created_at, pid = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(created_at), str(uuid.UUID(str(pid)))
+    except Exception:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error fetching outstanding payments: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
         )
 
 
-@router.get("", response_model=List[Payment])
-def get_all_payments(user_id: str = Depends(get_current_user_id)):
+def _fetch_payment_page(
+    user_id: str,
+    *,
+    owed_by_user_only: bool,
+    status_filter: Optional[str],
+    limit: int,
+    cursor: Optional[str],
+    group_id: Optional[str],
+    counterparty_id: Optional[str],
+    date_from: Optional[date],
+    date_to: Optional[date],
+) -> tuple[list[dict[str, Any]], Optional[str]]:
     """
-    Fetch ALL payments involving this user (requested + paid).
-    Mainly for debugging / future use.
+    Load one page of payments newest first, keyed on (created_at, id).
+
+    owed_by_user_only=True restricts to payments the user owes
+    (to_user_id = user); otherwise either side of the payment matches.
+    Returns the rows (with expense names) and the cursor for the next
+    page, or None on the last page.
     """
-    resp = (
-        supabase.table("payments")
-        .select(
-            "id, group_id, expense_id, from_user_id, to_user_id, amount, "
-            "status, created_at, paid_at, paid_via"
+    if counterparty_id:
+        counterparty_id = _parse_uuid(counterparty_id, "counterparty_id")
+
+    query = supabase.table("payments").select(PAYMENT_COLUMNS)
+    # Every OR group below is ANDed together inside one logic tree; the
+    # caller restriction is always its own group of quoted values
+    clauses: List[str] = []
+
+    if status_filter:
+        query = query.eq("status", status_filter)
+
+    if owed_by_user_only:
+        query = query.eq("to_user_id", user_id)
+        if counterparty_id:
+            query = query.eq("from_user_id", counterparty_id)
+    else:
+        clauses.append(f"or(from_user_id.eq.{_quote(user_id)},to_user_id.eq.{_quote(user_id)})")
+        if counterparty_id:
+            # Both sides within {user, counterparty}; with the caller group
+            # above that is exactly the pair in either direction
+            pair = [user_id, counterparty_id]
+            query = query.in_("from_user_id", pair).in_("to_user_id", pair)
+
+    if group_id:
+        query = query.eq("group_id", group_id)
+    if date_from:
+        query = query.gte("created_at", date_from.isoformat())
+    if date_to:
+        query = query.lt("created_at", (date_to + timedelta(days=1)).isoformat())
+
+    if cursor:
+        after_created, after_id = _decode_cursor(cursor)
+        clauses.append(
+            f"or(created_at.lt.{_quote(after_created)},"
+            f"and(created_at.eq.{_quote(after_created)},id.lt.{_quote(after_id)}))"
         )
-        .or_(f"from_user_id.eq.{user_id},to_user_id.eq.{user_id}")
-        .order("created_at", desc=True)
+
+    if len(clauses) == 1:
+        query = query.or_(clauses[0][len("or("):-1])
+    elif clauses:
+        query = query.or_(f"and({','.join(clauses)})")
+
+    resp = (
+        query.order("created_at", desc=True)
+        .order("id", desc=True)
+        .limit(limit + 1)
         .execute()
     )
 
@@ -293,24 +372,121 @@ def get_all_payments(user_id: str = Depends(get_current_user_id)):
             detail=f"Error fetching payments: {resp.error.message}",
         )
 
-    rows = _attach_expense_names(resp.data or [])
-
-    return [
-        Payment(
-            id=str(row["id"]),
-            group_id=str(row["group_id"]) if row.get("group_id") is not None else None,
-            expense_id=str(row["expense_id"]) if row.get("expense_id") is not None else None,
-            from_user_id=row["from_user_id"],
-            to_user_id=row["to_user_id"],
-            amount=float(row["amount"]),
-            status=row["status"],
-            created_at=row.get("created_at"),
-            paid_at=row.get("paid_at"),
-            paid_via=row.get("paid_via"),
-            expense_name=row.get("expense_name"),
-        )
-        for row in rows
-    ]
+    rows = resp.data or []
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return _attach_expense_names(rows[:limit]), next_cursor
+
+
+def _list_payments(
+    user_id: str,
+    *,
+    owed_by_user_only: bool,
+    status_filter: Optional[str],
+    limit: int,
+    cursor: Optional[str],
+    group_id: Optional[str],
+    counterparty_id: Optional[str],
+    date_from: Optional[date],
+    date_to: Optional[date],
+) -> FastJSONResponse:
+    """
+    Shared body of the list endpoints; next cursor goes in X-Next-Cursor.
+    Rows come straight from the database, so they skip response_model
+    validation and are rendered through the fast JSON path.
+    """
+    rows, next_cursor = _fetch_payment_page(
+        user_id,
+        owed_by_user_only=owed_by_user_only,
+        status_filter=status_filter,
+        limit=limit,
+        cursor=cursor,
+        group_id=group_id,
+        counterparty_id=counterparty_id,
+        date_from=date_from,
+        date_to=date_to,
+    )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return FastJSONResponse([_payment_dict(row) for row in rows], headers=headers)
+
+
+@router.get("/past", response_model=List[Payment], response_class=FastJSONResponse)
+def get_past_payments(
+    user_id: str = Depends(get_current_user_id),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    group_id: Optional[str] = Query(None),
+    counterparty_id: Optional[str] = Query(None),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+):
+    """
+    Fetch *paid* payments involving this user (either side of the transaction),
+    one page at a time. Pass the X-Next-Cursor header back as ?cursor=.
+    """
+    return _list_payments(
+        user_id,
+        owed_by_user_only=False,
+        status_filter="paid",
+        limit=limit,
+        cursor=cursor,
+        group_id=group_id,
+        counterparty_id=counterparty_id,
+        date_from=date_from,
+        date_to=date_to,
+    )
+
+
+@router.get("/outstanding", response_model=List[Payment], response_class=FastJSONResponse)
+def get_outstanding_payments(
+    user_id: str = Depends(get_current_user_id),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    group_id: Optional[str] = Query(None),
+    counterparty_id: Optional[str] = Query(None),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+):
+    """
+    Fetch *requested* payments that this user still owes, one page at a time.
+    """
+    return _list_payments(
+        user_id,
+        owed_by_user_only=True,
+        status_filter="requested",
+        limit=limit,
+        cursor=cursor,
+        group_id=group_id,
+        counterparty_id=counterparty_id,
+        date_from=date_from,
+        date_to=date_to,
+    )
+
+
+@router.get("", response_model=List[Payment], response_class=FastJSONResponse)
+def get_all_payments(
+    user_id: str = Depends(get_current_user_id),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    group_id: Optional[str] = Query(None),
+    counterparty_id: Optional[str] = Query(None),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+):
+    """
+    Fetch ALL payments involving this user (requested + paid).
+    Mainly for debugging / future use.
+    """
+    return _list_payments(
+        user_id,
+        owed_by_user_only=False,
+        status_filter=None,
+        limit=limit,
+        cursor=cursor,
+        group_id=group_id,
+        counterparty_id=counterparty_id,
+        date_from=date_from,
+        date_to=date_to,
+    )
 
 
 @router.post("/{payment_id}/pay", response_model=MarkPaidResponse)
@@ -320,32 +496,77 @@ def mark_payment_as_paid(
     user_id: str = Depends(get_current_user_id),
 ):
     """
-    Mark a payment as paid in Supabase.
+    Mark a payment as paid in Supabase with a single conditional update:
+        UPDATE payments SET status='paid', paid_at=now
+        WHERE id=? AND to_user_id=? AND status='requested'
     - Only the user in to_user_id can mark it paid
     - Only allowed when status='requested'
-    - sets status='paid'
-    - sets paid_at=now (UTC)
     - optionally stores paid_via
+    Two concurrent clicks cannot both succeed. When no row matches,
+    one extra read decides between 404, 403 and 409.
     """
+    now_iso = datetime.now(timezone.utc).isoformat()
 
-    fetch_resp = (
+    update_payload = {
+        "status": "paid",
+        "paid_at": now_iso,
+    }
+    if body.paid_via:
+        update_payload["paid_via"] = body.paid_via
+
+    update_resp = (
         supabase.table("payments")
-        .select(
-            "id, group_id, expense_id, from_user_id, to_user_id, amount, "
-            "status, created_at, paid_at, paid_via"
-        )
+        .update(update_payload)
         .eq("id", payment_id)
-        .single()
+        .eq("to_user_id", user_id)
+        .eq("status", "requested")
         .execute()
     )
 
-    if hasattr(fetch_resp, "error") and fetch_resp.error:
+    if hasattr(update_resp, "error") and update_resp.error:
+        print(f"Update error: {update_resp.error}")
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
-            detail=f"Error fetching payment: {fetch_resp.error.message}",
+            detail=f"Error updating payment: {update_resp.error.message}",
         )
 
-    row = fetch_resp.data
+    updated_rows = update_resp.data or []
+    if not updated_rows:
+        _raise_for_unpayable(payment_id, user_id)
+
+    updated = _attach_expense_names([updated_rows[0]])[0]
+
+    invalidate_dashboard(updated["from_user_id"], updated["to_user_id"])
+    publish_balance_change(updated["from_user_id"], updated["to_user_id"])
+    notify("Payment Paid", user_id, [updated["from_user_id"]], updated.get("group_id"))
+
+    return MarkPaidResponse(success=True, payment=_to_payment(updated))
+
+
+def _raise_for_unpayable(payment_id: str, user_id: str) -> None:
+    """
+    Explain why a conditional pay update matched no rows.
+    404 if the payment does not exist, 403 if it belongs to someone else,
+    409 if it was already settled (for example by a concurrent request).
+    """
+    try:
+        fetch_resp = (
+            supabase.table("payments")
+            .select("id, to_user_id, status")
+            .eq("id", payment_id)
+            .single()
+            .execute()
+        )
+        row = fetch_resp.data
+    except APIError as e:
+        # .single() reports "no rows" as PGRST116; anything else is a real failure
+        if e.code != "PGRST116":
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error fetching payment: {e.message}",
+            )
+        row = None
+
     if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -358,65 +579,335 @@ def mark_payment_as_paid(
             detail="You cannot pay for someone else's payment.",
         )
 
-    if row["status"] != "requested":
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Payment is not in a payable state.",
+    )
+
+
+@router.post("/settle", response_model=BulkPayResponse)
+def settle_payments(
+    body: BulkPayRequest,
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Mark many payments as paid in one go.
+    - One query loads and authorises every targeted payment
+    - One conditional update (to_user_id = you, status = 'requested')
+      settles all payable rows together
+    - Returns a per-id result; rows settled by a concurrent request
+      between the two steps come back as "conflict"
+    """
+    if body.payment_ids is not None and (body.counterparty_id or body.group_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Send either payment_ids or counterparty/group filters, not both.",
+        )
+    if body.payment_ids is None and not (body.counterparty_id or body.group_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Payment is not in a payable state.",
+            detail="Nothing to settle: give payment_ids, counterparty_id or group_id.",
         )
 
-    now_iso = datetime.now(timezone.utc).isoformat()
+    # ----- 1. Authorisation query -----
+    query = supabase.table("payments").select(PAYMENT_COLUMNS)
+    if body.payment_ids is not None:
+        requested_ids = [str(pid) for pid in dict.fromkeys(body.payment_ids)]
+        if not requested_ids:
+            return BulkPayResponse(success=True, paid_count=0, results=[])
+        query = query.in_("id", requested_ids)
+    else:
+        query = query.eq("to_user_id", user_id).eq("status", "requested")
+        if body.counterparty_id:
+            query = query.eq("from_user_id", body.counterparty_id)
+        if body.group_id:
+            query = query.eq("group_id", body.group_id)
+
+    fetch_resp = query.execute()
+    if hasattr(fetch_resp, "error") and fetch_resp.error:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Error fetching payments: {fetch_resp.error.message}",
+        )
 
-    update_payload = {
-        "status": "paid",
-        "paid_at": now_iso,
-    }
-    if body.paid_via:
-        update_payload["paid_via"] = body.paid_via
+    rows_by_id = {str(row["id"]): row for row in fetch_resp.data or []}
+    if body.payment_ids is None:
+        requested_ids = list(rows_by_id)
+
+    outcome: Dict[str, str] = {}
+    payable_ids: List[str] = []
+    for pid in requested_ids:
+        row = rows_by_id.get(pid)
+        if row is None:
+            outcome[pid] = "not_found"
+        elif row["to_user_id"] != user_id:
+            outcome[pid] = "forbidden"
+        elif row["status"] != "requested":
+            outcome[pid] = "not_payable"
+        else:
+            payable_ids.append(pid)
+
+    # ----- 2. One batched conditional update -----
+    updated_rows: List[dict[str, Any]] = []
+    if payable_ids:
+        update_payload = {
+            "status": "paid",
+            "paid_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if body.paid_via:
+            update_payload["paid_via"] = body.paid_via
 
-    print(f"Updating payment {payment_id} with payload: {update_payload}")
+        update_resp = (
+            supabase.table("payments")
+            .update(update_payload)
+            .in_("id", [rows_by_id[pid]["id"] for pid in payable_ids])
+            .eq("to_user_id", user_id)
+            .eq("status", "requested")
+            .execute()
+        )
+        if hasattr(update_resp, "error") and update_resp.error:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Error updating payments: {update_resp.error.message}",
+            )
+        updated_rows = _attach_expense_names(update_resp.data or [])
+
+    paid_by_id = {str(row["id"]): row for row in updated_rows}
+    for pid in payable_ids:
+        outcome[pid] = "paid" if pid in paid_by_id else "conflict"
+
+    if paid_by_id:
+        payers = {row["from_user_id"] for row in updated_rows}
+        invalidate_dashboard(user_id, *payers)
+        publish_balance_change(user_id, *payers)
+        for row in updated_rows:
+            notify("Payment Paid", user_id, [row["from_user_id"]], row.get("group_id"))
+
+    results = [
+        BulkPayResult(
+            id=pid,
+            result=outcome[pid],
+            payment=_to_payment(paid_by_id[pid]) if pid in paid_by_id else None,
+        )
+        for pid in requested_ids
+    ]
 
-    update_resp = (
+    return BulkPayResponse(success=True, paid_count=len(paid_by_id), results=results)
+
+
+# --------- netting ---------
+
+def _net_lock(user_id: str, counterparty_id: str) -> threading.Lock:
+    return _NET_LOCKS[hash(frozenset((user_id, counterparty_id))) % len(_NET_LOCKS)]
+
+
+def _open_pair_rows(
+    user_id: str, counterparty_id: str, group_id: Optional[str], any_group: bool = False
+) -> list[dict[str, Any]]:
+    """The pair's requested rows in both directions, in one scope (or all)."""
+    query = (
         supabase.table("payments")
-        .update(update_payload)
-        .eq("id", payment_id)
+        .select(PAYMENT_COLUMNS)
+        .eq("status", "requested")
+        .or_(
+            f"and(from_user_id.eq.{_quote(user_id)},to_user_id.eq.{_quote(counterparty_id)}),"
+            f"and(from_user_id.eq.{_quote(counterparty_id)},to_user_id.eq.{_quote(user_id)})"
+        )
+    )
+    if group_id is not None:
+        query = query.eq("group_id", group_id)
+    elif not any_group:
+        query = query.is_("group_id", "null")
+    return query.execute().data or []
+
+
+def _release_netted(rows: list[dict[str, Any]]) -> None:
+    """Hand claimed rows back to 'requested'."""
+    if not rows:
+        return
+    (
+        supabase.table("payments")
+        .update({"status": "requested", "paid_at": None})
+        .in_("id", [row["id"] for row in rows])
+        .eq("status", "netted")
         .execute()
     )
 
-    if hasattr(update_resp, "error") and update_resp.error:
-        print(f"Update error: {update_resp.error}")
-        raise HTTPException(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            detail=f"Error updating payment: {update_resp.error.message}",
-        )
 
-    print(f"Payment {payment_id} updated successfully. Updated data: {update_resp.data}")
+def _net_scope(
+    user_id: str, counterparty_id: str, group_id: Optional[str]
+) -> tuple[list[dict[str, Any]], Optional[dict[str, Any]]]:
+    """
+    Net the pair's open rows in one scope (a group, or no group).
 
-    # Fetch the updated payment
-    fetch_resp = (
-        supabase.table("payments")
-        .select(
-            "id, group_id, expense_id, from_user_id, to_user_id, amount, "
-            "status, created_at, paid_at, paid_via"
+    The claim is all-or-nothing: if another run consumed any of the loaded
+    rows first, netting the rest would leave the pair with two open rows,
+    so the partial claim is handed back and the scope is reloaded.
+    """
+    for _ in range(NET_CLAIM_ATTEMPTS):
+        rows = _open_pair_rows(user_id, counterparty_id, group_id)
+        if len(rows) < 2:
+            return [], None
+
+        now_iso = datetime.now(timezone.utc).isoformat()
+        claim_resp = (
+            supabase.table("payments")
+            .update({"status": "netted", "paid_at": now_iso})
+            .in_("id", [row["id"] for row in rows])
+            .eq("status", "requested")
+            # Only ever the pair's own rows, whatever the select returned
+            .or_(f"from_user_id.eq.{_quote(user_id)},to_user_id.eq.{_quote(user_id)}")
+            .in_("from_user_id", [user_id, counterparty_id])
+            .in_("to_user_id", [user_id, counterparty_id])
+            .execute()
         )
-        .eq("id", payment_id)
-        .single()
+        claimed = claim_resp.data or []
+        if len(claimed) == len(rows):
+            break
+        _release_netted(claimed)
+    else:
+        return [], None
+
+    # Positive: user owes counterparty; negative: counterparty owes user
+    net = round(
+        sum(
+            float(row["amount"]) if row["to_user_id"] == user_id else -float(row["amount"])
+            for row in claimed
+        ),
+        2,
+    )
+
+    net_row = None
+    if net != 0:
+        debtor, creditor = (user_id, counterparty_id) if net > 0 else (counterparty_id, user_id)
+        try:
+            insert_resp = (
+                supabase.table("payments")
+                .insert({
+                    "group_id": group_id,
+                    "expense_id": None,
+                    "from_user_id": creditor,
+                    "to_user_id": debtor,
+                    "amount": abs(net),
+                    "status": "requested",
+                    "created_at": now_iso,
+                })
+                .execute()
+            )
+            net_row = (insert_resp.data or [None])[0]
+        except Exception:
+            # Hand the claimed rows back rather than losing the balance
+            _release_netted(claimed)
+            raise
+
+    return claimed, net_row
+
+
+def net_pair(
+    user_id: str,
+    counterparty_id: str,
+    *,
+    group_id: Optional[str] = None,
+    across_groups: bool = False,
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """
+    Replace all outstanding payments between two users (in one scope) by
+    a single net payment.
+
+    1. Load the pair's requested rows in both directions
+    2. Claim them with one conditional update to status 'netted'
+       (status = 'requested' guard, so rows paid meanwhile are left alone)
+    3. Insert one requested payment for the net of the claimed rows
+
+    With across_groups every scope the pair has open rows in is netted,
+    each into its own group: a group's debts never move into another
+    group or out of it. Returns (netted rows, net payment rows). A scope
+    with fewer than two open rows has nothing to collapse and is skipped.
+    """
+    with _net_lock(user_id, counterparty_id):
+        if across_groups:
+            open_rows = _open_pair_rows(user_id, counterparty_id, None, any_group=True)
+            scopes = list(dict.fromkeys(row.get("group_id") for row in open_rows))
+        else:
+            scopes = [group_id]
+
+        netted: list[dict[str, Any]] = []
+        net_rows: list[dict[str, Any]] = []
+        try:
+            for scope in scopes:
+                claimed, net_row = _net_scope(user_id, counterparty_id, scope)
+                netted += claimed
+                if net_row:
+                    net_rows.append(net_row)
+        finally:
+            # Scopes netted before a failure have still changed
+            if netted:
+                invalidate_dashboard(user_id, counterparty_id)
+                publish_balance_change(user_id, counterparty_id)
+    return netted, net_rows
+
+
+def net_new_obligations(payer_id: str, member_ids: List[str], group_id: Optional[str]) -> None:
+    """
+    Background job run after an expense is created: net the payer against
+    each participant in the expense's scope, so every pair keeps at most
+    one open payment per group.
+    """
+    for member_id in dict.fromkeys(member_ids):
+        if member_id == payer_id:
+            continue
+        try:
+            net_pair(payer_id, member_id, group_id=group_id)
+        except Exception as e:
+            # Netting is an optimisation; the obligations stay valid without it
+            print(f"Error netting payments for {payer_id}/{member_id}: {e}")
+
+
+@router.post("/net", response_model=NetResponse)
+def net_payments(
+    body: NetRequest,
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Collapse all outstanding payments between you and a counterparty into
+    a single net payment, within one group or across all groups.
+    """
+    counterparty_id = _parse_uuid(body.counterparty_id, "counterparty_id")
+    if counterparty_id == user_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot net payments with yourself.",
+        )
+    if body.group_id and body.across_groups:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Send either group_id or across_groups, not both.",
+        )
+
+    user_res = (
+        supabase.table("users")
+        .select("id")
+        .eq("id", counterparty_id)
+        .limit(1)
         .execute()
     )
+    if not user_res.data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Counterparty not found.",
+        )
 
-    updated = _attach_expense_names([fetch_resp.data])[0]
-
-    payment = Payment(
-        id=str(updated["id"]),
-        group_id=str(updated["group_id"]) if updated.get("group_id") is not None else None,
-        expense_id=str(updated["expense_id"]) if updated.get("expense_id") is not None else None,
-        from_user_id=updated["from_user_id"],
-        to_user_id=updated["to_user_id"],
-        amount=float(updated["amount"]),
-        status=updated["status"],
-        created_at=updated.get("created_at"),
-        paid_at=updated.get("paid_at"),
-        paid_via=updated.get("paid_via"),
-        expense_name=updated.get("expense_name"),
+    netted, net_rows = net_pair(
+        user_id,
+        counterparty_id,
+        group_id=body.group_id,
+        across_groups=body.across_groups,
     )
 
-    return MarkPaidResponse(success=True, payment=payment)
+    net_payments = [_to_payment(row) for row in _attach_expense_names(net_rows)]
+    return NetResponse(
+        success=True,
+        netted_count=len(netted),
+        net_payment=net_payments[0] if net_payments and not body.across_groups else None,
+        net_payments=net_payments,
+    )
@@ -1,12 +1,16 @@
 # FILE: app/routers/users.py
 # Minimal user lookup endpoints for the frontend.
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 
 from ..core.supabase_client import supabase
+from ..core.usernames import ensure_username_index, username_index
+from .auth import get_current_user
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
+MAX_SEARCH_RESULTS = 25
+
 
 @router.get("/by-username")
 def get_user_by_username(
@@ -29,3 +33,33 @@ def get_user_by_username(
 
     # usernames are unique, so the first row is the correct one.
     return rows[0]
+
+
+@router.get("/search")
+def search_usernames(
+    prefix: str = Query(..., min_length=1, max_length=64),
+    limit: int = Query(10, ge=1, le=MAX_SEARCH_RESULTS),
+    current_user=Depends(get_current_user),
+):
+    """
+    Username autocomplete for logged in users: up to limit users whose
+    username starts with prefix (case insensitive), in username order.
+    Served from the in-process username index; falls back to a prefix
+    ilike query when the index is over its size cap.
+    """
+    ensure_username_index()
+    if username_index.complete:
+        return {"users": username_index.search(prefix, limit)}
+
+    escaped = prefix.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    if not escaped:
+        return {"users": []}
+    resp = (
+        supabase.table("users")
+        .select("id, username")
+        .ilike("username", f"{escaped}%")
+        .order("username")
+        .limit(limit)
+        .execute()
+    )
+    return {"users": resp.data or []}
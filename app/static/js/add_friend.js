@@ -35,6 +35,42 @@ function updateButtonDisabled() {
   btn.disabled = !(first && last && username);
 }
 
+let suggestTimer = null;
+
+/**
+ * Fill the username datalist with matches for the typed prefix.
+ */
+async function loadUsernameSuggestions(prefix) {
+  const list = $("af-username-suggestions");
+  if (!list) return;
+
+  if (!prefix) {
+    list.innerHTML = "";
+    return;
+  }
+
+  try {
+    const resp = await fetch(
+      `/api/users/search?prefix=${encodeURIComponent(prefix)}&limit=8`,
+      { credentials: "include" }
+    );
+    if (!resp.ok) return;
+
+    const data = await resp.json();
+    // Ignore answers for a prefix the user has already typed past.
+    if (($("af-username")?.value.trim() || "") !== prefix) return;
+
+    list.innerHTML = "";
+    (data.users || []).forEach((u) => {
+      const opt = document.createElement("option");
+      opt.value = u.username;
+      list.appendChild(opt);
+    });
+  } catch (err) {
+    console.warn("Username suggestions failed:", err);
+  }
+}
+
 /**
  * Handle Save Friend click.
  */
@@ -123,6 +159,14 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   });
 
+  if (username) {
+    username.addEventListener("input", () => {
+      clearTimeout(suggestTimer);
+      const prefix = username.value.trim();
+      suggestTimer = setTimeout(() => loadUsernameSuggestions(prefix), 120);
+    });
+  }
+
   if (btn) {
     btn.addEventListener("click", handleSaveClick);
     updateButtonDisabled();
@@ -10,6 +10,12 @@ document.addEventListener("DOMContentLoaded", () => {
   const addBtn = document.getElementById("friends-add-btn");
   const listEl = document.getElementById("friends-list");
   const totalEl = document.getElementById("friends-total");
+  const moreBtn = document.getElementById("friends-more-btn");
+
+  // Page size for the list; the server sorts and filters.
+  const PAGE_SIZE = 100;
+  let nextCursor = null;
+  let searchTimer = null;
 
   // Guard in case the template is not loaded correctly.
   if (!listEl || !totalEl) {
@@ -18,8 +24,12 @@ document.addEventListener("DOMContentLoaded", () => {
   }
 
   // Build query string for the friends API call.
-  function buildFriendsQuery() {
+  function buildFriendsQuery(cursor) {
     const params = new URLSearchParams();
+    params.set("limit", String(PAGE_SIZE));
+    if (cursor) {
+      params.set("cursor", cursor);
+    }
     const q = searchInput?.value?.trim();
     const group = groupSelect?.value?.trim();
 
@@ -104,10 +114,13 @@ document.addEventListener("DOMContentLoaded", () => {
   }
 
   // Render friends into the main list container.
-  function renderFriends(friends) {
-    listEl.innerHTML = "";
+  // With append set, rows are added after the ones already shown.
+  function renderFriends(friends, append = false) {
+    if (!append) {
+      listEl.innerHTML = "";
+    }
 
-    if (!friends || friends.length === 0) {
+    if (!append && (!friends || friends.length === 0)) {
       const empty = document.createElement("div");
       empty.className = "friends-empty";
       empty.textContent =
@@ -175,38 +188,42 @@ document.addEventListener("DOMContentLoaded", () => {
       listEl.appendChild(row);
     });
 
-    totalEl.textContent = `${friends.length} total`;
+    const shown = listEl.querySelectorAll(".friend-row").length;
+    totalEl.textContent = nextCursor ? `${shown}+ shown` : `${shown} total`;
   }
 
   // Load friends from API and render them.
-  async function loadFriends() {
+  // With more set, the next page is appended to the current list.
+  async function loadFriends(more = false) {
     try {
-      const qs = buildFriendsQuery();
+      const qs = buildFriendsQuery(more ? nextCursor : null);
       const resp = await fetch(`/api/friends/${qs}`);
       if (!resp.ok) {
         console.error("Failed to load friends:", resp.status);
+        nextCursor = null;
         renderFriends([]);
         return;
       }
 
       const data = await resp.json();
-      const friends = data.friends || [];
-
-      friends.sort((a, b) => {
-        const an = (a.name || "").toLowerCase();
-        const bn = (b.name || "").toLowerCase();
-        if (an < bn) return -1;
-        if (an > bn) return 1;
-        return 0;
-      });
+      nextCursor = data.next_cursor || null;
+      if (moreBtn) moreBtn.hidden = !nextCursor;
 
-      renderFriends(friends);
+      // Already sorted by name on the server.
+      renderFriends(data.friends || [], more);
     } catch (err) {
       console.error("Error loading friends:", err);
+      nextCursor = null;
       renderFriends([]);
     }
   }
 
+  if (moreBtn) {
+    moreBtn.addEventListener("click", () => {
+      if (nextCursor) loadFriends(true);
+    });
+  }
+
   // Attach handlers for search and clear buttons.
   if (searchBtn) {
     searchBtn.addEventListener("click", () => {
@@ -222,11 +239,18 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   }
 
-  // Allow Enter key in the search box to trigger search.
+  // Allow Enter key in the search box to trigger search,
+  // and search as the user types after a short pause.
   if (searchInput) {
+    searchInput.addEventListener("input", () => {
+      clearTimeout(searchTimer);
+      searchTimer = setTimeout(() => loadFriends(), 150);
+    });
+
     searchInput.addEventListener("keydown", (evt) => {
       if (evt.key === "Enter") {
         evt.preventDefault();
+        clearTimeout(searchTimer);
         loadFriends();
       }
     });
@@ -239,7 +263,93 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   }
 
-  // Initial load for groups and friends.
+  // Add a suggested person as a friend, then refresh both lists.
+  async function addSuggested(suggestion, button) {
+    button.disabled = true;
+    try {
+      const resp = await fetch("/api/friends/", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        credentials: "include",
+        body: JSON.stringify({ username: suggestion.username }),
+      });
+      if (!resp.ok) {
+        console.error("Add suggested friend failed with", resp.status);
+        button.disabled = false;
+        return;
+      }
+      loadFriends();
+      loadSuggestions();
+    } catch (err) {
+      console.error("Error adding suggested friend:", err);
+      button.disabled = false;
+    }
+  }
+
+  // Load "people you may know" and render them under the list.
+  async function loadSuggestions() {
+    const block = document.getElementById("friends-suggestions-block");
+    const container = document.getElementById("friends-suggestions");
+    if (!block || !container) return;
+
+    try {
+      const resp = await fetch("/api/friends/suggestions?limit=8");
+      if (!resp.ok) return;
+      const data = await resp.json();
+      const suggestions = data.suggestions || [];
+
+      container.innerHTML = "";
+      block.hidden = suggestions.length === 0;
+
+      suggestions.forEach((s) => {
+        const row = document.createElement("div");
+        row.className = "friend-row";
+
+        const main = document.createElement("div");
+        main.className = "friend-row-main";
+
+        const name = document.createElement("span");
+        name.className = "friend-name";
+        name.textContent = s.name || s.username;
+
+        const username = document.createElement("span");
+        username.className = "friend-username";
+        username.textContent = `@${s.username}`;
+
+        main.appendChild(name);
+        main.appendChild(username);
+
+        const why = document.createElement("div");
+        why.className = "friend-email";
+        const reasons = [];
+        if (s.mutual_friends) {
+          reasons.push(`${s.mutual_friends} mutual friend${s.mutual_friends === 1 ? "" : "s"}`);
+        }
+        if (s.shared_groups) {
+          reasons.push(`${s.shared_groups} shared group${s.shared_groups === 1 ? "" : "s"}`);
+        }
+        why.textContent = reasons.join(" · ");
+
+        const addBtn = document.createElement("button");
+        addBtn.type = "button";
+        addBtn.className = "btn-outline";
+        addBtn.style.fontSize = "0.8rem";
+        addBtn.style.alignSelf = "flex-end";
+        addBtn.textContent = "Add";
+        addBtn.addEventListener("click", () => addSuggested(s, addBtn));
+
+        row.appendChild(main);
+        row.appendChild(why);
+        row.appendChild(addBtn);
+        container.appendChild(row);
+      });
+    } catch (err) {
+      console.error("Error loading suggestions:", err);
+    }
+  }
+
+  // Initial load for groups, friends and suggestions.
   loadGroups();
   loadFriends();
+  loadSuggestions();
 });
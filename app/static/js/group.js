@@ -31,17 +31,43 @@ function pickMemberName(u) {
 
 
 // Render members into UL.
-function renderMembers(container, members) {
+function renderMembers(container, members, append = false) {
   if (!container) return;
-  if (!members || !members.length) {
+  if (!append && (!members || !members.length)) {
     container.innerHTML =
       '<li class="muted">No members found for this group.</li>';
     return;
   }
+  if (!append) container.innerHTML = "";
+  (members || []).forEach((u) => {
+    const li = document.createElement("li");
+    li.textContent = pickMemberName(u) + formatBalance(u.net);
+    container.appendChild(li);
+  });
+}
+
+
+// " · is owed $x" / " · owes $x" for a member's net balance in the group.
+function formatBalance(net) {
+  if (typeof net !== "number" || Math.abs(net) < 0.005) return "";
+  const amount = `$${Math.abs(net).toFixed(2)}`;
+  return net > 0 ? ` · is owed ${amount}` : ` · owes ${amount}`;
+}
+
+
+// Render the latest group expenses into UL.
+function renderRecentExpenses(container, expenses) {
+  if (!container) return;
+  if (!expenses || !expenses.length) {
+    container.innerHTML = '<li class="muted">No expenses yet.</li>';
+    return;
+  }
   container.innerHTML = "";
-  members.forEach((u) => {
+  expenses.forEach((e) => {
     const li = document.createElement("li");
-    li.textContent = pickMemberName(u);
+    const who = e.payer_name ? ` · paid by ${e.payer_name}` : "";
+    li.textContent =
+      `${e.description || "Expense"} · $${Number(e.amount || 0).toFixed(2)}${who}`;
     container.appendChild(li);
   });
 }
@@ -111,47 +137,78 @@ async function initGroupPage() {
   const leaveBtn = document.getElementById("leave-group-btn");
   const tripInput = document.getElementById("trip-description");
 
+  // groups.version of the copy shown on the page, sent back on save
+  let groupVersion = null;
+
 
-  // Load group info.
+  const overviewUrl = `/api/groups/${encodeURIComponent(groupId)}/overview`;
+
+  // Load group, members with balances and recent expenses in one request.
+  let overview;
   try {
-    const group = await fetchJson(`/api/groups/${encodeURIComponent(groupId)}`);
-    const nameEl = document.getElementById("group-name");
-const descEl = document.getElementById("group-desc");
+    overview = await fetchJson(overviewUrl);
+  } catch (err) {
+    console.error("Failed to load group:", err);
+    alert("Group not found.");
+    window.location.href = "/groups";
+    return;
+  }
 
+  const group = overview.group || {};
+  groupVersion = group.version ?? null;
+  const nameEl = document.getElementById("group-name");
+  const descEl = document.getElementById("group-desc");
 
-// Set displayed name/description
-if (nameEl) nameEl.textContent = group.name ?? "Group";
-if (descEl) descEl.textContent = group.description || "";
+  // Set displayed name/description
+  if (nameEl) nameEl.textContent = group.name ?? "Group";
+  if (descEl) descEl.textContent = group.description || "";
 
+  // Also load description into trip description textarea
+  if (tripInput) tripInput.value = group.description || "";
 
-// Also load description into trip description textarea
-const tripDescInput = document.getElementById("trip-description");
-if (tripDescInput) tripDescInput.value = group.description || "";
+  if (dateEl && group.created_at) {
+    dateEl.textContent = new Date(group.created_at).toLocaleDateString();
+  }
 
+  const moreMembersBtn = document.getElementById("group-members-more");
+  let membersCursor = null;
 
+  // Show the "More members" button only while another page exists.
+  function setMembersCursor(cursor) {
+    membersCursor = cursor || null;
+    if (moreMembersBtn) moreMembersBtn.hidden = !membersCursor;
+  }
 
+  renderMembers(membersEl, overview.members);
+  setMembersCursor(overview.members_next_cursor);
 
-    if (dateEl && group.created_at) {
-      dateEl.textContent = new Date(group.created_at).toLocaleDateString();
-    }
-  } catch (err) {
-    console.error("Failed to load group:", err);
-    alert("Group not found.");
-    window.location.href = "/groups";
-    return;
+  if (moreMembersBtn) {
+    moreMembersBtn.addEventListener("click", async () => {
+      if (!membersCursor) return;
+      try {
+        const data = await fetchJson(
+          `/api/groups/${encodeURIComponent(groupId)}/members?limit=100&cursor=${encodeURIComponent(membersCursor)}`
+        );
+        renderMembers(membersEl, data.members, true);
+        setMembersCursor(data.next_cursor);
+      } catch (err) {
+        console.error("Failed to load more members:", err);
+      }
+    });
   }
+  renderRecentExpenses(
+    document.getElementById("group-recent-expenses"),
+    overview.recent_expenses
+  );
 
 
-  // Load members.
+  // Reload members after a change.
   async function refreshMembers() {
     try {
-      const data = await fetchJson(
-        `/api/groups/${encodeURIComponent(groupId)}/members`
-      );
-      const members = Array.isArray(data?.members)
-        ? data.members
-        : data.data || [];
-      renderMembers(membersEl, members);
+      const data = await fetchJson(overviewUrl);
+      groupVersion = data?.group?.version ?? groupVersion;
+      renderMembers(membersEl, data.members);
+      setMembersCursor(data.members_next_cursor);
     } catch (err) {
       console.error("Failed to load members:", err);
       if (membersEl) {
@@ -160,7 +217,6 @@ if (tripDescInput) tripDescInput.value = group.description || "";
       }
     }
   }
-  await refreshMembers();
 
 
   // Load friends for dropdown.
@@ -181,7 +237,7 @@ if (tripDescInput) tripDescInput.value = group.description || "";
 
 
       try {
-        const body = { name: newName, description: newDesc };
+        const body = { name: newName, description: newDesc, version: groupVersion };
         const res = await fetch(
           `/api/groups/${encodeURIComponent(groupId)}`,
           {
@@ -196,13 +252,19 @@ if (tripDescInput) tripDescInput.value = group.description || "";
         );
 
 
+        if (res.status === 409) {
+          alert("This group was changed by someone else. Reload the page and try again.");
+          return;
+        }
+
         if (!res.ok) {
           alert("Could not save changes.");
           return;
         }
 
 
-        await res.json();
+        const data = await res.json();
+        groupVersion = data?.group?.version ?? groupVersion;
         alert("Group updated.");
       } catch (err) {
         console.error("Error updating group:", err);
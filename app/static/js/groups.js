@@ -85,7 +85,7 @@ function renderGroups(groups) {
     const metaEl = document.createElement("div");
     metaEl.className = "group-meta";
 
-    const memberCount = Array.isArray(g.members) ? g.members.length : 0;
+    const memberCount = Number(g.member_count) || 0;
     const created = g.created_at ? new Date(g.created_at) : null;
     const dateText = created
       ? created.toLocaleDateString(undefined, {
@@ -1,7 +1,14 @@
 // Simple notifications only inbox
 
+const PAGE_SIZE = 50;
+
 // Core elements
 const notificationsList = document.getElementById("notificationsList");
+const loadMoreBtn = document.getElementById("notificationsMoreBtn");
+const markAllReadBtn = document.getElementById("markAllReadBtn");
+
+// Cursor for the next page, from the X-Next-Cursor header
+let nextCursor = null;
 
 // Build one notification line of text based on type
 function buildNotificationText(notif) {
@@ -40,75 +47,136 @@ function buildNotificationText(notif) {
       ? `New expense found for you in '${groupName}'. Check your history.`
       : `New expense found for you. Check your history.`;
   }
+  if (type === "Payment Paid") {
+    return `${fromName} marked your payment as paid`;
+  }
   if (type) {
     return `${type} from ${fromName}`;
   }
   return "Notification";
 }
 
-// Load notifications from backend
-async function loadNotifications() {
+// Build one list item for a notification
+function buildNotificationItem(notif) {
+  const li = document.createElement("li");
+  li.className = "p-3 flex justify-between items-center";
+
+  const left = document.createElement("div");
+  left.className = "flex flex-col";
+
+  const textSpan = document.createElement("span");
+  textSpan.textContent = buildNotificationText(notif);
+  left.appendChild(textSpan);
+
+  let dateLabel = "";
+  if (notif.created_at) {
+    const d = new Date(notif.created_at);
+    if (!Number.isNaN(d.getTime())) {
+      dateLabel = d.toLocaleDateString(undefined, {
+        year: "numeric",
+        month: "short",
+        day: "numeric",
+      });
+    }
+  }
+
+  const right = document.createElement("div");
+  right.className = "text-sm text-gray-400 ml-4 whitespace-nowrap";
+  right.textContent = dateLabel;
+
+  li.appendChild(left);
+  li.appendChild(right);
+  return li;
+}
+
+// Load one page of notifications; reset starts again from the newest
+async function loadNotifications(reset = true) {
   if (!notificationsList) {
     return;
   }
-  notificationsList.innerHTML = "";
+  if (reset) {
+    nextCursor = null;
+  }
+
+  const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+  if (nextCursor) {
+    params.set("cursor", nextCursor);
+  }
 
   try {
-    const res = await fetch("/inbox/notifications");
+    const res = await fetch(`/inbox/notifications?${params}`);
     const data = await res.json();
+    nextCursor = res.headers.get("X-Next-Cursor");
 
-    const badge = document.getElementById("notificationBadge");
-    const count = Array.isArray(data) ? data.length : 0;
-    if (badge) {
-      badge.textContent = String(count);
-      badge.style.display = count > 0 ? "inline-flex" : "none";
+    if (reset) {
+      notificationsList.innerHTML = "";
+    }
+    if (loadMoreBtn) {
+      loadMoreBtn.style.display = nextCursor ? "inline-block" : "none";
     }
 
     if (!Array.isArray(data) || data.length === 0) {
-      notificationsList.innerHTML =
-        "<li class='p-3 text-gray-500'>No notifications</li>";
+      if (reset) {
+        notificationsList.innerHTML =
+          "<li class='p-3 text-gray-500'>No notifications</li>";
+      }
       return;
     }
 
     data.forEach((notif) => {
-      const li = document.createElement("li");
-      li.className = "p-3 flex justify-between items-center";
-
-      const left = document.createElement("div");
-      left.className = "flex flex-col";
-
-      const textSpan = document.createElement("span");
-      textSpan.textContent = buildNotificationText(notif);
-      left.appendChild(textSpan);
-
-      let dateLabel = "";
-      if (notif.created_at) {
-        const d = new Date(notif.created_at);
-        if (!Number.isNaN(d.getTime())) {
-          dateLabel = d.toLocaleDateString(undefined, {
-            year: "numeric",
-            month: "short",
-            day: "numeric",
-          });
-        }
-      }
-
-      const right = document.createElement("div");
-      right.className = "text-sm text-gray-400 ml-4 whitespace-nowrap";
-      right.textContent = dateLabel;
-
-      li.appendChild(left);
-      li.appendChild(right);
-      notificationsList.appendChild(li);
+      notificationsList.appendChild(buildNotificationItem(notif));
     });
   } catch (err) {
     console.error("Error loading notifications", err);
-    notificationsList.innerHTML =
-      "<li class='p-3 text-gray-500'>No notifications</li>";
+    if (reset) {
+      notificationsList.innerHTML =
+        "<li class='p-3 text-gray-500'>No notifications</li>";
+    }
   }
 }
 
+// Mark every unread notification as read in one request
+async function markAllRead() {
+  try {
+    const res = await fetch("/inbox/mark-read", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ all: true }),
+    });
+    if (!res.ok) {
+      throw new Error(`mark-read failed with ${res.status}`);
+    }
+    if (window.refreshUnreadBadge) {
+      window.refreshUnreadBadge();
+    }
+  } catch (err) {
+    console.error("Error marking notifications read", err);
+  }
+}
+
+// Show a pushed notification at the top of the list
+function prependNotification(notif) {
+  if (!notificationsList) {
+    return;
+  }
+  const empty = notificationsList.querySelector("li.text-gray-500");
+  if (empty && !notificationsList.querySelector("li.flex")) {
+    notificationsList.innerHTML = "";
+  }
+  notificationsList.prepend(buildNotificationItem(notif));
+}
+
 // Init
 document.addEventListener("DOMContentLoaded", () => {
   loadNotifications();
+  if (loadMoreBtn) {
+    loadMoreBtn.addEventListener("click", () => loadNotifications(false));
+  }
+  if (markAllReadBtn) {
+    markAllReadBtn.addEventListener("click", markAllRead);
+  }
 });
+
+// Live updates from live_events.js replace polling
+window.addEventListener("live:notification", (evt) => prependNotification(evt.detail || {}));
+window.addEventListener("live:resync", () => loadNotifications());
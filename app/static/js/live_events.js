@@ -0,0 +1,56 @@
+// Live updates pushed by the server over Server-Sent Events.
+// Opens one /inbox/stream connection per page and re-dispatches each
+// event on window as "live:notification", "live:balance" or
+// "live:resync", so pages refresh only when something changed.
+
+(function () {
+  // Set the sidebar badge from the server side unread counter.
+  async function refreshUnreadBadge() {
+    const badge = document.getElementById("notificationBadge");
+    if (!badge) return;
+    try {
+      const res = await fetch("/inbox/unread-count");
+      if (!res.ok) return;
+      const data = await res.json();
+      const count = Number(data.unread) || 0;
+      badge.textContent = String(count);
+      badge.style.display = count > 0 ? "inline-flex" : "none";
+    } catch (err) {
+      console.error("Error loading unread count", err);
+    }
+  }
+
+  window.refreshUnreadBadge = refreshUnreadBadge;
+  refreshUnreadBadge();
+
+  if (!window.EventSource) {
+    return;
+  }
+
+  const source = new EventSource("/inbox/stream");
+
+  ["notification", "balance", "resync"].forEach((type) => {
+    source.addEventListener(type, (evt) => {
+      let detail = {};
+      try {
+        detail = JSON.parse(evt.data || "{}");
+      } catch {
+        // ignore malformed payloads
+      }
+      window.dispatchEvent(new CustomEvent(`live:${type}`, { detail }));
+    });
+  });
+
+  // Bump the sidebar badge for every new notification.
+  window.addEventListener("live:notification", () => {
+    const badge = document.getElementById("notificationBadge");
+    if (!badge) return;
+    const count = (parseInt(badge.textContent, 10) || 0) + 1;
+    badge.textContent = String(count);
+    badge.style.display = "inline-flex";
+  });
+
+  window.addEventListener("live:resync", () => refreshUnreadBadge());
+
+  window.addEventListener("beforeunload", () => source.close());
+})();
@@ -5,9 +5,15 @@ const pastList = document.getElementById("past-list");
 const requestedEmpty = document.getElementById("requested-empty");
 const pastEmpty = document.getElementById("past-empty");
 const searchEl = document.getElementById("search");
+const payAllBtn = document.getElementById("pay-all");
+const requestedMoreBtn = document.getElementById("requested-more");
+const pastMoreBtn = document.getElementById("past-more");
 
 let outstandingPayments = [];
 let pastPayments = [];
+// Keyset cursors from the X-Next-Cursor header (null when on the last page)
+let outstandingCursor = null;
+let pastCursor = null;
 
 function formatMoney(n) {
   return `$${Number(n || 0).toFixed(2)}`;
@@ -32,12 +38,39 @@ async function loadPayments() {
 
     outstandingPayments = await outResp.json();
     pastPayments = await pastResp.json();
+    outstandingCursor = outResp.headers.get("X-Next-Cursor");
+    pastCursor = pastResp.headers.get("X-Next-Cursor");
     render();
   } catch (err) {
     console.error("Error loading payments", err);
   }
 }
 
+async function loadMore(kind) {
+  const cursor = kind === "past" ? pastCursor : outstandingCursor;
+  if (!cursor) return;
+
+  try {
+    const resp = await fetch(`/api/payments/${kind}?cursor=${encodeURIComponent(cursor)}`);
+    if (!resp.ok) {
+      console.error("Failed to load more payments", resp.status);
+      return;
+    }
+    const page = await resp.json();
+    const next = resp.headers.get("X-Next-Cursor");
+    if (kind === "past") {
+      pastPayments = pastPayments.concat(page);
+      pastCursor = next;
+    } else {
+      outstandingPayments = outstandingPayments.concat(page);
+      outstandingCursor = next;
+    }
+    render();
+  } catch (err) {
+    console.error("Error loading more payments", err);
+  }
+}
+
 function render() {
   const q = (searchEl.value || "").toLowerCase();
 
@@ -52,6 +85,10 @@ function render() {
   requestedList.innerHTML = "";
   pastList.innerHTML = "";
 
+  payAllBtn.style.display = requested.length > 1 ? "inline-block" : "none";
+  requestedMoreBtn.style.display = outstandingCursor ? "inline-block" : "none";
+  pastMoreBtn.style.display = pastCursor ? "inline-block" : "none";
+
   if (requested.length === 0) {
     requestedEmpty.style.display = "block";
   } else {
@@ -176,7 +213,42 @@ async function markPaid(paymentId, method = "Cash") {
   }
 }
 
+async function payAllShown() {
+  const q = (searchEl.value || "").toLowerCase();
+  const ids = outstandingPayments
+    .filter(p => `${p.expense_name || ""}`.toLowerCase().includes(q))
+    .map(p => p.id);
+  if (ids.length === 0) return;
+
+  try {
+    const resp = await fetch("/api/payments/settle", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ payment_ids: ids, paid_via: "Paid in Cash" }),
+    });
+    if (!resp.ok) {
+      alert("Failed to settle payments");
+      return;
+    }
+    const data = await resp.json();
+    if (data.paid_count < ids.length) {
+      alert(`Settled ${data.paid_count} of ${ids.length} payments.`);
+    }
+    await loadPayments();
+  } catch (err) {
+    console.error("Error settling payments", err);
+    alert("Failed to settle payments");
+  }
+}
+
 searchEl.addEventListener("input", render);
+payAllBtn.addEventListener("click", payAllShown);
+requestedMoreBtn.addEventListener("click", () => loadMore("outstanding"));
+pastMoreBtn.addEventListener("click", () => loadMore("past"));
+
+// Reload when the server says balances changed
+window.addEventListener("live:balance", loadPayments);
+window.addEventListener("live:resync", loadPayments);
 
 (async () => {
   await loadPayments();
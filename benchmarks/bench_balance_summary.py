@@ -0,0 +1,85 @@
+# FILE: benchmarks/bench_balance_summary.py
+# Balance summary over 100k payments: row download + Python sums (old path)
+# vs the payment_balance_summary aggregate (new path), using the in memory
+# fake client. Payload size stands in for what would cross the network.
+#
+# Run from the project root:
+#   TESTING=1 python -m benchmarks.bench_balance_summary
+
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("TESTING", "1")
+
+from app.core.supabase_client import supabase  # noqa: E402
+from app.routers.payments import fetch_balance_summary  # noqa: E402
+
+N_PAYMENTS = int(os.getenv("BENCH_PAYMENTS", "100000"))
+USER = "bench-user"
+
+
+def _seed() -> None:
+    rng = random.Random(42)
+    friends = [f"friend-{i}" for i in range(200)]
+    rows = []
+    for i in range(N_PAYMENTS):
+        friend = rng.choice(friends)
+        mine_owes = rng.random() < 0.5
+        rows.append({
+            "id": str(i),
+            "group_id": f"group-{rng.randrange(20)}",
+            "from_user_id": friend if mine_owes else USER,
+            "to_user_id": USER if mine_owes else friend,
+            "amount": round(rng.uniform(1, 100), 2),
+            "status": "requested" if rng.random() < 0.7 else "paid",
+        })
+    supabase._db["payment_records"] = rows
+
+
+def _old_summary() -> tuple:
+    owed_by = (
+        supabase.table("payments").select("amount")
+        .eq("to_user_id", USER).eq("status", "requested").execute().data
+    )
+    owed_to = (
+        supabase.table("payments").select("amount")
+        .eq("from_user_id", USER).eq("status", "requested").execute().data
+    )
+    payload = len(json.dumps(owed_by)) + len(json.dumps(owed_to))
+    totals = (sum(r["amount"] for r in owed_by), sum(r["amount"] for r in owed_to))
+    return totals, len(owed_by) + len(owed_to), payload
+
+
+def _new_summary(breakdown: bool) -> tuple:
+    data = fetch_balance_summary(USER, breakdown)
+    totals = (data["amount_owed_by_user"], data["amount_owed_to_user"])
+    return totals, 1, len(json.dumps(data))
+
+
+def _time(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    _seed()
+
+    (old_totals, old_rows, old_bytes), old_ms = _time(_old_summary)
+    (new_totals, new_rows, new_bytes), new_ms = _time(_new_summary, False)
+    (_, _, bd_bytes), bd_ms = _time(_new_summary, True)
+
+    assert abs(old_totals[0] - new_totals[0]) < 1e-6
+    assert abs(old_totals[1] - new_totals[1]) < 1e-6
+
+    print(f"payments in table:            {N_PAYMENTS}")
+    print(f"old: 2 queries, {old_rows} rows, {old_bytes} bytes, {old_ms:.1f} ms")
+    print(f"new: 1 rpc,     {new_rows} row, {new_bytes} bytes, {new_ms:.1f} ms")
+    print(f"new + breakdown:              {bd_bytes} bytes, {bd_ms:.1f} ms")
+    print("(timings are the in memory fake; the payload is what crosses the wire)")
+
+
+if __name__ == "__main__":
+    main()
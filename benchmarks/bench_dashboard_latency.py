@@ -0,0 +1,76 @@
+# FILE: benchmarks/bench_dashboard_latency.py
+# Compare serial vs concurrent dashboard assembly with injected query latency.
+#
+# Run from the project root:
+#   TESTING=1 python -m benchmarks.bench_dashboard_latency
+
+import asyncio
+import os
+import time
+
+os.environ.setdefault("TESTING", "1")
+
+from app.routers import dashboard  # noqa: E402
+
+LATENCY = float(os.getenv("BENCH_LATENCY", "0.05"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "5"))
+
+
+class _SlowResult:
+    def __init__(self, data):
+        self.data = data
+
+
+class _SlowQuery:
+    """Accepts any chained query builder call and sleeps on execute."""
+
+    def __getattr__(self, _name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        time.sleep(LATENCY)
+        return _SlowResult([])
+
+
+class _SlowClient:
+    def table(self, _name):
+        return _SlowQuery()
+
+    def rpc(self, _name, _params):
+        return _SlowQuery()
+
+
+def _serial(user_id: str) -> None:
+    dashboard._resolve_first_name(user_id, {}, "")
+    dashboard._fetch_groups(user_id)
+    totals = dashboard._fetch_balance_totals(user_id)
+    paid = dashboard._fetch_recent_history(user_id, "paid", dashboard.RECENT_LIMIT)
+    received = dashboard._fetch_recent_history(user_id, "received", dashboard.RECENT_LIMIT)
+    recent = dashboard._merge_recent(paid, received, dashboard.RECENT_LIMIT)
+    dashboard._build_wallet_and_recent(totals, recent)
+
+
+def main() -> None:
+    dashboard.supabase = _SlowClient()
+    dashboard.settings.DASHBOARD_CACHE_ENABLED = False
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        _serial("bench-user")
+    serial = (time.perf_counter() - start) / ROUNDS
+
+    async def run_concurrent():
+        for _ in range(ROUNDS):
+            await dashboard._assemble_dashboard("bench-user", {}, "")
+
+    start = time.perf_counter()
+    asyncio.run(run_concurrent())
+    concurrent = (time.perf_counter() - start) / ROUNDS
+
+    print(f"injected latency per query: {LATENCY * 1000:.0f} ms")
+    print(f"serial dashboard:           {serial * 1000:.1f} ms")
+    print(f"concurrent dashboard:       {concurrent * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# FILE: benchmarks/bench_json_serialization.py
+# Serialising a 10k row payments list: the default FastAPI path (build
+# Payment models, jsonable_encoder, json.dumps) vs the fast path used by
+# the list endpoints (plain dicts rendered by FastJSONResponse).
+#
+# Run from the project root:
+#   TESTING=1 python -m benchmarks.bench_json_serialization
+
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("TESTING", "1")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from app.core import responses  # noqa: E402
+from app.core.responses import FastJSONResponse  # noqa: E402
+from app.routers.payments import Payment, _payment_dict  # noqa: E402
+
+N_ROWS = int(os.getenv("BENCH_ROWS", "10000"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "5"))
+
+
+def _rows() -> list:
+    rng = random.Random(42)
+    rows = []
+    for i in range(N_ROWS):
+        paid = rng.random() < 0.4
+        rows.append({
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "group_id": f"group-{rng.randrange(20)}",
+            "expense_id": f"expense-{rng.randrange(2000)}",
+            "from_user_id": f"user-{rng.randrange(200)}",
+            "to_user_id": f"user-{rng.randrange(200)}",
+            "amount": round(rng.uniform(1, 100), 2),
+            "status": "paid" if paid else "requested",
+            "created_at": "2026-10-19T12:00:00+00:00",
+            "paid_at": "2026-10-19T13:00:00+00:00" if paid else None,
+            "paid_via": "venmo" if paid else None,
+            "expense_name": f"Dinner #{i}",
+        })
+    return rows
+
+
+def _pydantic_path(rows: list) -> bytes:
+    models = [Payment(**_payment_dict(row)) for row in rows]
+    return json.dumps(jsonable_encoder(models)).encode("utf-8")
+
+
+def _fast_path(rows: list) -> bytes:
+    return FastJSONResponse([_payment_dict(row) for row in rows]).body
+
+
+def _best_ms(fn, rows) -> tuple:
+    best = float("inf")
+    body = b""
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        body = fn(rows)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return body, best
+
+
+def main() -> None:
+    rows = _rows()
+
+    old_body, old_ms = _best_ms(_pydantic_path, rows)
+    new_body, new_ms = _best_ms(_fast_path, rows)
+
+    assert json.loads(old_body) == json.loads(new_body)
+
+    renderer = "orjson" if responses.orjson is not None else "stdlib json"
+    print(f"rows serialised:           {N_ROWS} (best of {ROUNDS})")
+    print(f"pydantic + jsonable_encoder: {old_ms:.1f} ms, {len(old_body)} bytes")
+    print(f"dicts + FastJSONResponse:    {new_ms:.1f} ms, {len(new_body)} bytes ({renderer})")
+
+
+if __name__ == "__main__":
+    main()
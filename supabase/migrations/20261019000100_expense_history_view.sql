@@ -0,0 +1,56 @@
+-- Per-viewer expense history used by /api/history and the dashboard.
+-- One row per (viewer, expense) from that viewer's perspective:
+--   kind = 'paid'      expenses the viewer created, amount = sum of all shares (>= 0)
+--   kind = 'received'  expenses the viewer was added to, amount = -their share (<= 0)
+-- Group and creator names are joined in so the API needs a single call.
+
+create or replace view public.expense_history
+with (security_invoker = true) as
+select
+    e.user_id                    as viewer_id,
+    'paid'::text                 as kind,
+    e.id                         as expense_id,
+    e.user_id                    as creator_id,
+    e.group_id,
+    e.description,
+    e.expense_date,
+    e.created_at,
+    coalesce(s.total_share, 0)   as amount,
+    g.name                       as group_name,
+    u.name                       as creator_name
+from public.expenses e
+left join lateral (
+    select sum(p.share) as total_share
+    from public.expense_participants p
+    where p.expense_id = e.id
+) s on true
+left join public.groups g on g.id = e.group_id
+left join public.users u on u.id = e.user_id
+
+union all
+
+select
+    p.member_id                  as viewer_id,
+    'received'::text             as kind,
+    e.id                         as expense_id,
+    e.user_id                    as creator_id,
+    e.group_id,
+    e.description,
+    e.expense_date,
+    e.created_at,
+    -sum(p.share)                as amount,
+    g.name                       as group_name,
+    u.name                       as creator_name
+from public.expense_participants p
+join public.expenses e on e.id = p.expense_id
+left join public.groups g on g.id = e.group_id
+left join public.users u on u.id = e.user_id
+where p.member_id <> e.user_id
+group by p.member_id, e.id, g.name, u.name;
+
+create index if not exists expenses_user_id_idx
+    on public.expenses (user_id);
+create index if not exists expense_participants_member_id_idx
+    on public.expense_participants (member_id);
+create index if not exists expense_participants_expense_id_idx
+    on public.expense_participants (expense_id);
@@ -0,0 +1,5 @@
+-- Lets the dashboard ask expense_history for the newest N rows per side
+-- (order by expense_date desc limit N) without sorting a user's full history.
+
+create index if not exists expenses_user_id_expense_date_idx
+    on public.expenses (user_id, expense_date desc, created_at desc);
@@ -0,0 +1,9 @@
+-- Keyset pagination for /api/payments lists: newest first on (created_at, id)
+-- for both sides of a payment, filtered by status.
+
+create index if not exists payments_to_user_status_created_idx
+    on public.payments (to_user_id, status, created_at desc, id desc);
+create index if not exists payments_from_user_status_created_idx
+    on public.payments (from_user_id, status, created_at desc, id desc);
+create index if not exists payments_group_id_idx
+    on public.payments (group_id);
@@ -0,0 +1,51 @@
+-- Outstanding balance totals for one user in a single aggregate query.
+-- Returns a small JSON object instead of every requested payment row:
+--   amount_owed_by_user  requested payments where to_user_id = user
+--   amount_owed_to_user  requested payments where from_user_id = user
+--   by_counterparty / by_group  (only when p_breakdown is true)
+
+create or replace function public.payment_balance_summary(
+    p_user_id public.payments.to_user_id%type,
+    p_breakdown boolean default false
+)
+returns jsonb
+language sql
+stable
+as $$
+    with mine as (
+        select
+            case when to_user_id = p_user_id then 'owed_by_user' else 'owed_to_user' end as side,
+            case when to_user_id = p_user_id then from_user_id else to_user_id end as counterparty_id,
+            group_id,
+            amount
+        from public.payments
+        where status = 'requested'
+          and (to_user_id = p_user_id or from_user_id = p_user_id)
+    )
+    select jsonb_build_object(
+        'amount_owed_by_user',
+            (select coalesce(sum(amount), 0) from mine where side = 'owed_by_user'),
+        'amount_owed_to_user',
+            (select coalesce(sum(amount), 0) from mine where side = 'owed_to_user'),
+        'by_counterparty', case when p_breakdown then (
+            select coalesce(jsonb_agg(c), '[]'::jsonb)
+            from (
+                select counterparty_id,
+                       coalesce(sum(amount) filter (where side = 'owed_by_user'), 0) as owed_by_user,
+                       coalesce(sum(amount) filter (where side = 'owed_to_user'), 0) as owed_to_user
+                from mine
+                group by counterparty_id
+            ) c
+        ) end,
+        'by_group', case when p_breakdown then (
+            select coalesce(jsonb_agg(g), '[]'::jsonb)
+            from (
+                select group_id,
+                       coalesce(sum(amount) filter (where side = 'owed_by_user'), 0) as owed_by_user,
+                       coalesce(sum(amount) filter (where side = 'owed_to_user'), 0) as owed_to_user
+                from mine
+                group by group_id
+            ) g
+        ) end
+    );
+$$;
@@ -0,0 +1,155 @@
+-- Compact obligation storage.
+--
+-- Before: create_expense wrote one payments row per non-payer participant,
+-- duplicating expense_participants (a 200 person expense wrote 199 rows).
+-- After: an expense obligation is its expense_participants row plus three
+-- settlement columns, and public.payments becomes a view that derives those
+-- obligations lazily. Standalone payments (anything not tied to a single
+-- participant share, e.g. net settlements) live in public.payment_records.
+--
+-- The view keeps the old column set, so reads, the pay / settle updates and
+-- payment_balance_summary keep working against public.payments unchanged.
+
+-- 1. Settlement state per participant -----------------------------------
+
+alter table public.expense_participants
+    add column if not exists payment_id uuid not null default gen_random_uuid(),
+    add column if not exists status text not null default 'requested',
+    add column if not exists paid_at timestamptz,
+    add column if not exists paid_via text;
+
+create unique index if not exists expense_participants_payment_id_key
+    on public.expense_participants (payment_id);
+create index if not exists expense_participants_member_status_idx
+    on public.expense_participants (member_id, status);
+
+-- 2. Keep standalone rows in payment_records -----------------------------
+
+alter table public.payments rename to payment_records;
+
+-- 3. Migrate existing per participant rows ------------------------------
+-- A payments row that matches exactly one participant share (same expense,
+-- payer is the expense creator, debtor is the participant) moves onto that
+-- participant: its id, status and paid_* columns are kept so existing links
+-- and history stay valid. Everything else stays in payment_records.
+
+with matched as (
+    select distinct on (ep.expense_id, ep.member_id)
+        pr.id, ep.expense_id, ep.member_id, pr.status, pr.paid_at, pr.paid_via
+    from public.payment_records pr
+    join public.expenses e on e.id = pr.expense_id
+    join public.expense_participants ep
+      on ep.expense_id = pr.expense_id
+     and ep.member_id = pr.to_user_id
+    where pr.from_user_id = e.user_id
+    order by ep.expense_id, ep.member_id, pr.created_at
+)
+update public.expense_participants ep
+set payment_id = m.id,
+    status = m.status,
+    paid_at = m.paid_at,
+    paid_via = m.paid_via
+from matched m
+where ep.expense_id = m.expense_id
+  and ep.member_id = m.member_id;
+
+delete from public.payment_records pr
+using public.expense_participants ep
+where ep.payment_id = pr.id;
+
+-- 4. The payments view ----------------------------------------------------
+
+create or replace view public.payments
+with (security_invoker = true) as
+select
+    pr.id,
+    pr.group_id,
+    pr.expense_id,
+    pr.from_user_id,
+    pr.to_user_id,
+    pr.amount,
+    pr.status,
+    pr.created_at,
+    pr.paid_at,
+    pr.paid_via
+from public.payment_records pr
+
+union all
+
+select
+    ep.payment_id                as id,
+    e.group_id,
+    e.id                         as expense_id,
+    e.user_id                    as from_user_id,   -- payer, who is owed
+    ep.member_id                 as to_user_id,     -- participant, who owes
+    ep.share                     as amount,
+    ep.status,
+    e.created_at,
+    ep.paid_at,
+    ep.paid_via
+from public.expense_participants ep
+join public.expenses e on e.id = ep.expense_id
+where ep.member_id <> e.user_id
+  and ep.share > 0;
+
+-- 5. Writes through the view ---------------------------------------------
+-- Inserts become standalone payment_records. Updates go to whichever side
+-- owns the row; only settlement columns change on participant obligations.
+-- The status guard keeps compare-and-set updates (status = 'requested')
+-- safe: a row that changed underneath is skipped, not overwritten.
+
+create or replace function public.payments_view_write()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op = 'INSERT' then
+        insert into public.payment_records
+            (id, group_id, expense_id, from_user_id, to_user_id,
+             amount, status, created_at, paid_at, paid_via)
+        values
+            (coalesce(new.id, gen_random_uuid()), new.group_id, new.expense_id,
+             new.from_user_id, new.to_user_id, new.amount,
+             coalesce(new.status, 'requested'), coalesce(new.created_at, now()),
+             new.paid_at, new.paid_via)
+        returning id, status, created_at into new.id, new.status, new.created_at;
+        return new;
+    end if;
+
+    if tg_op = 'UPDATE' then
+        update public.payment_records
+        set amount = new.amount,
+            status = new.status,
+            paid_at = new.paid_at,
+            paid_via = new.paid_via
+        where id = old.id
+          and status = old.status;
+        if found then
+            return new;
+        end if;
+
+        update public.expense_participants
+        set status = new.status,
+            paid_at = new.paid_at,
+            paid_via = new.paid_via
+        where payment_id = old.id
+          and status = old.status;
+        if found then
+            return new;
+        end if;
+        return null;
+    end if;
+
+    -- DELETE: obligations derived from a share go away with their expense
+    delete from public.payment_records where id = old.id;
+    if found then
+        return old;
+    end if;
+    raise exception 'payment % belongs to an expense share; delete the expense instead', old.id;
+end;
+$$;
+
+drop trigger if exists payments_view_write on public.payments;
+create trigger payments_view_write
+    instead of insert or update or delete on public.payments
+    for each row execute function public.payments_view_write();
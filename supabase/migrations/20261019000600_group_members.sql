@@ -0,0 +1,69 @@
+-- Group membership as rows instead of the groups.members array.
+--
+-- Membership lookups were `members @> array[uid]` scans over every group,
+-- and every join or leave rewrote the whole array. group_members has one
+-- row per (group, user) with indexes for both directions:
+--   primary key (group_id, user_id)   members of a group
+--   group_members_user_id_idx         groups of a user
+
+create table if not exists public.group_members (
+    group_id  uuid        not null references public.groups (id) on delete cascade,
+    user_id   uuid        not null,
+    role      text        not null default 'member' check (role in ('owner', 'member')),
+    joined_at timestamptz not null default now(),
+    primary key (group_id, user_id)
+);
+
+create index if not exists group_members_user_id_idx
+    on public.group_members (user_id, group_id);
+
+-- Backfill from the array; the owner keeps the owner role
+insert into public.group_members (group_id, user_id, role, joined_at)
+select
+    g.id,
+    m.user_id::uuid,
+    case when m.user_id::uuid = g.owner_id then 'owner' else 'member' end,
+    coalesce(g.created_at, now())
+from public.groups g
+cross join lateral unnest(g.members) as m(user_id)
+where m.user_id is not null
+on conflict (group_id, user_id) do nothing;
+
+insert into public.group_members (group_id, user_id, role, joined_at)
+select g.id, g.owner_id, 'owner', coalesce(g.created_at, now())
+from public.groups g
+where g.owner_id is not null
+on conflict (group_id, user_id) do update set role = 'owner';
+
+-- Every group of a user, with its member count, in one indexed query
+create or replace view public.user_groups
+with (security_invoker = true) as
+select
+    gm.user_id                   as member_id,
+    gm.role,
+    gm.joined_at,
+    g.id,
+    g.name,
+    g.description,
+    g.owner_id,
+    g.created_at,
+    (select count(*) from public.group_members c where c.group_id = g.id) as member_count
+from public.group_members gm
+join public.groups g on g.id = gm.group_id;
+
+-- Members of a group with their profile, without an in_() list of ids
+create or replace view public.group_member_profiles
+with (security_invoker = true) as
+select
+    gm.group_id,
+    gm.user_id,
+    gm.role,
+    gm.joined_at,
+    u.name,
+    u.username,
+    u.email
+from public.group_members gm
+join public.users u on u.id = gm.user_id;
+
+-- The array is no longer read or written
+alter table public.groups drop column if exists members;
@@ -0,0 +1,11 @@
+-- Optimistic concurrency for group edits.
+--
+-- groups.version increases on every edit to the group row: PATCH
+-- /api/groups/{id} writes with a compare-and-set (update ... where id = ?
+-- and version = ?) and returns 409 when it matches nothing. Joins and
+-- leaves are single row writes to group_members, so concurrent membership
+-- changes never overwrite each other and never touch the version; a rename
+-- based on a page loaded before someone joined still succeeds.
+
+alter table public.groups
+    add column if not exists version bigint not null default 0;
@@ -0,0 +1,36 @@
+-- Backing queries for GET /api/groups/{id}/overview.
+--
+-- group_member_balances returns each member's outstanding totals inside one
+-- group as a small JSON array instead of every requested payment row:
+--   owed_by_user  requested payments in the group where to_user_id = member
+--   owed_to_user  requested payments in the group where from_user_id = member
+
+create or replace function public.group_member_balances(p_group_id uuid)
+returns jsonb
+language sql
+stable
+as $$
+    with sides as (
+        select to_user_id as user_id, amount as owed_by_user, 0::numeric as owed_to_user
+        from public.payments
+        where group_id = p_group_id and status = 'requested'
+        union all
+        select from_user_id, 0, amount
+        from public.payments
+        where group_id = p_group_id and status = 'requested'
+    )
+    select coalesce(jsonb_agg(b), '[]'::jsonb)
+    from (
+        select user_id,
+               sum(owed_by_user) as owed_by_user,
+               sum(owed_to_user) as owed_to_user
+        from sides
+        group by user_id
+    ) b;
+$$;
+
+-- Latest expenses of a group, and the group side of the payments view
+create index if not exists expenses_group_recent_idx
+    on public.expenses (group_id, expense_date desc, created_at desc);
+create index if not exists payment_records_group_status_idx
+    on public.payment_records (group_id, status);
@@ -0,0 +1,39 @@
+-- Stable sort / search key for paginated member listing.
+-- sort_name is never null, so keyset cursors on (sort_name, user_id) and
+-- prefix search (sort_name like 'abc%') behave the same for every member.
+
+create or replace view public.group_member_profiles
+with (security_invoker = true) as
+select
+    gm.group_id,
+    gm.user_id,
+    gm.role,
+    gm.joined_at,
+    u.name,
+    u.username,
+    u.email,
+    lower(coalesce(nullif(u.name, ''), u.username, ''))  as sort_name
+from public.group_members gm
+join public.users u on u.id = gm.user_id;
+
+-- Keyset order for ?sort=joined
+create index if not exists group_members_group_joined_idx
+    on public.group_members (group_id, joined_at, user_id);
+
+-- The overview reads the group through the caller's user_groups row,
+-- which doubles as the membership check; expose the version there too.
+create or replace view public.user_groups
+with (security_invoker = true) as
+select
+    gm.user_id                   as member_id,
+    gm.role,
+    gm.joined_at,
+    g.id,
+    g.name,
+    g.description,
+    g.owner_id,
+    g.created_at,
+    (select count(*) from public.group_members c where c.group_id = g.id) as member_count,
+    g.version
+from public.group_members gm
+join public.groups g on g.id = gm.group_id;
@@ -0,0 +1,35 @@
+-- Background cascade for DELETE /api/groups/{id}.
+--
+-- Deleting a group removes its memberships right away (the group vanishes
+-- from every member's list) and records a job. A background task then
+-- deletes expenses with their participant shares, standalone payment
+-- records and notifications in fixed size batches, updating the job row
+-- after each batch, and removes the groups row last. The job keeps the
+-- removed member ids so a cascade resumed by a later request can still
+-- invalidate their dashboards when it finishes.
+
+create table if not exists public.group_deletion_jobs (
+    id                    uuid        primary key default gen_random_uuid(),
+    group_id              uuid        not null,
+    requested_by          uuid        not null,
+    status                text        not null default 'pending'
+                          check (status in ('pending', 'running', 'done', 'failed')),
+    deleted_expenses      integer     not null default 0,
+    deleted_participants  integer     not null default 0,
+    deleted_payments      integer     not null default 0,
+    deleted_notifications integer     not null default 0,
+    member_ids            uuid[]      not null default '{}',
+    error                 text,
+    created_at            timestamptz not null default now(),
+    updated_at            timestamptz not null default now(),
+    finished_at           timestamptz
+);
+
+create index if not exists group_deletion_jobs_group_idx
+    on public.group_deletion_jobs (group_id, created_at desc);
+
+-- Batch lookups by group for the cascade
+create index if not exists payment_records_expense_id_idx
+    on public.payment_records (expense_id);
+create index if not exists notifications_group_id_idx
+    on public.notifications (group_id);
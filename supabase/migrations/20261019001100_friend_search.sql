@@ -0,0 +1,40 @@
+-- Friend search in the database for GET /api/friends.
+--
+-- friend_profiles joins each friend link to the friend's profile so the
+-- q (name / username / email substring) and group (note substring)
+-- filters, the ordering and the limit all run in one query instead of
+-- loading every link and profile into the API. sort_name plus the link
+-- id is the keyset used by the cursor.
+--
+-- Substring matches use ilike '%q%', which pg_trgm GIN indexes serve
+-- for any search of three or more characters.
+
+create extension if not exists pg_trgm;
+
+create or replace view public.friend_profiles
+with (security_invoker = true) as
+select
+    fl.id,
+    fl.owner_id,
+    fl.friend_id,
+    fl.note,
+    fl.created_at,
+    u.name,
+    u.username,
+    u.email,
+    lower(coalesce(nullif(u.name, ''), u.username, ''))  as sort_name
+from public.friend_links fl
+join public.users u on u.id = fl.friend_id;
+
+-- Links of one owner, read in a single index range
+create index if not exists friend_links_owner_friend_idx
+    on public.friend_links (owner_id, friend_id);
+
+create index if not exists users_name_trgm_idx
+    on public.users using gin (name gin_trgm_ops);
+create index if not exists users_username_trgm_idx
+    on public.users using gin (username gin_trgm_ops);
+create index if not exists users_email_trgm_idx
+    on public.users using gin (email gin_trgm_ops);
+create index if not exists friend_links_note_trgm_idx
+    on public.friend_links using gin (note gin_trgm_ops);
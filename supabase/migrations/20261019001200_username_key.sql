@@ -0,0 +1,17 @@
+-- Case insensitive username lookups with a plain equality / in() filter.
+--
+-- Usernames are unique ignoring case (signup checks with ilike), so
+-- username_key = lower(username) lets POST /api/friends/bulk resolve a
+-- whole list of usernames with one username_key=in.(...) query on a
+-- btree index instead of one ilike query per name.
+
+alter table public.users
+    add column if not exists username_key text
+    generated always as (lower(username)) stored;
+
+create index if not exists users_username_key_idx
+    on public.users (username_key);
+
+-- Duplicate checks for a batch of friends of one owner
+-- (friend_links_owner_friend_idx from 20261019001100 covers
+-- owner_id = ? and friend_id in (...)).
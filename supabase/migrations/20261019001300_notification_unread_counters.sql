@@ -0,0 +1,55 @@
+-- Inbox pagination and unread counts.
+--
+-- GET /inbox/notifications reads one page at a time, newest first, keyed
+-- on (created_at, id) for the recipient. GET /inbox/unread-count reads a
+-- single notification_counters row instead of counting notifications;
+-- triggers keep the counter in step with every insert, status change
+-- and delete. A notification is unread until its status is 'read'.
+
+create index if not exists notifications_to_user_recent_idx
+    on public.notifications (to_user, created_at desc, id desc);
+
+-- Bulk mark-as-read touches only the user's unread rows
+create index if not exists notifications_to_user_unread_idx
+    on public.notifications (to_user)
+    where status is distinct from 'read';
+
+create table if not exists public.notification_counters (
+    user_id uuid    primary key,
+    unread  integer not null default 0 check (unread >= 0)
+);
+
+insert into public.notification_counters (user_id, unread)
+select to_user, count(*)
+from public.notifications
+where to_user is not null and status is distinct from 'read'
+group by to_user
+on conflict (user_id) do update set unread = excluded.unread;
+
+create or replace function public.notifications_count_unread()
+returns trigger
+language plpgsql
+as $$
+declare
+    old_unread boolean := tg_op <> 'INSERT' and old.status is distinct from 'read';
+    new_unread boolean := tg_op <> 'DELETE' and new.status is distinct from 'read';
+begin
+    if old_unread and (not new_unread or new.to_user is distinct from old.to_user) then
+        update public.notification_counters
+        set unread = greatest(unread - 1, 0)
+        where user_id = old.to_user;
+    end if;
+    if new_unread and (not old_unread or new.to_user is distinct from old.to_user) then
+        insert into public.notification_counters (user_id, unread)
+        values (new.to_user, 1)
+        on conflict (user_id) do update
+            set unread = public.notification_counters.unread + 1;
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists notifications_count_unread on public.notifications;
+create trigger notifications_count_unread
+    after insert or update of status, to_user or delete on public.notifications
+    for each row execute function public.notifications_count_unread();
@@ -0,0 +1,27 @@
+-- Store display names on notifications.
+--
+-- The inbox used to look up the sender's username and the group's name
+-- for every page it served. The writer now copies both onto the row when
+-- the notification is created, so reading the inbox is a single query on
+-- notifications_to_user_recent_idx. Renames are rare: the account and
+-- group routes rewrite the stored names when one happens.
+
+alter table public.notifications
+    add column if not exists from_username text,
+    add column if not exists group_name    text;
+
+update public.notifications n
+   set from_username = u.username
+  from public.users u
+ where u.id = n.from_user
+   and n.from_username is null;
+
+update public.notifications n
+   set group_name = g.name
+  from public.groups g
+ where g.id = n.group_id
+   and n.group_name is null;
+
+-- Rename refresh by sender (group_id is already indexed)
+create index if not exists notifications_from_user_idx
+    on public.notifications (from_user);
@@ -0,0 +1,105 @@
+-- Index the derived half of the payments view.
+--
+-- The expense share half of public.payments took from_user_id and
+-- created_at from expenses and filtered on expense_participants, so no
+-- single index matched the (user, status, created_at desc, id desc)
+-- keyset order of /api/payments or the per user filter of
+-- payment_balance_summary: every derived obligation of the user was
+-- joined and sorted before a page could be cut.
+--
+-- The payer and the expense's created_at are copied onto each share
+-- (both are fixed once the expense exists; a trigger keeps them in step
+-- if they ever change) and the view reads them from there. Partial
+-- indexes on the view's own predicate then serve both sides in keyset
+-- order, like payments_*_status_created_idx do for payment_records.
+
+alter table public.expense_participants
+    add column if not exists payer_id   uuid,
+    add column if not exists created_at timestamptz;
+
+update public.expense_participants ep
+   set payer_id = e.user_id,
+       created_at = e.created_at
+  from public.expenses e
+ where e.id = ep.expense_id
+   and (ep.payer_id is distinct from e.user_id or ep.created_at is distinct from e.created_at);
+
+create or replace function public.expense_participants_copy_expense()
+returns trigger
+language plpgsql
+as $$
+begin
+    select e.user_id, e.created_at
+      into new.payer_id, new.created_at
+      from public.expenses e
+     where e.id = new.expense_id;
+    return new;
+end;
+$$;
+
+drop trigger if exists expense_participants_copy_expense on public.expense_participants;
+create trigger expense_participants_copy_expense
+    before insert or update of expense_id on public.expense_participants
+    for each row execute function public.expense_participants_copy_expense();
+
+create or replace function public.expenses_sync_participants()
+returns trigger
+language plpgsql
+as $$
+begin
+    update public.expense_participants
+       set payer_id = new.user_id,
+           created_at = new.created_at
+     where expense_id = new.id;
+    return null;
+end;
+$$;
+
+drop trigger if exists expenses_sync_participants on public.expenses;
+create trigger expenses_sync_participants
+    after update of user_id, created_at on public.expenses
+    for each row
+    when (old.user_id is distinct from new.user_id or old.created_at is distinct from new.created_at)
+    execute function public.expenses_sync_participants();
+
+create or replace view public.payments
+with (security_invoker = true) as
+select
+    pr.id,
+    pr.group_id,
+    pr.expense_id,
+    pr.from_user_id,
+    pr.to_user_id,
+    pr.amount,
+    pr.status,
+    pr.created_at,
+    pr.paid_at,
+    pr.paid_via
+from public.payment_records pr
+
+union all
+
+select
+    ep.payment_id                as id,
+    e.group_id,
+    ep.expense_id,
+    ep.payer_id                  as from_user_id,   -- payer, who is owed
+    ep.member_id                 as to_user_id,     -- participant, who owes
+    ep.share                     as amount,
+    ep.status,
+    ep.created_at,
+    ep.paid_at,
+    ep.paid_via
+from public.expense_participants ep
+join public.expenses e on e.id = ep.expense_id
+where ep.member_id <> ep.payer_id
+  and ep.share > 0;
+
+-- Same shape as the payment_records keyset indexes, restricted to the
+-- rows the view actually exposes
+create index if not exists expense_participants_owes_created_idx
+    on public.expense_participants (member_id, status, created_at desc, payment_id desc)
+    where member_id <> payer_id and share > 0;
+create index if not exists expense_participants_owed_created_idx
+    on public.expense_participants (payer_id, status, created_at desc, payment_id desc)
+    where member_id <> payer_id and share > 0;
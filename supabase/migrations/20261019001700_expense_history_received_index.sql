@@ -0,0 +1,134 @@
+-- Serve the received side of expense_history from an index.
+--
+-- The dashboard asks expense_history for the newest N rows per side,
+-- ordered by expense_date desc nulls last, created_at desc nulls last.
+-- The received branch grouped all of the viewer's participant rows
+-- before it could order them, so that limit still aggregated the whole
+-- history, and expenses_user_id_expense_date_idx (nulls first) did not
+-- match the order of the paid side either.
+--
+-- expense_date is copied onto expense_participants next to payer_id and
+-- created_at, so the received branch is read straight off an index on
+-- (member_id, expense_date, created_at) in the dashboard's order. Each
+-- viewer still gets one row per expense: the share with the lowest
+-- payment_id stands for the member and carries the sum of their shares.
+
+do $$
+begin
+    execute format(
+        'alter table public.expense_participants add column if not exists expense_date %s',
+        (select format_type(atttypid, atttypmod)
+           from pg_attribute
+          where attrelid = 'public.expenses'::regclass and attname = 'expense_date')
+    );
+end;
+$$;
+
+update public.expense_participants ep
+   set expense_date = e.expense_date
+  from public.expenses e
+ where e.id = ep.expense_id
+   and ep.expense_date is distinct from e.expense_date;
+
+create or replace function public.expense_participants_copy_expense()
+returns trigger
+language plpgsql
+as $$
+begin
+    select e.user_id, e.created_at, e.expense_date
+      into new.payer_id, new.created_at, new.expense_date
+      from public.expenses e
+     where e.id = new.expense_id;
+    return new;
+end;
+$$;
+
+create or replace function public.expenses_sync_participants()
+returns trigger
+language plpgsql
+as $$
+begin
+    update public.expense_participants
+       set payer_id = new.user_id,
+           created_at = new.created_at,
+           expense_date = new.expense_date
+     where expense_id = new.id;
+    return null;
+end;
+$$;
+
+drop trigger if exists expenses_sync_participants on public.expenses;
+create trigger expenses_sync_participants
+    after update of user_id, created_at, expense_date on public.expenses
+    for each row
+    when (old.user_id is distinct from new.user_id
+          or old.created_at is distinct from new.created_at
+          or old.expense_date is distinct from new.expense_date)
+    execute function public.expenses_sync_participants();
+
+create or replace view public.expense_history
+with (security_invoker = true) as
+select
+    e.user_id                    as viewer_id,
+    'paid'::text                 as kind,
+    e.id                         as expense_id,
+    e.user_id                    as creator_id,
+    e.group_id,
+    e.description,
+    e.expense_date,
+    e.created_at,
+    coalesce(s.total_share, 0)   as amount,
+    g.name                       as group_name,
+    u.name                       as creator_name
+from public.expenses e
+left join lateral (
+    select sum(p.share) as total_share
+    from public.expense_participants p
+    where p.expense_id = e.id
+) s on true
+left join public.groups g on g.id = e.group_id
+left join public.users u on u.id = e.user_id
+
+union all
+
+select
+    p.member_id                  as viewer_id,
+    'received'::text             as kind,
+    p.expense_id,
+    p.payer_id                   as creator_id,
+    e.group_id,
+    e.description,
+    p.expense_date,
+    p.created_at,
+    -s.member_share              as amount,
+    g.name                       as group_name,
+    u.name                       as creator_name
+from public.expense_participants p
+join public.expenses e on e.id = p.expense_id
+left join lateral (
+    select sum(q.share) as member_share
+    from public.expense_participants q
+    where q.expense_id = p.expense_id
+      and q.member_id = p.member_id
+) s on true
+left join public.groups g on g.id = e.group_id
+left join public.users u on u.id = p.payer_id
+where p.member_id <> p.payer_id
+  and not exists (
+    select 1
+    from public.expense_participants d
+    where d.expense_id = p.expense_id
+      and d.member_id = p.member_id
+      and d.payment_id < p.payment_id
+  );
+
+-- Both sides in the dashboard's order, nulls last like its ORDER BY
+drop index if exists public.expenses_user_id_expense_date_idx;
+create index if not exists expenses_user_recent_idx
+    on public.expenses (user_id, expense_date desc nulls last, created_at desc nulls last);
+create index if not exists expense_participants_received_recent_idx
+    on public.expense_participants (member_id, expense_date desc nulls last, created_at desc nulls last)
+    where member_id <> payer_id;
+-- Per member share lookups for the sum and the duplicate check
+create index if not exists expense_participants_expense_member_idx
+    on public.expense_participants (expense_id, member_id, payment_id);
@@ -26,6 +26,7 @@ warnings.filterwarnings(
 
 from app.main import app
 from app.routers.auth import get_current_user
+from app.core.supabase_client import supabase as app_supabase
 
 
 def override_get_current_user():
@@ -71,3 +72,31 @@ def auth_client():
     assert resp.status_code == 200
 
     return c
+
+
+@pytest.fixture
+def fresh_fake():
+    """
+    Empty in memory client of the same type the app uses in testing mode.
+    Tests seed ``_db`` and monkeypatch it into the modules under test.
+    """
+    return type(app_supabase)()
+
+
+@pytest.fixture
+def count_tables():
+    """
+    Record round trips on a fake client. ``count_tables(fake)`` wraps its
+    ``table()`` (and ``rpc()`` with ``rpc=True``) and returns the list the
+    names are appended to, in call order.
+    """
+    def wrap(fake, rpc=False):
+        calls = []
+        table = fake.table
+        fake.table = lambda name: calls.append(name) or table(name)
+        if rpc:
+            call_rpc = fake.rpc
+            fake.rpc = lambda name, params=None: calls.append(name) or call_rpc(name, params)
+        return calls
+
+    return wrap
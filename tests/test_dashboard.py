@@ -1,11 +1,24 @@
 # FILE: tests/test_dashboard.py
 
+import threading
+import time
+
 import pytest
 from fastapi.testclient import TestClient
 from fastapi import Request
 from app.main import app
 from app.routers import dashboard
 from app.routers import auth as auth_router
+from app.core.cache import SnapshotCache
+from app.core.config import settings
+
+
+@pytest.fixture(autouse=True)
+def clear_dashboard_cache():
+    """Each test starts without cached dashboard snapshots."""
+    dashboard.dashboard_cache.clear()
+    yield
+    dashboard.dashboard_cache.clear()
 
 # -------------------------------------------------------------------
 # Fake Supabase client for dashboard endpoint
@@ -129,6 +142,37 @@ class FakeSupabaseClient:
         rows = self._tables.get(name, [])
         return FakeSupabaseTable(rows)
 
+    def rpc(self, name, params):
+        """
+        payment_balance_summary: sum requested payments on each side.
+        Returned through a table mock so chaining and execute() match.
+        """
+        user_id = params["p_user_id"]
+        requested = [
+            p for p in self._tables.get("payments", [])
+            if p.get("status") == "requested"
+        ]
+        summary = {
+            "amount_owed_by_user": sum(
+                p["amount"] for p in requested if p["to_user_id"] == user_id
+            ),
+            "amount_owed_to_user": sum(
+                p["amount"] for p in requested if p["from_user_id"] == user_id
+            ),
+        }
+        table = FakeSupabaseTable([])
+        table.execute = lambda: FakeResponse(data=summary)
+        return table
+
+
+def user_groups(*groups):
+    """Rows of the user_groups view (one per member) for the given groups."""
+    return [
+        {"member_id": member, "id": g["id"], "name": g["name"]}
+        for g in groups
+        for member in g["members"]
+    ]
+
 
 # -------------------------------------------------------------------
 #  Auth override so we do not get 401 in tests
@@ -167,13 +211,13 @@ def make_client_with_data(monkeypatch):
     app.dependency_overrides[auth_router.get_current_user] = override_get_current_user
 
     tables = {
-        "groups": [
+        "user_groups": user_groups(
             # groups where user1 is a member
             {"id": "g1", "name": "Roomies", "members": ["user1", "other_user"]},
             {"id": "g2", "name": "Brunch Crew", "members": ["user1"]},
             # group user1 is not in
             {"id": "g3", "name": "Work Friends", "members": ["other_user"]},
-        ],
+        ),
         "history_received": [
             # money owed to user1 (others owe them)
             {"user_id": "user1", "amount": 10.0},
@@ -205,9 +249,9 @@ def make_client_empty(monkeypatch):
 
     tables = {
         # no groups including lonely_user
-        "groups": [
+        "user_groups": user_groups(
             {"id": "g100", "name": "Somebody Else", "members": ["other_user"]},
-        ],
+        ),
         # only other_user shows up in history
         "history_received": [
             {"user_id": "other_user", "amount": 12.3},
@@ -312,3 +356,231 @@ def test_dashboard_endpoint_empty_lists_for_user_with_no_data(monkeypatch):
 
     assert body["wallet"]["owed"] == 0
     assert body["wallet"]["owing"] == 0
+
+
+# ---------------- TEST 4 ----------------
+def test_dashboard_queries_run_concurrently_under_latency(monkeypatch):
+    """
+    With every query delayed, the dashboard queries should be in flight
+    together rather than one after another.
+    """
+    delay = 0.05
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def slow(call):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        try:
+            time.sleep(delay)
+            return call()
+        finally:
+            with lock:
+                in_flight -= 1
+
+    class SlowTable(FakeSupabaseTable):
+        def execute(self):
+            return slow(super().execute)
+
+    class SlowClient(FakeSupabaseClient):
+        def table(self, name):
+            return SlowTable(self._tables.get(name, []))
+
+        def rpc(self, name, params):
+            return slow(lambda: super(SlowClient, self).rpc(name, params))
+
+    app.dependency_overrides[auth_router.get_current_user] = override_get_current_user
+    monkeypatch.setattr("app.routers.dashboard.supabase", SlowClient({}))
+    client = TestClient(app)
+
+    resp = client.get("/api/dashboard", headers={"X-User-Id": "user1"})
+
+    assert resp.status_code == 200
+    assert peak > 1
+
+
+# -------------------------------------------------------------------
+#                    DASHBOARD SNAPSHOT CACHE
+# -------------------------------------------------------------------
+
+class CountingClient(FakeSupabaseClient):
+    """Fake client that counts how many queries were issued."""
+
+    def __init__(self, tables):
+        super().__init__(tables)
+        self.calls = 0
+
+    def table(self, name):
+        self.calls += 1
+        return super().table(name)
+
+
+def make_counting_client(monkeypatch, tables):
+    app.dependency_overrides[auth_router.get_current_user] = override_get_current_user
+    fake = CountingClient(tables)
+    monkeypatch.setattr("app.routers.dashboard.supabase", fake)
+    return TestClient(app), fake
+
+
+# ---------------- TEST 5 ----------------
+def test_dashboard_second_view_is_served_from_cache(monkeypatch):
+    client, fake = make_counting_client(monkeypatch, {})
+
+    first = client.get("/api/dashboard", headers={"X-User-Id": "user1"})
+    calls_after_first = fake.calls
+    second = client.get("/api/dashboard", headers={"X-User-Id": "user1"})
+
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert calls_after_first > 0
+    assert fake.calls == calls_after_first
+
+
+# ---------------- TEST 6 ----------------
+def test_dashboard_invalidation_rebuilds_only_that_user(monkeypatch):
+    monkeypatch.setattr(dashboard.dashboard_cache, "stale_while_revalidate", False)
+    tables = {"user_groups": user_groups({"id": "g1", "name": "Roomies", "members": ["user1", "user2"]})}
+    client, fake = make_counting_client(monkeypatch, tables)
+
+    client.get("/api/dashboard", headers={"X-User-Id": "user1"})
+    client.get("/api/dashboard", headers={"X-User-Id": "user2"})
+
+    # user1 joins a new group, only their snapshot is dropped
+    tables["user_groups"] += user_groups({"id": "g2", "name": "Brunch", "members": ["user1"]})
+    dashboard.invalidate_dashboard("user1")
+
+    calls = fake.calls
+    body = client.get("/api/dashboard", headers={"X-User-Id": "user1"}).json()
+    assert fake.calls > calls
+    assert {g["name"] for g in body["groups"]} == {"Roomies", "Brunch"}
+
+    calls = fake.calls
+    client.get("/api/dashboard", headers={"X-User-Id": "user2"})
+    assert fake.calls == calls
+
+
+# ---------------- TEST 7 ----------------
+def test_dashboard_stale_while_revalidate_serves_old_then_refreshes(monkeypatch):
+    monkeypatch.setattr(dashboard.dashboard_cache, "stale_while_revalidate", True)
+    tables = {"user_groups": user_groups({"id": "g1", "name": "Roomies", "members": ["user1"]})}
+    client, fake = make_counting_client(monkeypatch, tables)
+
+    client.get("/api/dashboard", headers={"X-User-Id": "user1"})
+
+    tables["user_groups"][0] = user_groups({"id": "g1", "name": "Renamed", "members": ["user1"]})[0]
+    dashboard.invalidate_dashboard("user1")
+
+    # Stale snapshot comes back immediately, rebuild runs after the response
+    stale = client.get("/api/dashboard", headers={"X-User-Id": "user1"}).json()
+    assert stale["groups"][0]["name"] == "Roomies"
+
+    fresh = client.get("/api/dashboard", headers={"X-User-Id": "user1"}).json()
+    assert fresh["groups"][0]["name"] == "Renamed"
+
+
+def test_dashboard_read_after_own_write_is_fresh_by_default(monkeypatch):
+    # Default settings: the writer's next view must not be the old snapshot
+    tables = {"user_groups": user_groups({"id": "g1", "name": "Roomies", "members": ["user1"]})}
+    monkeypatch.setattr(
+        dashboard, "dashboard_cache",
+        SnapshotCache(stale_while_revalidate=settings.DASHBOARD_CACHE_STALE_WHILE_REVALIDATE),
+    )
+    client, fake = make_counting_client(monkeypatch, tables)
+
+    client.get("/api/dashboard", headers={"X-User-Id": "user1"})
+    tables["user_groups"][0] = user_groups({"id": "g1", "name": "Renamed", "members": ["user1"]})[0]
+    dashboard.invalidate_dashboard("user1")
+
+    body = client.get("/api/dashboard", headers={"X-User-Id": "user1"}).json()
+    assert body["groups"][0]["name"] == "Renamed"
+
+
+def test_snapshot_cache_invalidations_stay_bounded():
+    cache = SnapshotCache(max_entries=3)
+    token = cache.begin_build("old")
+    for i in range(50):
+        cache.invalidate(f"user{i}")
+    assert len(cache._invalidated) == 3
+
+    # A key whose invalidation was forgotten still counts as changed
+    cache.invalidate("old")
+    cache.store("old", "snapshot", token)
+    assert cache.lookup("old")[1] != SnapshotCache.FRESH
+    for i in range(5):
+        cache.invalidate(f"other{i}")
+    cache.store("old", "snapshot", token)
+    assert cache.lookup("old")[1] != SnapshotCache.FRESH
+
+    token = cache.begin_build("new")
+    cache.store("new", "snapshot", token)
+    assert cache.lookup("new")[1] == SnapshotCache.FRESH
+
+
+# ---------------- TEST 8 ----------------
+def test_dashboard_recent_transactions_read_only_newest_rows(monkeypatch, fresh_fake):
+    """
+    Recent transactions come from two limited, newest-first queries that
+    are heap merged, so a long history never gets downloaded.
+    """
+    fake = fresh_fake
+    expenses, participants = [], []
+    for day in range(1, 29):
+        # user1 creates expenses on odd days and is added to others' on even days
+        creator = "user1" if day % 2 else "friend"
+        eid = f"e{day}"
+        expenses.append({
+            "id": eid, "user_id": creator, "group_id": None,
+            "description": f"Expense {day}",
+            "expense_date": f"2025-02-{day:02d}",
+        })
+        participants.append({"expense_id": eid, "member_id": "user1", "share": 5})
+        participants.append({"expense_id": eid, "member_id": "friend", "share": 5})
+    fake._db.update({"expenses": expenses, "expense_participants": participants})
+
+    returned = []
+    original_table = fake.table
+
+    def recording_table(name):
+        query = original_table(name)
+        execute = query.execute
+
+        def recorded_execute():
+            result = execute()
+            returned.append((name, len(result.data)))
+            return result
+
+        query.execute = recorded_execute
+        return query
+
+    fake.table = recording_table
+    app.dependency_overrides[auth_router.get_current_user] = override_get_current_user
+    monkeypatch.setattr("app.routers.dashboard.supabase", fake)
+
+    body = TestClient(app).get("/api/dashboard", headers={"X-User-Id": "user1"}).json()
+
+    assert [tx["date"] for tx in body["recent_transactions"]] == [
+        "2025-02-28", "2025-02-27", "2025-02-26", "2025-02-25", "2025-02-24",
+    ]
+    assert [tx["sign"] for tx in body["recent_transactions"]] == ["-", "+", "-", "+", "-"]
+
+    history_sizes = [n for name, n in returned if name == "expense_history"]
+    assert len(history_sizes) == 2
+    assert all(n <= dashboard.RECENT_LIMIT for n in history_sizes)
+
+
+def test_recent_merge_uses_the_database_order():
+    # Rows without an expense_date sort last in the database, whatever
+    # their created_at; the merge must agree or the top N is wrong
+    paid = [
+        {"expense_date": "2025-02-10", "created_at": "2025-02-10T09:00:00"},
+        {"expense_date": None, "created_at": "2025-03-01T09:00:00"},
+    ]
+    received = [
+        {"expense_date": "2025-02-05", "created_at": "2025-02-05T09:00:00"},
+        {"expense_date": None, "created_at": "2025-02-20T09:00:00"},
+    ]
+    merged = dashboard._merge_recent(paid, received, 3)
+    assert merged == [paid[0], received[0], paid[1]]
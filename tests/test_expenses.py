@@ -127,3 +127,39 @@ def test_custom_percentage_split(client):
 
     r = client.post("/expenses/", json=payload)
     assert r.status_code == 201
+
+
+def test_shares_become_obligations_without_payment_rows(client, monkeypatch, fresh_fake):
+    fake = fresh_fake
+    monkeypatch.setenv("TESTING", "0")
+    monkeypatch.setattr("app.routers.expenses.supabase", fake)
+    monkeypatch.setattr("app.routers.payments.supabase", fake)
+
+    payload = {
+        "group_id": "g1",
+        "amount": 30.00,
+        "description": "Food",
+        "expense_date": "2025-10-22",
+        "member_ids": ["test-user", "b", "c"],
+        "expense_type": "food",
+        "split_type": "equal",
+    }
+    r = client.post("/expenses/", json=payload)
+    assert r.status_code == 201
+
+    # Only the expense and its shares are stored
+    assert fake._db.get("payment_records", []) == []
+    created = r.json()["data"]["payments"]
+    assert sorted(p["to_user_id"] for p in created) == ["b", "c"]
+
+    # The payments view derives the same obligations from the shares
+    view = fake.table("payments").select("*").execute().data
+    assert sorted((p["id"], p["to_user_id"], p["amount"]) for p in view) == sorted(
+        (p["id"], p["to_user_id"], p["amount"]) for p in created
+    )
+
+    # Settling one updates its share, not a payments row
+    fake.table("payments").update({"status": "paid"}).eq("id", created[0]["id"]).execute()
+    statuses = {p["member_id"]: p["status"] for p in fake._db["expense_participants"]}
+    assert statuses[created[0]["to_user_id"]] == "paid"
+    assert fake._db.get("payment_records", []) == []
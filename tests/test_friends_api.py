@@ -0,0 +1,276 @@
+# FILE: tests/test_friends_api.py
+# API tests for GET /api/friends search and pagination.
+# The friend list is read from the friend_profiles view, so q, group,
+# ordering and limit are all applied by the query.
+import base64
+import json
+
+import pytest
+
+from app.core import social_graph as graph_module
+from app.core.social_graph import Adjacency, load_social_graph, social_graph
+
+
+@pytest.fixture
+def friends_db(monkeypatch, fresh_fake):
+    """Fresh in memory client with 2,000 friends for the test user."""
+    fake = fresh_fake
+    fake._db["users"] = [{"id": "test-user", "name": "Test User", "username": "tester"}] + [
+        {
+            "id": f"u{i}",
+            "name": f"Person {i:04d}",
+            "username": f"person{i}",
+            "email": f"p{i}@example.com",
+        }
+        for i in range(2000)
+    ]
+    fake._db["friend_links"] = [
+        {"id": i + 1, "owner_id": "test-user", "friend_id": f"u{i}",
+         "note": "climbing" if i % 100 == 0 else None}
+        for i in range(2000)
+    ] + [{"id": 9999, "owner_id": "someone-else", "friend_id": "u1", "note": None}]
+    monkeypatch.setattr("app.routers.friends.supabase", fake)
+    return fake
+
+
+def test_list_friends_returns_everyone_sorted_without_limit(client, friends_db):
+    res = client.get("/api/friends/")
+    assert res.status_code == 200
+    data = res.json()
+    assert len(data["friends"]) == 2000
+    assert data["next_cursor"] is None
+    names = [f["name"] for f in data["friends"]]
+    assert names == sorted(names)
+    assert data["friends"][0] == {
+        "id": 1,
+        "friend_user_id": "u0",
+        "name": "Person 0000",
+        "username": "person0",
+        "email": "p0@example.com",
+        "note": "climbing",
+        "group": "",
+    }
+
+
+def test_friend_search_runs_in_the_query(client, friends_db, count_tables):
+    calls = count_tables(friends_db)
+
+    res = client.get("/api/friends/", params={"q": "person 12", "limit": 20})
+
+    assert res.status_code == 200
+    friends = res.json()["friends"]
+    # Person 0012 and Person 1200-1299, first page of 20
+    assert len(friends) == 20
+    assert all("person 12" in f["name"].lower() for f in friends)
+    # One query against the view, no per-friend profile lookups
+    assert calls == ["friend_profiles"]
+
+    by_email = client.get("/api/friends/", params={"q": "P1999@EXAMPLE"}).json()["friends"]
+    assert [f["friend_user_id"] for f in by_email] == ["u1999"]
+
+
+def test_friend_group_filter_matches_note(client, friends_db):
+    friends = client.get("/api/friends/", params={"group": "CLIMB"}).json()["friends"]
+    assert len(friends) == 20
+    assert {f["note"] for f in friends} == {"climbing"}
+
+
+def test_friend_pages_follow_cursor(client, friends_db):
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 300}
+        if cursor:
+            params["cursor"] = cursor
+        data = client.get("/api/friends/", params=params).json()
+        seen.extend(f["id"] for f in data["friends"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == 2000
+
+    assert client.get("/api/friends/", params={"cursor": "nope"}).status_code == 400
+    forged = base64.urlsafe_b64encode(json.dumps(["a", "1),id.gt.(0"]).encode()).decode()
+    assert client.get("/api/friends/", params={"cursor": forged}).status_code == 400
+
+
+# --- People you may know ---
+
+
+@pytest.fixture
+def graph_db(monkeypatch, fresh_fake):
+    """
+    test-user has friends f0..f49; each of them lists 60 people out of a
+    pool of 3,000, so test-user has thousands of second-degree contacts.
+    test-user also shares a group with g1 and g2.
+    """
+    fake = fresh_fake
+    fake._db["users"] = [
+        {"id": f"f{i}", "name": f"Friend {i}", "username": f"friend{i}"} for i in range(50)
+    ] + [
+        {"id": f"p{i}", "name": f"Pool {i}", "username": f"pool{i}"} for i in range(3000)
+    ] + [
+        {"id": "g1", "name": "Group Mate", "username": "mate"},
+        {"id": "g2", "name": "Other Mate", "username": "mate2"},
+        {"id": "newbie", "name": "New Bie", "username": "newbie"},
+    ]
+    links = [{"owner_id": "test-user", "friend_id": f"f{i}"} for i in range(50)]
+    for i in range(50):
+        links += [{"owner_id": f"f{i}", "friend_id": f"p{(i * 37 + j) % 3000}"} for j in range(60)]
+    # p7 is listed by many friends, and f3 lists another friend of test-user
+    links += [{"owner_id": f"f{i}", "friend_id": "p7"} for i in range(10, 20)]
+    links.append({"owner_id": "f3", "friend_id": "f4"})
+    fake._db["friend_links"] = [{"id": n + 1, **link} for n, link in enumerate(links)]
+    fake._db["group_members"] = [
+        {"group_id": "trip", "user_id": "test-user"},
+        {"group_id": "trip", "user_id": "g1"},
+        {"group_id": "trip", "user_id": "g2"},
+        {"group_id": "flat", "user_id": "test-user"},
+        {"group_id": "flat", "user_id": "g1"},
+    ]
+    monkeypatch.setattr(graph_module, "supabase", fake)
+    monkeypatch.setattr("app.routers.friends.supabase", fake)
+    social_graph.clear()
+    yield fake
+    social_graph.clear()
+
+
+def test_adjacency_overlay_and_compaction():
+    adj = Adjacency([(0, 1), (0, 2), (1, 2)])
+    adj.add(0, 3)
+    adj.remove(0, 1)
+    adj.remove(5, 1)
+    assert sorted(adj.neighbors(0)) == [2, 3]
+    assert adj.degree(0) == 2
+    assert list(adj.neighbors(1)) == [2]
+    assert adj.neighbors(9) == ()
+
+    for dst in range(4, 1100):
+        adj.add(7, dst)
+    # The overlay was folded back into the arrays once it grew large
+    assert len(adj._targets) >= 1024
+    assert adj._pending < 1024
+    assert adj.degree(7) == 1096
+    assert sorted(adj.neighbors(0)) == [2, 3]
+
+
+def test_suggestions_rank_mutual_friends_then_groups(client, graph_db):
+    res = client.get("/api/friends/suggestions", params={"limit": 5})
+    assert res.status_code == 200
+    suggestions = res.json()["suggestions"]
+
+    top = suggestions[0]
+    assert top["user_id"] == "p7"
+    assert top["name"] == "Pool 7"
+    assert top["mutual_friends"] >= 10
+    assert top["score"] == 2 * top["mutual_friends"] + top["shared_groups"]
+
+    ids = [s["user_id"] for s in suggestions]
+    # Existing friends (f4) and the user are never suggested
+    assert "f4" not in ids and "test-user" not in ids
+    scores = [s["score"] for s in suggestions]
+    assert scores == sorted(scores, reverse=True)
+
+    everyone = social_graph.suggest("test-user", 5000)
+    mate = next(s for s in everyone if s["user_id"] == "g1")
+    assert mate["shared_groups"] == 2 and mate["mutual_friends"] == 0
+
+
+def test_suggestions_follow_friend_link_changes(client, graph_db, monkeypatch, count_tables):
+    # add/delete read the user from the request rather than a dependency
+    monkeypatch.setattr("app.routers.friends.get_current_user", lambda request: {"id": "test-user"})
+    client.get("/api/friends/suggestions")
+    calls = count_tables(graph_db)
+
+    res = client.post("/api/friends/", json={"username": "pool7"})
+    assert res.status_code == 200
+    # friend_links ids are serial in Postgres; the fake hands out uuids
+    graph_db._db["friend_links"][-1]["id"] = link_id = 99999
+    ids = [s["user_id"] for s in client.get("/api/friends/suggestions", params={"limit": 50}).json()["suggestions"]]
+    assert "p7" not in ids
+    # No friend_links / group_members reload, only the add and profile reads
+    assert "group_members" not in calls
+
+    assert client.delete(f"/api/friends/{link_id}").status_code == 200
+    top = client.get("/api/friends/suggestions", params={"limit": 1}).json()["suggestions"]
+    assert top[0]["user_id"] == "p7"
+
+
+def test_suggestions_walk_only_first_degree_lists(client, graph_db, monkeypatch):
+    load_social_graph()
+    visited = []
+    neighbors = Adjacency.neighbors
+    monkeypatch.setattr(
+        Adjacency, "neighbors", lambda self, src: visited.append(src) or neighbors(self, src)
+    )
+
+    assert len(social_graph.suggest("test-user", 10)) == 10
+    # Own friends, each friend's list, own groups, each group's members:
+    # the thousands of second-degree contacts are counted, never expanded
+    assert len(visited) == 1 + 50 + 1 + 2
+
+
+# --- Bulk add ---
+
+def test_bulk_add_uses_one_query_per_stage(client, monkeypatch, fresh_fake, count_tables):
+    fake = fresh_fake
+    fake._db["users"] = [{"id": "test-user", "name": "Me", "username": "Me"}] + [
+        {"id": f"c{i}", "name": f"Contact {i}", "username": f"Contact{i}", "email": f"c{i}@x.com"}
+        for i in range(60)
+    ]
+    fake._db["friend_links"] = [{"id": 1, "owner_id": "test-user", "friend_id": "c0", "note": None}]
+    monkeypatch.setattr("app.routers.friends.supabase", fake)
+    monkeypatch.setattr("app.routers.friends.get_current_user", lambda request: {"id": "test-user"})
+
+    calls = count_tables(fake)
+
+    contacts = [{"username": f"contact{i}", "note": "imported"} for i in range(50)]
+    contacts += [
+        {"username": "CONTACT1"},
+        {"username": "ghost"},
+        {"username": "me"},
+        {"username": "  "},
+    ]
+    res = client.post("/api/friends/bulk", json={"friends": contacts})
+    assert res.status_code == 200
+    body = res.json()
+
+    assert calls == ["users", "friend_links", "friend_links"]
+    assert body["added"] == 49
+    statuses = [r["status"] for r in body["results"]]
+    assert statuses[0] == "exists"
+    assert statuses[1:50] == ["added"] * 49
+    assert statuses[50:] == ["duplicate", "not_found", "self", "invalid"]
+
+    added = body["results"][1]["friend"]
+    assert added["friend_user_id"] == "c1"
+    assert added["username"] == "Contact1"
+    assert added["note"] == "imported"
+    assert len(fake._db["friend_links"]) == 50
+
+
+def test_bulk_add_at_the_limit_is_still_one_query_per_stage(client, monkeypatch, fresh_fake, count_tables):
+    from app.routers import friends
+
+    n = friends.MAX_BULK_FRIENDS
+    fresh_fake._db["users"] = [{"id": "test-user", "name": "Me", "username": "Me"}] + [
+        {"id": f"c{i}", "name": f"Contact {i}", "username": f"contact{i}"} for i in range(n)
+    ]
+    fresh_fake._db["friend_links"] = []
+    monkeypatch.setattr("app.routers.friends.supabase", fresh_fake)
+    monkeypatch.setattr("app.routers.friends.get_current_user", lambda request: {"id": "test-user"})
+    calls = count_tables(fresh_fake)
+
+    contacts = [{"username": f"contact{i}"} for i in range(n)]
+    res = client.post("/api/friends/bulk", json={"friends": contacts})
+
+    assert res.json()["added"] == n
+    assert calls == ["users", "friend_links", "friend_links"]
+
+
+def test_bulk_add_rejects_empty_and_oversized_requests(client):
+    from app.routers import friends
+
+    assert client.post("/api/friends/bulk", json={"friends": []}).status_code == 422
+    too_many = [{"username": f"u{i}"} for i in range(friends.MAX_BULK_FRIENDS + 1)]
+    assert client.post("/api/friends/bulk", json={"friends": too_many}).status_code == 422
@@ -92,3 +92,344 @@ def test_fetch_group_members_returns_correct_list(test_group, test_user):
     members = result["data"][0]["members"]
     assert members == group_data["members"]
     assert test_user in members
+
+
+# --- Membership through group_members ---
+@pytest.fixture
+def groups_db(monkeypatch, fresh_fake):
+    """Fresh in memory client for the groups router."""
+    fake = fresh_fake
+    fake._db["users"] = [
+        {"id": "test-user", "name": "Test User", "username": "tester", "email": "t@example.com"},
+        {"id": "friend-1", "name": "Friend One", "username": "f1", "email": "f1@example.com"},
+        {"id": "friend-2", "name": "Friend Two", "username": "f2", "email": "f2@example.com"},
+    ]
+    fake._db["friend_links"] = [{"id": 7, "owner_id": "test-user", "friend_id": "friend-2"}]
+    monkeypatch.setattr("app.routers.groups.supabase", fake)
+    return fake
+
+
+def test_membership_lives_in_group_members(client, groups_db):
+    res = client.post("/api/groups/", json={"name": "Trip", "member_ids": ["friend-1"]})
+    assert res.status_code == 200
+    group = res.json()["group"]
+    assert "members" not in group
+    assert group["member_count"] == 2
+
+    roles = {(m["user_id"], m["role"]) for m in groups_db._db["group_members"]}
+    assert roles == {("test-user", "owner"), ("friend-1", "member")}
+
+    listed = client.get("/api/groups/").json()
+    assert [(g["id"], g["member_count"]) for g in listed] == [(group["id"], 2)]
+
+    # Adding twice keeps one membership row
+    for _ in range(2):
+        assert client.post(f"/api/groups/{group['id']}/members", json={"friend_link_id": 7}).status_code == 200
+    members = client.get(f"/api/groups/{group['id']}/members").json()["members"]
+    assert sorted(m["username"] for m in members) == ["f1", "f2", "tester"]
+
+
+def test_leave_group_removes_only_that_membership(client, groups_db):
+    groups_db._db["groups"] = [{"id": "g1", "name": "Flat", "owner_id": "friend-1"}]
+    groups_db._db["group_members"] = [
+        {"group_id": "g1", "user_id": "friend-1", "role": "owner"},
+        {"group_id": "g1", "user_id": "test-user", "role": "member"},
+    ]
+
+    assert client.post("/api/groups/g1/leave").json() == {"ok": True}
+    assert client.post("/api/groups/g1/leave").json()["message"] == "Already not a member"
+    assert [m["user_id"] for m in groups_db._db["group_members"]] == ["friend-1"]
+    assert client.get("/api/groups/").json() == []
+
+
+def test_concurrent_joins_and_leaves_are_not_lost(groups_db):
+    from concurrent.futures import ThreadPoolExecutor
+    from app.routers import groups as groups_router
+
+    n = 200
+    groups_db._db["groups"] = [{"id": "g1", "name": "Trip", "owner_id": "test-user", "version": 0}]
+    groups_db._db["group_members"] = [
+        {"group_id": "g1", "user_id": "test-user", "role": "owner"},
+        # Already members; they leave while the others join
+        *({"group_id": "g1", "user_id": f"leaver-{i}", "role": "member"} for i in range(50)),
+    ]
+    groups_db._db["friend_links"] = [
+        {"id": i, "owner_id": "test-user", "friend_id": f"joiner-{i}"} for i in range(n)
+    ]
+
+    def join(i):
+        payload = groups_router.AddMemberPayload(friend_link_id=i)
+        return groups_router.add_group_member("g1", payload, user={"id": "test-user"})
+
+    def leave(i):
+        return groups_router.leave_group("g1", user={"id": f"leaver-{i}"})
+
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        futures = [pool.submit(join, i) for i in range(n)]
+        futures += [pool.submit(leave, i) for i in range(50)]
+        for f in futures:
+            assert f.result()["ok"] is True
+
+    rows = [(m["group_id"], m["user_id"]) for m in groups_db._db["group_members"]]
+    assert sorted(rows) == sorted(
+        [("g1", "test-user")] + [("g1", f"joiner-{i}") for i in range(n)]
+    )
+    # Membership changes never touch the group row
+    assert groups_db._db["groups"][0]["version"] == 0
+
+
+def test_membership_changes_do_not_conflict_with_edits(client, groups_db):
+    from app.routers import groups as groups_router
+
+    groups_db._db["groups"] = [{"id": "g1", "name": "Trip", "owner_id": "test-user", "version": 3}]
+    groups_db._db["group_members"] = [
+        {"group_id": "g1", "user_id": "test-user", "role": "owner"},
+        {"group_id": "g1", "user_id": "leaver", "role": "member"},
+    ]
+    groups_db._db["friend_links"] = [{"id": 7, "owner_id": "test-user", "friend_id": "joiner"}]
+
+    # Someone joins and someone leaves after the owner loaded the page
+    payload = groups_router.AddMemberPayload(friend_link_id=7)
+    assert groups_router.add_group_member("g1", payload, user={"id": "test-user"})["ok"]
+    assert groups_router.leave_group("g1", user={"id": "leaver"})["ok"]
+    assert groups_db._db["groups"][0]["version"] == 3
+
+    res = client.patch("/api/groups/g1", json={"name": "Road trip", "version": 3})
+    assert res.status_code == 200
+    assert res.json()["group"]["version"] == 4
+
+
+def test_update_group_rejects_stale_version(client, groups_db):
+    groups_db._db["groups"] = [{"id": "g1", "name": "Trip", "owner_id": "test-user", "version": 3}]
+
+    ok = client.patch("/api/groups/g1", json={"name": "Road trip", "version": 3})
+    assert ok.status_code == 200
+    assert ok.json()["group"]["version"] == 4
+
+    stale = client.patch("/api/groups/g1", json={"name": "Beach", "version": 3})
+    assert stale.status_code == 409
+    assert groups_db._db["groups"][0]["name"] == "Road trip"
+
+
+def test_group_overview_is_one_request_with_fixed_queries(client, groups_db, count_tables):
+    groups_db._db["groups"] = [{"id": "g1", "name": "Flat", "owner_id": "test-user", "version": 2}]
+    groups_db._db["group_members"] = [
+        {"group_id": "g1", "user_id": uid, "role": "owner" if uid == "test-user" else "member"}
+        for uid in ("test-user", "friend-1", "friend-2")
+    ]
+    groups_db._db["expenses"] = [
+        {"id": f"e{i}", "user_id": "test-user", "group_id": "g1", "amount": 30,
+         "description": f"Groceries {i}", "expense_date": f"2025-03-{i:02d}"}
+        for i in range(1, 13)
+    ]
+    # test-user paid e1 for everyone; friend-1 still owes their share
+    groups_db._db["expense_participants"] = [
+        {"expense_id": "e1", "member_id": m, "share": 10, "payment_id": f"pay-{m}",
+         "status": "paid" if m == "friend-2" else "requested"}
+        for m in ("test-user", "friend-1", "friend-2")
+    ]
+
+    calls = count_tables(groups_db, rpc=True)
+
+    res = client.get("/api/groups/g1/overview?expenses=5")
+    assert res.status_code == 200
+    body = res.json()
+
+    assert sorted(calls) == sorted(
+        ["user_groups", "group_member_profiles", "group_member_balances", "expenses"]
+    )
+    assert body["group"]["member_count"] == 3
+    nets = {m["id"]: m["net"] for m in body["members"]}
+    assert nets == {"test-user": 10.0, "friend-1": -10.0, "friend-2": 0.0}
+    assert [e["id"] for e in body["recent_expenses"]] == ["e12", "e11", "e10", "e9", "e8"]
+    assert body["recent_expenses"][0]["payer_name"] == "Test User"
+
+
+def test_group_overview_requires_membership(client, groups_db):
+    groups_db._db["groups"] = [{"id": "g1", "name": "Flat", "owner_id": "friend-1"}]
+    groups_db._db["group_members"] = [{"group_id": "g1", "user_id": "friend-1", "role": "owner"}]
+
+    assert client.get("/api/groups/g1/overview").status_code == 403
+    assert client.get("/api/groups/missing/overview").status_code == 404
+
+
+def test_members_paginate_sort_and_search(client, groups_db):
+    names = ["Zoe", "adam", "Bea", "Ben", "Carl", "bella", "Al"]
+    groups_db._db["users"] += [
+        {"id": f"u{i}", "name": name, "username": name.lower(), "email": None}
+        for i, name in enumerate(names)
+    ]
+    groups_db._db["groups"] = [{"id": "g1", "name": "Event", "owner_id": "test-user"}]
+    groups_db._db["group_members"] = [
+        {"group_id": "g1", "user_id": f"u{i}", "role": "member", "joined_at": f"2025-01-{i + 1:02d}"}
+        for i in range(len(names))
+    ]
+
+    seen, cursor = [], None
+    while True:
+        url = "/api/groups/g1/members?limit=3" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url).json()
+        assert len(body["members"]) <= 3
+        seen += [m["name"] for m in body["members"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert seen == ["adam", "Al", "Bea", "bella", "Ben", "Carl", "Zoe"]
+
+    body = client.get("/api/groups/g1/members?limit=2&q=be").json()
+    assert [m["name"] for m in body["members"]] == ["Bea", "bella"]
+    assert client.get(f"/api/groups/g1/members?limit=2&q=be&cursor={body['next_cursor']}").json()[
+        "members"
+    ] == [{"id": "u3", "name": "Ben", "username": "ben", "email": None, "role": "member"}]
+
+    joined = client.get("/api/groups/g1/members?limit=2&sort=joined").json()
+    assert [m["name"] for m in joined["members"]] == ["Zoe", "adam"]
+
+    # A name cursor cannot be replayed against another sort
+    res = client.get(f"/api/groups/g1/members?sort=joined&cursor={body['next_cursor']}")
+    assert res.status_code == 400
+
+    # No limit still returns everyone, read in bounded pages
+    everyone = client.get("/api/groups/g1/members").json()
+    assert len(everyone["members"]) == len(names)
+    assert everyone["next_cursor"] is None
+
+
+def test_select_in_splits_long_id_lists():
+    from app.core.batching import select_in
+
+    class Query:
+        def __init__(self, log):
+            self.log = log
+
+        def in_(self, column, values):
+            self.log.append(len(values))
+            self.values = values
+            return self
+
+        def execute(self):
+            return type("Resp", (), {"data": [{"id": v} for v in self.values]})()
+
+    log = []
+    ids = [f"id-{i}" for i in range(1000)] + ["id-1"]
+    rows = select_in(lambda: Query(log), "id", ids, size=150)
+    assert log == [150] * 6 + [100]
+    assert len(rows) == 1000
+
+
+def test_delete_group_cascades_in_batches_with_progress(client, groups_db, monkeypatch):
+    from app.routers import groups as groups_router
+
+    monkeypatch.setattr(groups_router, "DELETE_BATCH_SIZE", 100)
+    db = groups_db._db
+    db["groups"] = [
+        {"id": "g1", "name": "Festival", "owner_id": "test-user"},
+        {"id": "g2", "name": "Other", "owner_id": "friend-1"},
+    ]
+    db["group_members"] = [
+        {"group_id": "g1", "user_id": "test-user", "role": "owner"},
+        {"group_id": "g1", "user_id": "friend-1", "role": "member"},
+        {"group_id": "g2", "user_id": "friend-1", "role": "owner"},
+    ]
+    db["expenses"] = [
+        {"id": f"e{i}", "group_id": "g1" if i < 450 else "g2", "user_id": "test-user", "amount": 20}
+        for i in range(460)
+    ]
+    db["expense_participants"] = [
+        {"expense_id": f"e{i}", "member_id": m, "share": 10}
+        for i in range(460) for m in ("test-user", "friend-1")
+    ]
+    db["payment_records"] = [
+        {"id": "net1", "group_id": "g1", "expense_id": None},
+        {"id": "net2", "group_id": "g2", "expense_id": None},
+    ]
+    db["notifications"] = [
+        {"id": 1, "group_id": "g1", "to_user": "friend-1"},
+        {"id": 2, "group_id": "g2", "to_user": "friend-1"},
+    ]
+
+    expense_deletes = []
+    table = groups_db.table
+
+    def recording_table(name):
+        query = table(name)
+        if name == "expenses":
+            delete = query.delete
+            query.delete = lambda: expense_deletes.append(1) or delete()
+        return query
+
+    groups_db.table = recording_table
+
+    res = client.delete("/api/groups/g1")
+    assert res.status_code == 200
+    job = res.json()["job"]
+
+    # TestClient runs the background cascade before returning
+    progress = client.get(f"/api/groups/deletions/{job['id']}").json()["job"]
+    assert progress["status"] == "done"
+    assert progress["deleted_expenses"] == 450
+    assert progress["deleted_participants"] == 900
+    assert progress["deleted_payments"] == 1
+    assert progress["deleted_notifications"] == 1
+    # 450 expenses in batches of 100, each batch chunked for the URL limit
+    assert len(expense_deletes) >= 5
+
+    # Nothing from g1 is left behind and g2 is untouched
+    assert [g["id"] for g in db["groups"]] == ["g2"]
+    assert {e["group_id"] for e in db["expenses"]} == {"g2"}
+    assert len(db["expense_participants"]) == 20
+    assert [p["id"] for p in db["payment_records"]] == ["net2"]
+    assert [n["id"] for n in db["notifications"]] == [2]
+    assert [m["group_id"] for m in db["group_members"]] == ["g2"]
+    assert db["group_deletion_jobs"][0]["member_ids"] == ["test-user", "friend-1"]
+
+
+@pytest.mark.parametrize("updated_at", ["2026-01-01T00:00:00+00:00", None])
+def test_delete_group_resumes_a_stale_job(client, groups_db, monkeypatch, updated_at):
+    from app.routers import groups as groups_router
+
+    invalidated = []
+    monkeypatch.setattr(groups_router, "invalidate_dashboard", lambda *ids: invalidated.extend(ids))
+    db = groups_db._db
+    db["groups"] = [{"id": "g1", "name": "Festival", "owner_id": "test-user"}]
+    db["expenses"] = [{"id": "e1", "group_id": "g1", "user_id": "test-user", "amount": 20}]
+    # The process running the cascade died an hour ago, half way through
+    db["group_deletion_jobs"] = [
+        {"id": "job1", "group_id": "g1", "requested_by": "test-user", "status": "running",
+         "deleted_expenses": 3, "deleted_participants": 6, "deleted_payments": 0,
+         "deleted_notifications": 0, "member_ids": ["test-user", "friend-1"],
+         "created_at": "2026-01-01T00:00:00+00:00", "updated_at": updated_at},
+    ]
+
+    res = client.delete("/api/groups/g1")
+    assert res.json()["job"]["id"] == "job1"
+    assert "member_ids" not in res.json()["job"]
+    [job] = db["group_deletion_jobs"]
+    assert (job["status"], job["deleted_expenses"]) == ("done", 4)
+    assert db["groups"] == []
+    # The members removed by the first request still get fresh dashboards
+    assert set(invalidated) == {"test-user", "friend-1"}
+
+
+def test_delete_group_reuses_a_live_job(client, groups_db, monkeypatch):
+    from datetime import datetime, timezone
+    from app.routers import groups as groups_router
+
+    now = datetime.now(timezone.utc).isoformat()
+    groups_db._db["groups"] = [{"id": "g1", "name": "Festival", "owner_id": "test-user"}]
+    groups_db._db["group_deletion_jobs"] = [
+        {"id": "job1", "group_id": "g1", "requested_by": "test-user", "status": "running",
+         "created_at": now, "updated_at": now},
+    ]
+    started = []
+    monkeypatch.setattr(groups_router, "run_group_deletion", lambda *args: started.append(args))
+
+    assert client.delete("/api/groups/g1").json()["job"]["id"] == "job1"
+    assert started == []
+
+
+def test_deletion_progress_is_private_to_requester(client, groups_db):
+    groups_db._db["group_deletion_jobs"] = [
+        {"id": "job1", "group_id": "g9", "requested_by": "someone-else", "status": "running"}
+    ]
+    assert client.get("/api/groups/deletions/job1").status_code == 404
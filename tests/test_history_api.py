@@ -116,3 +116,52 @@ def test_history_empty_results_return_empty_lists(client):
         # Since the filter is for a non-existent group, both lists should be empty
         assert data["received"] == []
         assert data["paid"] == []
+
+
+def test_history_is_built_from_one_query(client, monkeypatch):
+    """
+    History comes from the expense_history view in a single round trip,
+    with signed amounts, group names and creator names already attached.
+    """
+    from app.core.supabase_client import supabase
+
+    monkeypatch.setattr(supabase, "_db", {
+        "users": [
+            {"id": "test-user", "name": "Test User"},
+            {"id": "liz", "name": "Liz"},
+        ],
+        "groups": [{"id": "g1", "name": "Roommates"}],
+        "expenses": [
+            {"id": "e1", "user_id": "test-user", "group_id": "g1",
+             "amount": 30, "description": "Pizza", "expense_date": "2025-10-01"},
+            {"id": "e2", "user_id": "liz", "group_id": "g1",
+             "amount": 20, "description": "Uber", "expense_date": "2025-10-02"},
+        ],
+        "expense_participants": [
+            {"expense_id": "e1", "member_id": "test-user", "share": 10},
+            {"expense_id": "e1", "member_id": "liz", "share": 20},
+            {"expense_id": "e2", "member_id": "test-user", "share": 5},
+            {"expense_id": "e2", "member_id": "liz", "share": 15},
+        ],
+    })
+
+    calls = []
+    original_table = supabase.table
+
+    def counting_table(name):
+        calls.append(name)
+        return original_table(name)
+
+    monkeypatch.setattr(supabase, "table", counting_table)
+
+    r = client.get("/api/history/")
+    assert r.status_code == 200
+    assert calls == ["expense_history"]
+
+    data = r.json()
+    assert [(p["id"], p["amount"], p["group"]) for p in data["paid"]] == [
+        ("e1", 30.0, "Roommates")
+    ]
+    assert [(p["id"], p["amount"], p["creator_name"]) for p in data["received"]] == [
+        ("e2", -5.0, "Liz")
+    ]
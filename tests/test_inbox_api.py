@@ -0,0 +1,335 @@
+# FILE: tests/test_inbox_api.py
+# Tests for the inbox endpoints and the live event push channel.
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app.core import notifications
+from app.core.events import EventHub, TooManySubscriptions, event_hub
+from app.core.notifications import NotificationQueue
+from app.routers import inbox, payments
+
+
+class FakeRequest:
+    """Just enough of a Request for the stream generator."""
+
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+def test_hub_fans_out_from_other_threads():
+    async def scenario():
+        hub = EventHub(queue_size=10, max_per_user=3)
+        first = hub.subscribe("u1")
+        second = hub.subscribe("u1")
+        other = hub.subscribe("u2")
+
+        # Sync routes publish from worker threads
+        worker = threading.Thread(target=hub.publish, args=("u1", "balance", {"x": 1}))
+        worker.start()
+        worker.join()
+
+        got = [await first.next(1), await second.next(1)]
+        assert [(e.type, e.data) for e in got] == [("balance", {"x": 1})] * 2
+        assert await other.next(0.01) is None
+
+        hub.subscribe("u1")
+        with pytest.raises(TooManySubscriptions):
+            hub.subscribe("u1")
+
+        first.close()
+        assert hub.connection_count("u1") == 2
+        assert hub.connection_count() == 3
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_gets_resync_instead_of_unbounded_queue():
+    async def scenario():
+        hub = EventHub(queue_size=5)
+        sub = hub.subscribe("u1")
+        for i in range(50):
+            hub.publish("u1", "notification", {"n": i})
+        await asyncio.sleep(0)
+        assert sub.queue.qsize() == 5
+        event = await sub.next(1)
+        assert event.type == "resync"
+        # After the resync the newest events are still there
+        assert (await sub.next(1)).data == {"n": 46}
+
+    asyncio.run(scenario())
+
+
+def test_stream_yields_sse_frames_and_unsubscribes():
+    async def scenario():
+        request = FakeRequest()
+        stream = inbox._event_stream(request, "stream-user", keepalive=0.01)
+        # Nothing is held until the response is actually streamed
+        assert event_hub.connection_count("stream-user") == 0
+
+        assert await stream.__anext__() == "retry: 5000\n\n"
+        assert event_hub.connection_count("stream-user") == 1
+        assert await stream.__anext__() == ": keepalive\n\n"
+
+        event_hub.publish("stream-user", "notification", {"type": "Expense", "group_name": "Trip"})
+        frame = await stream.__anext__()
+        lines = frame.strip().split("\n")
+        assert lines[1] == "event: notification"
+        assert json.loads(lines[2][len("data: "):]) == {"type": "Expense", "group_name": "Trip"}
+
+        request.disconnected = True
+        with pytest.raises(StopAsyncIteration):
+            await stream.__anext__()
+        assert event_hub.connection_count("stream-user") == 0
+
+    asyncio.run(scenario())
+
+
+def test_stream_refuses_past_the_per_user_limit(client, monkeypatch):
+    monkeypatch.setattr(event_hub, "max_per_user", 0)
+    assert client.get("/inbox/stream").status_code == 429
+
+
+def test_marking_a_payment_paid_pushes_balance_events(client, monkeypatch, fresh_fake):
+    seen = []
+    monkeypatch.setattr(payments, "publish_balance_change", lambda *ids: seen.append(set(ids)))
+
+    fake = fresh_fake
+    fake._db["payment_records"] = [
+        {"id": "p1", "from_user_id": "friend-1", "to_user_id": "test-user",
+         "amount": 5, "status": "requested", "expense_id": None, "group_id": None}
+    ]
+    monkeypatch.setattr(payments, "supabase", fake)
+
+    assert client.post("/api/payments/p1/pay", json={}).status_code == 200
+    assert seen == [{"test-user", "friend-1"}]
+
+
+# --- Background notification writes ---
+
+@pytest.fixture
+def notifications_db(monkeypatch, fresh_fake):
+    """Fresh in memory client for the notification writer, with insert counting."""
+    # Let the shared writer finish anything earlier requests queued
+    notifications.notification_queue.stop()
+
+    fake = fresh_fake
+    fake._db["users"] = [{"id": "test-user", "username": "tester"}]
+    fake.inserts = []
+    table = fake.table
+
+    def counting_table(name):
+        query = table(name)
+        insert = query.insert
+        query.insert = lambda payload: fake.inserts.append(len(payload)) or insert(payload)
+        return query
+
+    fake.table = counting_table
+    monkeypatch.setattr(notifications, "supabase", fake)
+    monkeypatch.setattr(inbox, "supabase", fake)
+    return fake
+
+
+def _rows(n):
+    return [{"type": "Expense", "from_user": "a", "to_user": f"u{i}"} for i in range(n)]
+
+
+def test_queue_writes_in_batches(notifications_db):
+    q = NotificationQueue(batch_size=200, flush_interval=0.05)
+    q.start = lambda: None  # write on this thread via flush
+    assert q.enqueue(_rows(450)) == 450
+    q.flush()
+    assert notifications_db.inserts == [200, 200, 50]
+    assert len(notifications_db._db["notifications"]) == 450
+    assert q.written == 450
+
+
+def test_full_queue_drops_after_a_short_wait(notifications_db):
+    q = NotificationQueue(max_events=5, enqueue_timeout=0.01)
+    q.start = lambda: None  # no writer, so the queue fills up
+    assert q.enqueue(_rows(8)) == 5
+    assert q.dropped == 3
+    assert q.pending() == 5
+
+
+def test_failed_batch_falls_back_to_single_rows(notifications_db):
+    calls = []
+    table = notifications_db.table
+
+    def failing_table(name):
+        query = table(name)
+        insert = query.insert
+
+        def checked_insert(payload):
+            calls.append(len(payload))
+            if any(row["to_user"] == "u3" for row in payload):
+                raise RuntimeError("violates foreign key constraint")
+            return insert(payload)
+
+        query.insert = checked_insert
+        return query
+
+    notifications_db.table = failing_table
+    q = NotificationQueue(write_attempts=2, retry_delay=0)
+    q.start = lambda: None
+    q.enqueue(_rows(5))
+    q.flush()
+
+    # Two tries of the batch, then each row on its own
+    assert calls == [5, 5, 1, 1, 1, 1, 1]
+    assert sorted(r["to_user"] for r in notifications_db._db["notifications"]) == ["u0", "u1", "u2", "u4"]
+    assert (q.written, q.failed) == (4, 1)
+
+
+def test_stop_drains_everything_queued(notifications_db):
+    q = NotificationQueue(batch_size=50, flush_interval=5.0)
+    q.enqueue(_rows(120))
+    q.stop(timeout=1.0)
+    assert q.pending() == 0
+    assert sum(notifications_db.inserts) == 120
+    assert len(notifications_db._db["notifications"]) == 120
+
+
+def test_written_notifications_are_pushed_to_streams(notifications_db):
+    async def scenario():
+        sub = event_hub.subscribe("u1")
+        q = NotificationQueue()
+        q.start = lambda: None
+        q.add_listener(inbox._push_new_notifications)
+        q.enqueue(_rows(3))
+        q.flush()
+        event = await sub.next(1)
+        sub.close()
+        return event
+
+    event = asyncio.run(scenario())
+    assert event.type == "notification"
+    assert event.data["type"] == "Expense"
+
+
+def test_mark_paid_queues_a_notification_for_the_payer(client, notifications_db, monkeypatch):
+    # Payments and notifications share the one in memory database
+    fake = notifications_db
+    fake._db["payment_records"] = [
+        {"id": "p2", "from_user_id": "friend-1", "to_user_id": "test-user",
+         "amount": 5, "status": "requested", "expense_id": None, "group_id": "g1"}
+    ]
+    monkeypatch.setattr(payments, "supabase", fake)
+    # Keep the shared writer off so the test decides when to flush
+    monkeypatch.setattr(notifications.notification_queue, "start", lambda: None)
+
+    assert client.post("/api/payments/p2/pay", json={}).status_code == 200
+    # Nothing is written until the queue flushes
+    assert notifications_db._db.get("notifications", []) == []
+
+    notifications.notification_queue.flush()
+    [row] = notifications_db._db["notifications"]
+    assert (row["type"], row["from_user"], row["to_user"], row["group_id"]) == (
+        "Payment Paid", "test-user", "friend-1", "g1"
+    )
+
+
+# --- Paging and unread counters ---
+
+def _nid(i):
+    return f"00000000-0000-4000-8000-{i:012d}"
+
+
+def _inbox_rows(n, to_user="test-user"):
+    return [
+        {"id": _nid(i + (100 if to_user != "test-user" else 0)), "type": "Expense", "from_user": "test-user", "to_user": to_user,
+         "group_id": None, "status": "unread", "created_at": f"2026-10-01T00:00:{i % 60:02d}+00:00"}
+        for i in range(n)
+    ]
+
+
+def test_notifications_page_with_cursor(client, notifications_db):
+    notifications_db._db["notifications"] = _inbox_rows(7) + _inbox_rows(2, to_user="someone-else")
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        res = client.get("/inbox/notifications", params=params)
+        assert res.status_code == 200
+        seen.extend(n["id"] for n in res.json())
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert seen == [_nid(i) for i in range(6, -1, -1)]
+    assert client.get("/inbox/notifications", params={"cursor": "nope"}).status_code == 400
+
+
+def test_unread_count_and_mark_read(client, notifications_db):
+    rows = _inbox_rows(5) + _inbox_rows(2, to_user="someone-else")
+    rows[4]["status"] = None  # older rows predate the status default
+    notifications_db._db["notifications"] = rows
+
+    assert client.get("/inbox/unread-count").json() == {"unread": 5}
+
+    res = client.post("/inbox/mark-read", json={"ids": [_nid(0), _nid(1), _nid(99)]})
+    assert res.json()["updated"] == 2
+    assert client.get("/inbox/unread-count").json() == {"unread": 3}
+    assert client.post("/inbox/mark-read", json={"ids": ["x),id.gt.(0"]}).status_code == 400
+
+    res = client.post("/inbox/mark-read", json={"all": True})
+    assert res.json()["updated"] == 3
+    assert client.get("/inbox/unread-count").json() == {"unread": 0}
+    # Other users' notifications are never touched
+    others = [n for n in notifications_db._db["notifications"] if n["to_user"] == "someone-else"]
+    assert {n["status"] for n in others} == {"unread"}
+
+    assert client.post("/inbox/mark-read", json={}).status_code == 400
+
+
+# --- Stored display names ---
+
+def test_writer_stores_names_with_one_lookup_per_batch(client, notifications_db, count_tables):
+    notifications_db._db["groups"] = [{"id": "g1", "name": "Trip"}]
+    tables = count_tables(notifications_db)
+
+    q = NotificationQueue(batch_size=100)
+    q.start = lambda: None
+    q.enqueue([
+        {"type": "Expense", "from_user": "test-user", "to_user": f"u{i}", "group_id": "g1"}
+        for i in range(30)
+    ] + [{"type": "Expense", "from_user": "gone", "to_user": "test-user", "group_id": None}])
+    q.flush()
+    assert sorted(tables) == ["groups", "notifications", "users"]
+
+    rows = notifications_db._db["notifications"]
+    assert {(r["from_username"], r["group_name"]) for r in rows[:30]} == {("tester", "Trip")}
+
+    # Reading the inbox is a single query on notifications
+    tables.clear()
+    [notif] = client.get("/inbox/notifications").json()
+    assert tables == ["notifications"]
+    assert notif["from_user"] == "Unknown"
+
+
+def test_renames_rewrite_stored_names(notifications_db):
+    notifications_db._db["notifications"] = [
+        {"id": "n1", "from_user": "a", "from_username": "old", "group_id": "g1", "group_name": "Trip"},
+        {"id": "n2", "from_user": "b", "from_username": "bee", "group_id": "g2", "group_name": "Flat"},
+        {"id": "n3", "from_user": "a", "from_username": None, "group_id": "g1", "group_name": None},
+    ]
+    notifications.refresh_sender_name("a", "new")
+    notifications.refresh_group_name("g1", "Road trip")
+
+    n1, n2, n3 = notifications_db._db["notifications"]
+    assert (n1["from_username"], n1["group_name"]) == ("new", "Road trip")
+    # Rows written without names (shown as "Unknown") are repaired as well
+    assert (n3["from_username"], n3["group_name"]) == ("new", "Road trip")
+    assert (n2["from_username"], n2["group_name"]) == ("bee", "Flat")
+
+    # Clearing a name clears the copies rather than storing "None"
+    notifications.refresh_sender_name("a", None)
+    assert [n["from_username"] for n in notifications_db._db["notifications"]] == [None, "bee", None]
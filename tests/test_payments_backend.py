@@ -1,8 +1,23 @@
 # FILE: tests/test_payments_backend.py
 
+import base64
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.routers import payments as payments_router
+
+FRIEND_A = "00000000-0000-4000-8000-00000000000a"
+FRIEND_B = "00000000-0000-4000-8000-00000000000b"
+
+
+@pytest.fixture(autouse=True)
+def clear_expense_name_cache():
+    """Each test starts without cached expense descriptions."""
+    payments_router.expense_name_cache.clear()
+    yield
+    payments_router.expense_name_cache.clear()
 
 # --- Helpers to build fake supabase responses ---
 
@@ -116,6 +131,29 @@ class FakeSupabaseClient:
         # Other tables get an empty table so router calls do not crash
         return FakeSupabaseTable([])
 
+    def rpc(self, name, params):
+        # payment_balance_summary: sum requested amounts on each side
+        user_id = params["p_user_id"]
+        requested = [r for r in self._rows if r.get("status") == "requested"]
+        return FakeResponseQuery({
+            "amount_owed_by_user": sum(
+                r["amount"] for r in requested if r["to_user_id"] == user_id
+            ),
+            "amount_owed_to_user": sum(
+                r["amount"] for r in requested if r["from_user_id"] == user_id
+            ),
+        })
+
+
+class FakeResponseQuery:
+    """Result holder for rpc(...).execute()."""
+
+    def __init__(self, data):
+        self._data = data
+
+    def execute(self):
+        return FakeResponse(data=self._data)
+
 
 # ----------------------------------------------------------------------
 #                              TESTS
@@ -133,14 +171,14 @@ def test_outstanding_payments_summary(monkeypatch):
         # payments involving user1 in requested status
         {
             "id": 1,
-            "from_user_id": "friendA",
+            "from_user_id": FRIEND_A,
             "to_user_id": "user1",
             "amount": 30.0,
             "status": "requested",
         },
         {
             "id": 2,
-            "from_user_id": "friendB",
+            "from_user_id": FRIEND_B,
             "to_user_id": "user1",
             "amount": 10.0,
             "status": "requested",
@@ -148,14 +186,14 @@ def test_outstanding_payments_summary(monkeypatch):
         {
             "id": 3,
             "from_user_id": "user1",
-            "to_user_id": "friendA",
+            "to_user_id": FRIEND_A,
             "amount": 50.0,
             "status": "requested",
         },
         # paid payments should not affect requested totals
         {
             "id": 4,
-            "from_user_id": "friendA",
+            "from_user_id": FRIEND_A,
             "to_user_id": "user1",
             "amount": 99.0,
             "status": "paid",
@@ -188,7 +226,7 @@ def test_mark_payment_as_paid(monkeypatch):
     rows = [
         {
             "id": 10,
-            "from_user_id": "friendA",
+            "from_user_id": FRIEND_A,
             "to_user_id": "user1",
             "amount": 20.0,
             "status": "requested",
@@ -232,7 +270,7 @@ def test_user_cannot_update_payments_they_do_not_own(monkeypatch):
     rows = [
         {
             "id": 20,
-            "from_user_id": "friendA",
+            "from_user_id": FRIEND_A,
             "to_user_id": "user66",
             "amount": 99.0,
             "status": "requested",
@@ -254,3 +292,448 @@ def test_user_cannot_update_payments_they_do_not_own(monkeypatch):
 
     # Router should still enforce this and return 403
     assert res.status_code == 403
+
+
+# ----------------------------------------------------------------------
+#                         BULK SETTLE
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def payments_store(monkeypatch, fresh_fake, count_tables):
+    """
+    Seed the app's in memory fake client with payment rows and record
+    every table() call so tests can count round trips.
+    """
+    def seed(rows):
+        fresh_fake._db["payment_records"] = rows
+        fresh_fake._db["users"] = [{"id": uid} for uid in ("test-user", FRIEND_A, FRIEND_B)]
+        calls = count_tables(fresh_fake)
+        monkeypatch.setattr("app.routers.payments.supabase", fresh_fake)
+        return fresh_fake, calls
+
+    return seed
+
+
+def _payment(pid, from_user, to_user, status="requested", group_id=None):
+    return {
+        "id": pid, "group_id": group_id, "expense_id": None,
+        "from_user_id": from_user, "to_user_id": to_user, "amount": 5.0,
+        "status": status, "created_at": "2025-01-01", "paid_at": None, "paid_via": None,
+    }
+
+
+# ---------- TEST 4 ----------
+def test_settle_by_ids_returns_per_id_results(client, payments_store):
+    fake, calls = payments_store([
+        _payment("p1", FRIEND_A, "test-user"),
+        _payment("p2", FRIEND_B, "test-user"),
+        _payment("p3", FRIEND_A, "someone-else"),
+        _payment("p4", FRIEND_A, "test-user", status="paid"),
+    ])
+
+    res = client.post(
+        "/api/payments/settle",
+        json={"payment_ids": ["p1", "p2", "p3", "p4", "missing"], "paid_via": "Venmo"},
+    )
+    assert res.status_code == 200
+
+    body = res.json()
+    assert body["paid_count"] == 2
+    assert {r["id"]: r["result"] for r in body["results"]} == {
+        "p1": "paid",
+        "p2": "paid",
+        "p3": "forbidden",
+        "p4": "not_payable",
+        "missing": "not_found",
+    }
+    # One authorisation query and one batched update on payments
+    assert calls.count("payments") == 2
+
+    statuses = {r["id"]: r["status"] for r in fake._db["payment_records"]}
+    assert statuses == {"p1": "paid", "p2": "paid", "p3": "requested", "p4": "paid"}
+
+
+# ---------- TEST 5 ----------
+def test_settle_all_to_counterparty_in_group(client, payments_store):
+    fake, _ = payments_store([
+        _payment("p1", FRIEND_A, "test-user", group_id="trip"),
+        _payment("p2", FRIEND_A, "test-user", group_id="trip"),
+        _payment("p3", FRIEND_A, "test-user", group_id="home"),
+        _payment("p4", FRIEND_B, "test-user", group_id="trip"),
+    ])
+
+    res = client.post(
+        "/api/payments/settle",
+        json={"counterparty_id": FRIEND_A, "group_id": "trip"},
+    )
+    assert res.status_code == 200
+    body = res.json()
+    assert sorted(r["id"] for r in body["results"] if r["result"] == "paid") == ["p1", "p2"]
+
+    statuses = {r["id"]: r["status"] for r in fake._db["payment_records"]}
+    assert statuses["p3"] == "requested"
+    assert statuses["p4"] == "requested"
+
+
+# ---------- TEST 6 ----------
+def test_settle_requires_a_target(client):
+    res = client.post("/api/payments/settle", json={})
+    assert res.status_code == 400
+
+
+# ----------------------------------------------------------------------
+#                   COMPARE-AND-SET PAY TRANSITION
+# ----------------------------------------------------------------------
+
+# ---------- TEST 7 ----------
+def test_pay_is_a_single_conditional_update(client, payments_store):
+    fake, calls = payments_store([_payment("p1", FRIEND_A, "test-user")])
+
+    res = client.post("/api/payments/p1/pay", json={"paid_via": "Zelle"})
+    assert res.status_code == 200
+    assert res.json()["payment"]["status"] == "paid"
+    assert res.json()["payment"]["paid_via"] == "Zelle"
+    assert calls == ["payments"]
+
+
+# ---------- TEST 8 ----------
+def test_second_pay_of_same_payment_conflicts(client, payments_store):
+    payments_store([_payment("p1", FRIEND_A, "test-user")])
+
+    first = client.post("/api/payments/p1/pay", json={})
+    second = client.post("/api/payments/p1/pay", json={})
+
+    assert first.status_code == 200
+    assert second.status_code == 409
+
+
+# ---------- TEST 9 ----------
+def test_pay_missing_payment_is_404(client, payments_store):
+    payments_store([])
+
+    res = client.post("/api/payments/nope/pay", json={})
+    assert res.status_code == 404
+
+
+def test_pay_lookup_errors_are_not_reported_as_missing(client, payments_store):
+    from postgrest.exceptions import APIError
+
+    fake, _ = payments_store([])
+    error = {"code": "57014", "message": "canceling statement due to statement timeout"}
+    table = fake.table
+
+    def failing_single():
+        raise APIError(error)
+
+    def failing_table(name):
+        query = table(name)
+        query.single = failing_single
+        return query
+
+    fake.table = failing_table
+    assert client.post("/api/payments/p1/pay", json={}).status_code == 500
+
+    error.update(code="PGRST116", message="JSON object requested, multiple (or no) rows returned")
+    assert client.post("/api/payments/p1/pay", json={}).status_code == 404
+
+
+# ----------------------------------------------------------------------
+#                   KEYSET PAGINATION AND FILTERS
+# ----------------------------------------------------------------------
+
+# ---------- TEST 10 ----------
+def test_past_payments_paginate_with_cursor(client, payments_store):
+    rows = []
+    for i in range(7):
+        row = _payment(f"00000000-0000-4000-8000-00000000000{i}", FRIEND_A if i % 2 else "test-user",
+                       "test-user" if i % 2 else FRIEND_B, status="paid")
+        # Two rows share each timestamp so the id tiebreak matters
+        row["created_at"] = f"2025-01-0{1 + i // 2}T00:00:00+00:00"
+        rows.append(row)
+    payments_store(rows)
+
+    seen, cursor = [], None
+    for _ in range(5):
+        url = "/api/payments/past?limit=3" + (f"&cursor={cursor}" if cursor else "")
+        res = client.get(url)
+        assert res.status_code == 200
+        page = res.json()
+        assert len(page) <= 3
+        seen += [p["id"] for p in page]
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert seen == [f"00000000-0000-4000-8000-00000000000{i}" for i in range(6, -1, -1)]
+
+
+# ---------- TEST 11 ----------
+def test_payment_lists_filter_by_group_counterparty_and_date(client, payments_store):
+    rows = [
+        _payment("p1", FRIEND_A, "test-user", group_id="trip"),
+        _payment("p2", FRIEND_B, "test-user", group_id="trip"),
+        _payment("p3", FRIEND_A, "test-user", group_id="home"),
+        _payment("p4", "test-user", FRIEND_A, group_id="trip"),
+    ]
+    rows[0]["created_at"] = "2025-03-01T12:00:00+00:00"
+    rows[2]["created_at"] = "2025-03-05T12:00:00+00:00"
+    payments_store(rows)
+
+    res = client.get("/api/payments/outstanding?group_id=trip")
+    assert sorted(p["id"] for p in res.json()) == ["p1", "p2"]
+
+    res = client.get(f"/api/payments?counterparty_id={FRIEND_A}")
+    assert sorted(p["id"] for p in res.json()) == ["p1", "p3", "p4"]
+
+    res = client.get("/api/payments/outstanding?date_from=2025-03-01&date_to=2025-03-01")
+    assert [p["id"] for p in res.json()] == ["p1"]
+
+
+def test_payment_filters_reject_injected_logic_trees(client, payments_store):
+    payments_store([_payment("p1", FRIEND_A, FRIEND_B, status="paid")])
+
+    res = client.get("/api/payments/past?counterparty_id=z),status.neq.zzz,and(id.eq.z")
+    assert res.status_code == 400
+    # A well formed counterparty never reaches other people's payments
+    assert client.get(f"/api/payments/past?counterparty_id={FRIEND_A}").json() == []
+
+    forged = base64.urlsafe_b64encode(json.dumps(["2030-01-01", "x),id.neq.(y"]).encode()).decode()
+    assert client.get(f"/api/payments/past?cursor={forged}").status_code == 400
+
+
+# ----------------------------------------------------------------------
+#                   AGGREGATE BALANCE SUMMARY
+# ----------------------------------------------------------------------
+
+# ---------- TEST 12 ----------
+def test_summary_is_one_aggregate_call_with_breakdown(client, payments_store):
+    fake, calls = payments_store([
+        _payment("p1", FRIEND_A, "test-user", group_id="trip"),
+        _payment("p2", FRIEND_A, "test-user", group_id="home"),
+        _payment("p3", "test-user", FRIEND_B, group_id="trip"),
+        _payment("p4", FRIEND_A, "test-user", status="paid"),
+    ])
+
+    res = client.get("/api/payments/summary?breakdown=true")
+    assert res.status_code == 200
+    body = res.json()
+
+    # Aggregation happens in the RPC, not through table reads
+    assert calls == []
+    assert body["amount_owed_by_user"] == 10.0
+    assert body["amount_owed_to_user"] == 5.0
+    assert {c["counterparty_id"]: (c["owed_by_user"], c["owed_to_user"])
+            for c in body["by_counterparty"]} == {FRIEND_A: (10.0, 0.0), FRIEND_B: (0.0, 5.0)}
+    assert {g["group_id"]: (g["owed_by_user"], g["owed_to_user"])
+            for g in body["by_group"]} == {"trip": (5.0, 5.0), "home": (5.0, 0.0)}
+
+
+# ---------- TEST 13 ----------
+def test_summary_without_breakdown_omits_breakdowns(client, payments_store):
+    payments_store([_payment("p1", FRIEND_A, "test-user")])
+
+    body = client.get("/api/payments/summary").json()
+    assert body["amount_owed_by_user"] == 5.0
+    assert body["by_counterparty"] is None
+    assert body["by_group"] is None
+
+
+# ----------------------------------------------------------------------
+#                   FAST JSON LIST RESPONSES
+# ----------------------------------------------------------------------
+
+# ---------- TEST 14 ----------
+def test_list_response_matches_payment_model_shape(client, payments_store):
+    from app.routers.payments import Payment
+
+    row = _payment("p1", FRIEND_A, "test-user")
+    row["created_at"] = "2025-03-01T12:00:00+00:00"
+    payments_store([row])
+
+    res = client.get("/api/payments/outstanding")
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "application/json"
+
+    body = res.json()
+    assert len(body) == 1
+    # Same keys and values the validated model would have produced
+    expected = Payment(**{**row, "expense_name": body[0]["expense_name"]})
+    assert body[0] == expected.model_dump(mode="json")
+
+
+# ----------------------------------------------------------------------
+#                   EXPENSE NAME CACHE
+# ----------------------------------------------------------------------
+
+# ---------- TEST 15 ----------
+def test_expense_names_are_cached_across_requests(client, payments_store):
+    rows = [_payment("p1", FRIEND_A, "test-user"), _payment("p2", FRIEND_B, "test-user")]
+    rows[0]["expense_id"] = "e1"
+    rows[1]["expense_id"] = "e2"
+    fake, calls = payments_store(rows)
+    fake._db["expenses"] = [
+        {"id": "e1", "description": "Dinner"},
+        {"id": "e2", "description": "Taxi"},
+    ]
+
+    first = client.get("/api/payments/outstanding")
+    assert calls == ["payments", "expenses"]
+    assert {p["id"]: p["expense_name"] for p in first.json()} == {"p1": "Dinner", "p2": "Taxi"}
+
+    calls.clear()
+    second = client.get("/api/payments/outstanding")
+    assert calls == ["payments"]
+    assert second.json() == first.json()
+
+    # Invalidation forces the next request to look the name up again
+    fake._db["expenses"][0]["description"] = "Dinner (edited)"
+    payments_router.invalidate_expense_names("e1")
+    calls.clear()
+    third = client.get("/api/payments/outstanding")
+    assert calls == ["payments", "expenses"]
+    assert {p["id"]: p["expense_name"] for p in third.json()}["p1"] == "Dinner (edited)"
+
+
+# ----------------------------------------------------------------------
+#                   PAIRWISE NETTING
+# ----------------------------------------------------------------------
+
+def _amount(row, amount):
+    row["amount"] = amount
+    return row
+
+
+# ---------- TEST 16 ----------
+def test_net_collapses_pair_within_group(client, payments_store):
+    fake, _ = payments_store([
+        _amount(_payment("p1", FRIEND_A, "test-user", group_id="flat"), 30.0),
+        _amount(_payment("p2", "test-user", FRIEND_A, group_id="flat"), 12.5),
+        _amount(_payment("p3", FRIEND_A, "test-user", group_id="flat"), 2.5),
+        _payment("p4", FRIEND_A, "test-user", group_id="trip"),
+        _payment("p5", FRIEND_B, "test-user", group_id="flat"),
+    ])
+
+    res = client.post("/api/payments/net", json={"counterparty_id": FRIEND_A, "group_id": "flat"})
+    assert res.status_code == 200
+    body = res.json()
+    assert body["netted_count"] == 3
+    net = body["net_payment"]
+    assert (net["from_user_id"], net["to_user_id"], net["amount"]) == (FRIEND_A, "test-user", 20.0)
+    assert net["group_id"] == "flat"
+
+    statuses = {r["id"]: r["status"] for r in fake._db["payment_records"]}
+    assert [statuses[p] for p in ("p1", "p2", "p3")] == ["netted"] * 3
+    # Other groups and other counterparties are untouched
+    assert statuses["p4"] == statuses["p5"] == "requested"
+
+
+# ---------- TEST 17 ----------
+def test_net_across_groups_keeps_each_group_and_exact_cancel(client, payments_store):
+    fake, _ = payments_store([
+        _amount(_payment("p1", FRIEND_A, "test-user", group_id="flat"), 10.0),
+        _amount(_payment("p2", "test-user", FRIEND_A, group_id="flat"), 4.0),
+        _amount(_payment("p3", FRIEND_A, "test-user", group_id="trip"), 5.0),
+        _amount(_payment("p4", "test-user", FRIEND_A, group_id="trip"), 5.0),
+        # Alone in its scope, nothing to collapse
+        _payment("p5", FRIEND_A, "test-user"),
+    ])
+
+    res = client.post("/api/payments/net", json={"counterparty_id": FRIEND_A, "across_groups": True})
+    body = res.json()
+    assert body["netted_count"] == 4
+    assert body["net_payment"] is None
+    # Group debts stay in their group; trip cancels out exactly
+    [net] = body["net_payments"]
+    assert (net["group_id"], net["to_user_id"], net["amount"]) == ("flat", "test-user", 6.0)
+    outstanding = client.get("/api/payments/outstanding").json()
+    assert sorted(p["id"] for p in outstanding) == sorted([net["id"], "p5"])
+
+    res = client.post(
+        "/api/payments/net",
+        json={"counterparty_id": FRIEND_A, "group_id": "flat", "across_groups": True},
+    )
+    assert res.status_code == 400
+
+
+def test_net_hands_back_a_partial_claim(client, payments_store):
+    fake, _ = payments_store([
+        _amount(_payment("p1", FRIEND_A, "test-user", group_id="flat"), 10.0),
+        _amount(_payment("p2", "test-user", FRIEND_A, group_id="flat"), 4.0),
+        _amount(_payment("p3", FRIEND_A, "test-user", group_id="flat"), 1.0),
+    ])
+    table = fake.table
+    raced = []
+
+    def racing_table(name):
+        query = table(name)
+        update = query.update
+
+        def update_after_other_run(values):
+            if values.get("status") == "netted" and not raced:
+                # Another worker nets p1 and p2 between our read and claim
+                raced.append(True)
+                for row in fake._db["payment_records"]:
+                    if row["id"] in ("p1", "p2"):
+                        row["status"] = "netted"
+                fake._db["payment_records"].append(
+                    _amount(_payment("n1", FRIEND_A, "test-user", group_id="flat"), 6.0)
+                )
+            return update(values)
+
+        query.update = update_after_other_run
+        return query
+
+    fake.table = racing_table
+    res = client.post("/api/payments/net", json={"counterparty_id": FRIEND_A, "group_id": "flat"})
+
+    assert res.json()["netted_count"] == 2
+    open_rows = [r for r in fake._db["payment_records"] if r["status"] == "requested"]
+    assert [(r["group_id"], r["amount"]) for r in open_rows] == [("flat", 7.0)]
+
+
+def test_net_rejects_forged_counterparty(client, payments_store):
+    fake, _ = payments_store([
+        _payment("p1", FRIEND_A, FRIEND_B),
+        _payment("p2", FRIEND_B, FRIEND_A),
+    ])
+
+    res = client.post("/api/payments/net", json={
+        "counterparty_id": "x),and(status.eq.requested", "across_groups": True,
+    })
+    assert res.status_code == 400
+    res = client.post("/api/payments/net", json={
+        "counterparty_id": "00000000-0000-4000-8000-0000000000ff", "across_groups": True,
+    })
+    assert res.status_code == 404
+    assert {r["status"] for r in fake._db["payment_records"]} == {"requested"}
+    assert len(fake._db["payment_records"]) == 2
+
+
+# ---------- TEST 18 ----------
+def test_new_expenses_are_netted_incrementally(client, monkeypatch, payments_store):
+    from app.routers import expenses as expenses_router
+
+    fake, _ = payments_store([])
+    monkeypatch.setenv("TESTING", "0")
+    monkeypatch.setattr(expenses_router, "supabase", fake)
+
+    def add_expense(payer, amount):
+        monkeypatch.setitem(
+            client.app.dependency_overrides,
+            expenses_router.get_current_user,
+            lambda: {"id": payer},
+        )
+        res = client.post("/expenses/", json={
+            "group_id": "flat", "amount": amount, "description": "Groceries",
+            "expense_date": "2025-10-01", "member_ids": ["test-user", FRIEND_A],
+            "expense_type": "food", "split_type": "equal",
+        })
+        assert res.status_code == 201
+
+    add_expense(FRIEND_A, 40)     # test-user owes 20
+    add_expense("test-user", 10)   # friendA owes 5
+    add_expense(FRIEND_A, 6)      # test-user owes 3
+
+    open_rows = fake.table("payments").select("*").eq("status", "requested").execute().data
+    assert len(open_rows) == 1
+    assert (open_rows[0]["to_user_id"], open_rows[0]["amount"]) == ("test-user", 18.0)
@@ -0,0 +1,108 @@
+# FILE: tests/test_users_api.py
+# Tests for /api/users/search and the in-process username index.
+import pytest
+
+from app.core import usernames
+from app.core.usernames import UsernameIndex, username_index
+
+
+@pytest.fixture
+def users_db(monkeypatch, fresh_fake):
+    """Fresh in memory client with 5,000 users and an empty index."""
+    fake = fresh_fake
+    fake._db["users"] = [
+        {"id": f"u{i:05d}", "name": f"User {i}", "username": f"user{i}"}
+        for i in range(5000)
+    ] + [
+        {"id": "alice", "name": "Alice", "username": "Alice_W"},
+        {"id": "alfred", "name": "Alfred", "username": "alfred"},
+        {"id": "nobody", "name": "No Username", "username": None},
+    ]
+    monkeypatch.setattr(usernames, "supabase", fake)
+    monkeypatch.setattr("app.routers.users.supabase", fake)
+    monkeypatch.setattr("app.routers.account.supabase", fake)
+    username_index.clear()
+    yield fake
+    username_index.clear()
+
+
+def test_index_prefix_search_is_case_folded_and_ordered():
+    index = UsernameIndex()
+    index.replace([("1", "bob"), ("2", "Bobby"), ("3", "BOBCAT"), ("4", "alice")])
+    assert [u["username"] for u in index.search("BOB")] == ["bob", "Bobby", "BOBCAT"]
+    assert [u["id"] for u in index.search("bob", limit=2)] == ["1", "2"]
+    assert index.search("carl") == []
+    assert index.search("   ") == []
+
+
+def test_index_add_moves_renamed_users_and_respects_cap():
+    index = UsernameIndex(max_entries=3)
+    index.replace([("1", "bob"), ("2", "carol")])
+    assert index.complete
+
+    index.add("1", "zed")
+    assert index.search("bob") == []
+    assert index.search("z") == [{"id": "1", "username": "zed"}]
+    assert len(index) == 2
+
+    index.add("3", "dave")
+    index.add("4", "erin")
+    assert len(index) == 3
+    assert not index.complete
+
+    # Renaming at the cap keeps the user
+    index.add("3", "dan")
+    assert index.search("da") == [{"id": "3", "username": "dan"}]
+    assert len(index) == 3
+
+    index.remove("3")
+    assert index.search("dan") == []
+
+
+def test_search_loads_index_once_and_serves_from_memory(client, users_db, count_tables):
+    calls = count_tables(users_db)
+
+    res = client.get("/api/users/search", params={"prefix": "AL"})
+    assert res.status_code == 200
+    assert res.json()["users"] == [
+        {"id": "alfred", "username": "alfred"},
+        {"id": "alice", "username": "Alice_W"},
+    ]
+    # 5,002 users read in pages of LOAD_PAGE_SIZE
+    assert len(calls) == 6
+    assert username_index.complete
+
+    calls.clear()
+    res = client.get("/api/users/search", params={"prefix": "user12", "limit": 3})
+    assert [u["username"] for u in res.json()["users"]] == ["user12", "user120", "user1200"]
+    assert calls == []
+
+
+def test_search_requires_login(client, users_db):
+    from app.main import app
+    from app.routers.auth import get_current_user
+
+    app.dependency_overrides.pop(get_current_user, None)
+    assert client.get("/api/users/search", params={"prefix": "a"}).status_code == 401
+
+
+def test_search_falls_back_to_database_over_the_cap(client, users_db, monkeypatch):
+    monkeypatch.setattr(username_index, "max_entries", 100)
+    res = client.get("/api/users/search", params={"prefix": "ali"})
+    assert not username_index.complete
+    assert res.json()["users"] == [{"id": "alice", "username": "Alice_W"}]
+
+
+def test_account_rename_updates_index(client, users_db):
+    users_db._db["users"].append({"id": "test-user", "name": "Test", "username": "tester"})
+    client.get("/api/users/search", params={"prefix": "t"})
+
+    res = client.put(
+        "/api/account",
+        json={"full_name": "Test", "username": "Zara", "display_currency": "USD"},
+    )
+    assert res.status_code == 200
+    assert client.get("/api/users/search", params={"prefix": "tester"}).json()["users"] == []
+    assert client.get("/api/users/search", params={"prefix": "zar"}).json()["users"] == [
+        {"id": "test-user", "username": "Zara"}
+    ]